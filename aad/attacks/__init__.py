@@ -1,14 +1,24 @@
 """
 Module for adversarial attacks.
 """
+from .adv_store import AdvStore, ChunkedArray
+from .art_classifier import clear_art_classifiers, get_art_classifier
+from .attack_cache import AttackCache, get_attack_cache, set_attack_cache
+from .attack_checkpoint import AttackCheckpoint
 from .attack_container import AttackContainer
+from .attack_suite import AttackSuite
 from .bim_attack import BIMContainer
 from .carlini_l2_attack import CarliniL2Container
 from .carlini_l2_attack_v2 import CarliniL2V2Container
 from .deepfool_attack import DeepFoolContainer
 from .dummy_attack import DummyAttack
 from .fgsm_attack import FGSMContainer
+from .pgd_attack import PGDContainer
+from .query_oracle import QueryOracle
+from .robustness_curve import robustness_curve
 from .saliency_map_attack import SaliencyContainer
+from .sharded_executor import ShardedAttackExecutor
+from .tree_attack import TreeAttackContainer
 from .zoo_attack import ZooContainer
 
 
@@ -24,5 +34,7 @@ def get_attack(name):
         return DeepFoolContainer
     elif name == 'Saliency':
         return SaliencyContainer
+    elif name == 'PGD':
+        return PGDContainer
     else:
         raise AttributeError('Received unknown attack "{}"'.format(name))
@@ -0,0 +1,349 @@
+"""
+This module implements a chunked directory store for adversarial examples.
+"""
+import functools
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedArray:
+    """
+    A read-only view of one array in an AdvStore. The dense chunks are memory-mapped, and only the requested samples
+    are read from the disk. An encoded chunk is decoded when it is accessed, and only the last decoded chunk is kept in
+    memory.
+
+    Examples
+    --------
+    >>> adv = store['adv']
+    >>> adv.shape
+    (1000, 3, 32, 32)
+    >>> batch = adv[100:164]
+    """
+
+    def __init__(self, loaders, sizes, dtype, sample_shape):
+        """
+        Create a ChunkedArray instance.
+
+        Parameters
+        ----------
+        loaders : list of callable
+            Each one returns a chunk, and whether it is memory-mapped.
+        sizes : list of int
+            Number of samples in each chunk.
+        dtype : numpy.dtype
+            The data type of the array.
+        sample_shape : tuple
+            The shape of one sample.
+        """
+        self._loaders = loaders
+        self._offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        self.dtype = np.dtype(dtype)
+        self.shape = (int(self._offsets[-1]),) + tuple(sample_shape)
+        self._chunks = [None] * len(loaders)
+        self._decoded = (None, None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        arr = self[:]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self[index[0]][(slice(None),) + index[1:]]
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('Index {} is out of bounds'.format(index))
+            c = np.searchsorted(self._offsets, index, side='right') - 1
+            return np.array(self._chunk(c)[index - self._offsets[c]])
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._read_range(start, stop)
+            index = np.arange(start, stop, step)
+        indices = np.arange(len(self))[index]
+        out = np.empty((len(indices),) + self.shape[1:], dtype=self.dtype)
+        chunk_ids = np.searchsorted(self._offsets, indices, side='right') - 1
+        for c in np.unique(chunk_ids):
+            mask = chunk_ids == c
+            out[mask] = self._chunk(c)[indices[mask] - self._offsets[c]]
+        return out
+
+    def memmap(self):
+        """
+        Returns the memory-mapped array, if it has only one dense chunk. Otherwise, the chunks are concatenated.
+        """
+        if len(self._loaders) == 1:
+            chunk = self._chunk(0)
+            if isinstance(chunk, np.memmap):
+                return chunk
+        return self[:]
+
+    def _read_range(self, start, stop):
+        out = np.empty((max(stop - start, 0),) + self.shape[1:],
+                       dtype=self.dtype)
+        for c in range(len(self._loaders)):
+            lo = max(start, self._offsets[c])
+            hi = min(stop, self._offsets[c + 1])
+            if lo < hi:
+                chunk = self._chunk(c)
+                out[lo - start: hi - start] = \
+                    chunk[lo - self._offsets[c]: hi - self._offsets[c]]
+        return out
+
+    def _chunk(self, c):
+        if self._chunks[c] is not None:
+            return self._chunks[c]
+        if self._decoded[0] == c:
+            return self._decoded[1]
+        chunk, is_mmap = self._loaders[c]()
+        if is_mmap:
+            self._chunks[c] = chunk
+        else:
+            self._decoded = (c, chunk)
+        return chunk
+
+
+class AdvStore:
+    """
+    AdvStore keeps a set of adversarial examples in one directory. The arrays `adv`, `pred`, `x` and `y` are split
+    into aligned chunks, which are `.npy` files. `manifest.json` records the chunks, the dtype and the shape of each
+    array, the name and the parameters of the attack, and the hash of the model.
+
+    Batches can be appended while the attack is running. The manifest is updated after each chunk, so a partial store
+    can be read. When loading, the chunks are memory-mapped.
+
+    The adversarial examples can be saved as the difference from the clean inputs, `x`. The difference is the XOR of
+    the bit patterns, so the reconstruction is exact. With `encoding='sparse'`, only the flat indices and the XOR
+    values of the changed elements are saved, which suits attacks like JSMA. With `encoding='xor'`, the XOR array is
+    compressed. Most of its high bits are zeros, when the perturbation is small, e.g. C&W L2. `encoding='auto'`
+    picks the smaller one for each chunk.
+
+    Examples
+    --------
+    >>> store = AdvStore.create('save/IrisNN_Iris_Carlini', attack_name='CarliniL2V2Container')
+    >>> store.append(adv, pred=pred_adv, x=x, y=y)
+    >>> store = AdvStore.open('save/IrisNN_Iris_Carlini')
+    >>> adv = store['adv'][:100]
+    """
+    MANIFEST = 'manifest.json'
+    NAMES = ('adv', 'pred', 'x', 'y')
+    ENCODINGS = ('dense', 'sparse', 'xor', 'auto')
+    VERSION = 1
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self._manifest = manifest
+
+    @classmethod
+    def create(cls, path, attack_name=None, params=None, model_hash=None,
+               encoding='dense', overwrite=False):
+        """
+        Create an empty store.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the store.
+        attack_name : str, optional
+            The name of the attack.
+        params : dict, optional
+            The parameters of the attack.
+        model_hash : str, optional
+            The hash of the model weights.
+        encoding : {'dense', 'sparse', 'xor', 'auto'}
+            How the adversarial examples are saved. Except 'dense', the clean inputs must be appended as well.
+        overwrite : bool
+            Remove the existing store. Otherwise, raise FileExistsError.
+        """
+        assert encoding in cls.ENCODINGS, \
+            'Expecting one of {}, got {}'.format(cls.ENCODINGS, encoding)
+        if os.path.exists(path):
+            if not overwrite:
+                raise FileExistsError('{} already exists!'.format(path))
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+        def to_json(obj):
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
+            if isinstance(obj, np.generic):
+                return obj.item()
+            return str(obj)
+
+        manifest = {
+            'version': cls.VERSION,
+            'attack': attack_name,
+            'params': json.loads(json.dumps(params, default=to_json)),
+            'model_hash': model_hash,
+            'encoding': encoding,
+            'num_samples': 0,
+            'arrays': {},
+            'chunks': [],
+        }
+        store = cls(path, manifest)
+        store._write_manifest()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        """Open an existing store."""
+        filename = os.path.join(path, cls.MANIFEST)
+        if not os.path.exists(filename):
+            raise FileNotFoundError('{} does not exist!'.format(filename))
+        with open(filename) as f:
+            manifest = json.load(f)
+        return cls(path, manifest)
+
+    @staticmethod
+    def is_store(path):
+        """Returns True, if the path is a store directory."""
+        return os.path.isfile(os.path.join(path, AdvStore.MANIFEST))
+
+    @property
+    def attack_name(self):
+        return self._manifest['attack']
+
+    @property
+    def params(self):
+        return self._manifest['params']
+
+    @property
+    def model_hash(self):
+        return self._manifest['model_hash']
+
+    @property
+    def names(self):
+        """The names of the saved arrays."""
+        return [n for n in self.NAMES if n in self._manifest['arrays']]
+
+    def __len__(self):
+        return self._manifest['num_samples']
+
+    def __contains__(self, name):
+        return name in self._manifest['arrays']
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError('{} is not in the store.'.format(name))
+        info = self._manifest['arrays'][name]
+        chunks = self._manifest['chunks']
+        loaders = [functools.partial(self._load_chunk, name, c)
+                   for c in chunks]
+        return ChunkedArray(loaders, [c['size'] for c in chunks],
+                            info['dtype'], info['shape'])
+
+    @property
+    def nbytes(self):
+        """The total size of the chunks on the disk in bytes."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.path)
+                   if entry.name.startswith('chunk_'))
+
+    def load(self, name, mmap=True):
+        """
+        Returns an array. With `mmap`, a store with one chunk is memory-mapped. Returns None, if the array is not
+        saved.
+        """
+        if name not in self:
+            return None
+        arr = self[name]
+        return arr.memmap() if mmap else arr[:]
+
+    def append(self, adv, pred=None, x=None, y=None):
+        """
+        Appends a batch. The arrays must have the same length, and the same arrays must be given in every call.
+        """
+        batch = {'adv': adv, 'pred': pred, 'x': x, 'y': y}
+        batch = {k: np.ascontiguousarray(v) for k, v in batch.items()
+                 if v is not None}
+        size = len(batch['adv'])
+        assert all(len(v) == size for v in batch.values())
+
+        arrays = self._manifest['arrays']
+        if len(self._manifest['chunks']) == 0:
+            for name, arr in batch.items():
+                arrays[name] = {'dtype': arr.dtype.str,
+                                'shape': list(arr.shape[1:])}
+        assert set(batch.keys()) == set(arrays.keys()), \
+            'Expecting {}'.format(', '.join(arrays.keys()))
+
+        prefix = 'chunk_{:05d}'.format(len(self._manifest['chunks']))
+        chunk = {'prefix': prefix, 'size': size, 'encoding': 'dense'}
+        for name, arr in batch.items():
+            info = arrays[name]
+            assert list(arr.shape[1:]) == info['shape']
+            arr = arr.astype(info['dtype'], copy=False)
+            filename = os.path.join(self.path, prefix + '_' + name)
+            if name == 'adv' and self._manifest['encoding'] != 'dense':
+                assert 'x' in batch, 'The clean inputs are required.'
+                x = batch['x'].astype(arrays['x']['dtype'], copy=False)
+                encoding, delta = _encode_delta(
+                    arr, x, self._manifest['encoding'])
+                if encoding != 'dense':
+                    chunk['encoding'] = encoding
+                    np.savez_compressed(filename + '.npz', **delta)
+                    continue
+            np.save(filename + '.npy', arr, allow_pickle=False)
+        self._manifest['chunks'].append(chunk)
+        self._manifest['num_samples'] += size
+        self._write_manifest()
+
+    def _load_chunk(self, name, chunk):
+        """Returns a chunk, and whether it is memory-mapped."""
+        filename = os.path.join(self.path, chunk['prefix'] + '_' + name)
+        # the chunks from version 1 without an encoding are dense.
+        if name != 'adv' or chunk.get('encoding', 'dense') == 'dense':
+            return np.load(filename + '.npy', mmap_mode='c',
+                           allow_pickle=False), True
+        x, _ = self._load_chunk('x', chunk)
+        with np.load(filename + '.npz', allow_pickle=False) as delta:
+            return _decode_delta(x, chunk['encoding'], delta), False
+
+    def _write_manifest(self):
+        filename = os.path.join(self.path, self.MANIFEST)
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp, filename)
+
+
+def _encode_delta(adv, x, encoding):
+    """
+    Returns the encoding and the arrays which save `adv` as the difference from `x`. Returns 'dense', if `adv` cannot
+    be encoded.
+    """
+    if adv.dtype != x.dtype or adv.shape != x.shape:
+        return 'dense', None
+    uint = np.dtype('u{}'.format(adv.dtype.itemsize))
+    delta = (adv.view(uint) ^ x.view(uint)).reshape(-1)
+    if encoding == 'auto':
+        # the size of the flat indices and the values of the changed elements
+        nnz = np.count_nonzero(delta)
+        encoding = 'sparse' if nnz * (4 + uint.itemsize) < delta.nbytes / 2 \
+            else 'xor'
+    if encoding == 'sparse':
+        indices = np.flatnonzero(delta)
+        if delta.size < 2**32:
+            indices = indices.astype(np.uint32)
+        return 'sparse', {'indices': indices, 'values': delta[indices]}
+    return 'xor', {'values': delta}
+
+
+def _decode_delta(x, encoding, delta):
+    """Reconstructs the adversarial examples from `x` and the difference."""
+    uint = np.dtype('u{}'.format(x.dtype.itemsize))
+    bits = np.array(x).view(uint).reshape(-1)
+    if encoding == 'sparse':
+        bits[delta['indices']] ^= delta['values']
+    else:
+        bits ^= delta['values']
+    return bits.view(x.dtype).reshape(x.shape)
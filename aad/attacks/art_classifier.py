@@ -0,0 +1,76 @@
+"""
+This module implements a registry of IBM ART classifiers, which are shared by all attacks on the same model.
+"""
+import logging
+import weakref
+
+import numpy as np
+from art.classifiers import PyTorchClassifier
+
+logger = logging.getLogger(__name__)
+
+# ModelContainerPT -> (state key, PyTorchClassifier). An entry is removed
+# together with its ModelContainerPT.
+_REGISTRY = weakref.WeakKeyDictionary()
+
+
+def get_art_classifier(model_container):
+    """
+    Returns the ART PyTorchClassifier of a model. The classifier and its clip values are built once, and they are
+    shared by all attacks on the same ModelContainerPT. A new one is built, when the model, its optimizer, its
+    weights or the train set of the data container have been changed.
+
+    Parameters
+    ----------
+    model_container : ModelContainerPT
+        A trained model.
+
+    Returns
+    -------
+    art.classifiers.PyTorchClassifier
+        The classifier for IBM ART attacks.
+    """
+    key = _get_state_key(model_container)
+    entry = _REGISTRY.get(model_container)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    # use IBM ART pytorch module wrapper
+    # the model used here should be already trained
+    model = model_container.model
+    dc = model_container.data_container
+    clip_values = dc.data_range
+    logger.debug('Build ART classifier. clip_values = %s', str(clip_values))
+    classifier = PyTorchClassifier(
+        model=model,
+        clip_values=clip_values,
+        loss=model.loss_fn,
+        optimizer=model.optimizer,
+        input_shape=dc.dim_data,
+        nb_classes=dc.num_classes)
+    _REGISTRY[model_container] = (key, classifier)
+    return classifier
+
+
+def clear_art_classifiers():
+    """Removes all shared classifiers."""
+    _REGISTRY.clear()
+
+
+def to_art_input(x):
+    """
+    Returns the inputs as a contiguous float32 array. ART casts the inputs to float32 in every call, so the copy is
+    only made once.
+    """
+    return np.ascontiguousarray(x, dtype=np.float32)
+
+
+def _get_state_key(model_container):
+    """
+    Returns a key which changes with the model. The weights are not hashed. The version counters of the parameters
+    are bumped by every in-place update, e.g., an optimizer step or `load_state_dict`.
+    """
+    model = model_container.model
+    params = tuple((p.data_ptr(), p._version) for p in model.parameters())
+    return (id(model), id(getattr(model, 'optimizer', None)),
+            model_container.data_container.version, params)
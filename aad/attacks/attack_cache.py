@@ -0,0 +1,161 @@
+"""
+This module implements a content-addressed on-disk cache for adversarial examples.
+"""
+import functools
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The cache which is used by all attacks, unless the attack has its own.
+_DEFAULT_CACHE = None
+
+
+class AttackCache:
+    """
+    AttackCache stores the outputs of `AttackContainer.generate` in a directory. The key of an entry combines a hash
+    of the model weights, the name of the attack with all its parameters, and a hash of the inputs and the targets.
+    Therefore, an entry is only reused by an identical attack.
+
+    Each entry is a `.npz` file. When the total size exceeds `max_bytes`, the least recently used entries are removed.
+    The modification time of an entry is updated on every hit, so the order survives between runs.
+
+    Examples
+    --------
+    >>> set_attack_cache(AttackCache('save/cache', max_bytes=2**30))
+    >>> adv, pred_adv, x_clean, pred_clean = attack.generate(count=1000)  # computed
+    >>> adv, pred_adv, x_clean, pred_clean = attack.generate(count=1000)  # loaded
+    """
+    OUTPUTS = ('adv', 'pred_adv', 'x_clean', 'pred_clean')
+
+    def __init__(self, path, max_bytes=2**31):
+        """
+        Create an AttackCache instance.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the cache. It is created, if it does not exist.
+        max_bytes : int
+            Maximum total size of the entries in bytes.
+        """
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, key):
+        """Returns the cached outputs, or None when the key is not found."""
+        filename = self._filename(key)
+        if not os.path.exists(filename):
+            self.misses += 1
+            return None
+        with np.load(filename, allow_pickle=False) as data:
+            outputs = tuple(data[name] for name in self.OUTPUTS)
+        # mark the entry as recently used
+        os.utime(filename)
+        self.hits += 1
+        return outputs
+
+    def put(self, key, outputs):
+        """Saves the outputs of `generate`, and removes the least recently used entries."""
+        assert len(outputs) == len(self.OUTPUTS)
+        filename = self._filename(key)
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **dict(zip(self.OUTPUTS, outputs)))
+        os.replace(tmp, filename)
+        self._evict()
+
+    def clear(self):
+        """Removes all entries."""
+        for entry in self._entries():
+            os.remove(entry.path)
+
+    @property
+    def size(self):
+        """The total size of the entries in bytes."""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._filename(key))
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.path)
+                if entry.is_file() and entry.name.endswith('.npz')]
+
+    def _evict(self):
+        # Other processes may remove the entries at the same time.
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # keep the newest entry, even if it is larger than the cap
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            try:
+                os.remove(path)
+                logger.debug('Evict %s from the attack cache.', path)
+            except FileNotFoundError:
+                pass
+
+
+def set_attack_cache(cache):
+    """Sets the cache for all attacks. Use None to disable it."""
+    global _DEFAULT_CACHE
+    assert cache is None or isinstance(cache, AttackCache)
+    _DEFAULT_CACHE = cache
+
+
+def get_attack_cache():
+    """Returns the cache for all attacks."""
+    return _DEFAULT_CACHE
+
+
+def cache_generate(generate):
+    """
+    Decorator for `AttackContainer.generate`. It returns the cached outputs when an identical attack has been run on
+    the same model and inputs, and saves the outputs otherwise.
+    """
+    @functools.wraps(generate)
+    def wrapper(self, count=1000, use_testset=True, x=None, targets=None,
+                **kwargs):
+        if targets is not None:
+            kwargs['targets'] = targets
+        cache = self.cache if self.cache is not None else _DEFAULT_CACHE
+        if cache is None:
+            return generate(self, count, use_testset, x, **kwargs)
+
+        # the parameters are part of the key
+        self.set_params(**kwargs)
+        if use_testset:
+            inputs = self.model_container.data_container.x_test[:count]
+        else:
+            inputs = x
+        key = self._get_key(inputs, targets)
+        outputs = cache.get(key)
+        if outputs is not None:
+            logger.info('Load %d adv. examples from the attack cache.',
+                        len(outputs[0]))
+            return outputs
+
+        outputs = generate(self, count, use_testset, x, **kwargs)
+        cache.put(key, outputs)
+        return outputs
+    return wrapper
@@ -0,0 +1,189 @@
+"""
+This module implements an on-disk checkpoint for generating adversarial examples.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AttackCheckpoint:
+    """
+    AttackCheckpoint streams the finished mini-batches of an attack into a directory. Each call of `save` writes one
+    part file, and then adds it to `manifest.json`. The indices of a part are stored in the manifest as a range, when
+    they are contiguous, and in their own file next to the part otherwise. So the manifest only grows by one entry per
+    mini-batch. All files are written into a temporary file first and then renamed, so a job which is killed while
+    saving loses at most the last mini-batch.
+
+    The manifest also stores a key, which is computed from the attack, its parameters, the model and the inputs. When
+    the key does not match, the checkpoint is from another run, and it is cleared.
+
+    Examples
+    --------
+    >>> key = AttackCheckpoint.make_key('CarliniL2V2Container', params, x)
+    >>> checkpoint = AttackCheckpoint('save/checkpoints/run', key, x.shape)
+    >>> adv = checkpoint.load(np.zeros_like(x))
+    >>> pending = np.where(~checkpoint.finished)[0]
+    >>> checkpoint.save(pending[:64], adv_batch)
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path, key, shape):
+        """
+        Create an AttackCheckpoint instance.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the checkpoint. It is created, if it does not exist.
+        key : str
+            The key of the run. See `make_key`.
+        shape : tuple
+            The shape of all adversarial examples.
+        """
+        self.path = path
+        self.key = key
+        self.shape = tuple(int(s) for s in shape)
+        self._finished = np.zeros(self.shape[0], dtype=np.bool_)
+        self._parts = []
+
+        manifest = self._read_manifest()
+        if manifest is None:
+            self.clear()
+        elif manifest['key'] != key or tuple(manifest['shape']) != self.shape:
+            logger.warning(
+                'The checkpoint in %s is from another run. Start over.', path)
+            self.clear()
+        else:
+            self._parts = manifest['parts']
+            for part in self._parts:
+                self._finished[self._get_indices(part)] = True
+            logger.info('Resume from %s: %d of %d samples are finished.',
+                        path, self.num_finished, len(self._finished))
+
+    @property
+    def finished(self):
+        """A boolean mask of the finished samples."""
+        return self._finished.copy()
+
+    @property
+    def num_finished(self):
+        """The number of finished samples."""
+        return int(self._finished.sum())
+
+    def is_done(self, indices):
+        """Returns True, if all given samples are finished."""
+        return bool(np.all(self._finished[indices]))
+
+    def save(self, indices, adv):
+        """
+        Saves the adversarial examples of a mini-batch.
+
+        Parameters
+        ----------
+        indices : numpy.ndarray, slice
+            The indices of the samples in all inputs.
+        adv : numpy.ndarray
+            The adversarial examples.
+        """
+        indices = np.arange(self.shape[0])[indices]
+        assert len(indices) == len(adv)
+        if len(indices) == 0:
+            return
+
+        name = 'part_{:05d}'.format(len(self._parts))
+        part = {'file': name + '.npy'}
+        self._write(part['file'], lambda f: np.save(
+            f, np.asarray(adv, dtype=np.float32), allow_pickle=False))
+        start = int(indices[0])
+        if np.array_equal(indices, np.arange(start, start + len(indices))):
+            part['start'] = start
+            part['stop'] = start + len(indices)
+        else:
+            part['indices'] = name + '_indices.npy'
+            self._write(part['indices'], lambda f: np.save(
+                f, indices.astype(np.int64), allow_pickle=False))
+        self._parts.append(part)
+        self._finished[indices] = True
+        self._write(self.MANIFEST, lambda f: f.write(json.dumps({
+            'key': self.key,
+            'shape': list(self.shape),
+            'parts': self._parts,
+        }).encode('utf-8')))
+
+    def load(self, out):
+        """Copies the finished adversarial examples into `out`."""
+        assert out.shape == self.shape
+        for part in self._parts:
+            adv = np.load(os.path.join(self.path, part['file']),
+                          allow_pickle=False)
+            out[self._get_indices(part)] = adv
+        return out
+
+    def clear(self):
+        """Removes all saved results."""
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        self._parts = []
+        self._finished[:] = False
+
+    @staticmethod
+    def make_key(name, params, *arrays):
+        """
+        Returns a SHA-1 digest of the attack name, its parameters and the arrays.
+
+        Parameters
+        ----------
+        name : str
+            The name of the attack.
+        params : dict
+            The parameters of the attack.
+        arrays : numpy.ndarray
+            The inputs, the targets and the model parameters. None is skipped.
+        """
+        def to_json(obj):
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
+            if isinstance(obj, np.generic):
+                return obj.item()
+            return str(obj)
+
+        sha = hashlib.sha1()
+        sha.update(name.encode('utf-8'))
+        sha.update(json.dumps(params, sort_keys=True, default=to_json)
+                   .encode('utf-8'))
+        for arr in arrays:
+            if arr is None:
+                continue
+            arr = np.ascontiguousarray(arr)
+            sha.update(str(arr.dtype).encode('utf-8'))
+            sha.update(str(arr.shape).encode('utf-8'))
+            sha.update(arr.data)
+        return sha.hexdigest()
+
+    def _get_indices(self, part):
+        """Returns the indices of a part in all inputs."""
+        if 'start' in part:
+            return slice(part['start'], part['stop'])
+        return np.load(os.path.join(self.path, part['indices']),
+                       allow_pickle=False)
+
+    def _read_manifest(self):
+        filename = os.path.join(self.path, self.MANIFEST)
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            return json.load(f)
+
+    def _write(self, filename, write_fn):
+        filename = os.path.join(self.path, filename)
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            write_fn(f)
+        os.replace(tmp, filename)
@@ -4,29 +4,143 @@ This module implements the base class for adversarial attack.
 import abc
 import logging
 import os
+import shutil
 import time
 
 import numpy as np
 
 from ..basemodels import ModelContainerPT
-from ..utils import name_handler
+from ..utils import (get_l2_norm, get_time_str, name_handler,
+                     onehot_encoding, swap_image_channel)
+from .adv_store import AdvStore
+from .attack_cache import cache_generate
+from .attack_checkpoint import AttackCheckpoint
 
 logger = logging.getLogger(__name__)
 
 
 class AttackContainer(abc.ABC):
     _params = dict()  # Override this in child class
+    # True, if `_generate(x, targets)` runs a targeted attack.
+    SUPPORTS_TARGETS = False
 
     def __init__(self, model_containter):
         assert isinstance(model_containter, ModelContainerPT)
         self.model_container = model_containter
         self._since = 0.0
+        self._checkpoint_path = None
+        self._checkpoint_size = None
+        # Use the cache from `set_attack_cache`, if it is None.
+        self.cache = None
+        # The clean inputs of the running `generate`, their predictions and
+        # their scores.
+        self._clean = None
+
+    @cache_generate
+    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
+        """
+        Generate adversarial examples. The clean inputs are predicted once. The predictions are used for the accuracy
+        on the clean set, the labels of the untargeted attacks and the returned `pred_clean`.
+
+        Parameters
+        ----------
+        count : int
+            The number of adversarial examples will be generated from the test set. This parameter will not be used
+            when `use_testset` is False.
+        use_testset : bool
+            Use test set to generate adversarial examples.
+        x : numpy.ndarray, optional
+            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
+            be ignored.
+        targets : numpy.ndarray, optional
+            The expected labels for targeted attack.
+
+        Returns
+        -------
+        adv : numpy.ndarray
+            The adversarial examples which have same shape as x.
+        pred_adv :  : numpy.ndarray
+            The predictions of adv. examples.
+        x_clean : numpy.ndarray
+            The clean inputs.
+        pred_clean : numpy.ndarray
+            The prediction of clean inputs.
+        """
+        assert use_testset or x is not None
+
+        since = time.time()
+        # parameters should able to set before training
+        self.set_params(**kwargs)
+
+        dc = self.model_container.data_container
+        # handle the situation where testset has less samples than we want
+        if use_testset and len(dc.x_test) < count:
+            count = len(dc.x_test)
+
+        if use_testset:
+            x = np.copy(dc.x_test[:count])
+            y = np.copy(dc.y_test[:count])
+        else:
+            x = np.copy(x)
+            count = len(x)
+
+        # handle (h, w, c) to (c, h, w)
+        if dc.data_type == 'image' and x.shape[1] not in (1, 3):
+            xx = swap_image_channel(x)
+        else:
+            xx = x
+
+        pred_clean, scores = self.model_container.predict(
+            xx, require_score=True)
+        if use_testset:
+            acc = np.sum(np.equal(pred_clean, y)) / len(y)
+            logger.info('Accuracy on clean set: %f', acc)
+
+        self._clean = (xx, pred_clean, scores)
+        try:
+            adv = self._generate(xx, targets)
+        finally:
+            self._clean = None
+        pred_adv = self.model_container.predict(adv)
+
+        # ensure the outputs and inputs have same shape
+        if x.shape != adv.shape:
+            adv = swap_image_channel(adv)
+        time_elapsed = time.time() - since
+        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
+                    count, int(time_elapsed // 60), time_elapsed % 60)
+        return adv, pred_adv, x, pred_clean
 
     @abc.abstractmethod
-    def generate(self, count, use_testset=True, x=None, y=None, **kwargs):
-        """Generating adversarial examples."""
+    def _generate(self, x, targets=None):
+        """
+        Returns the adversarial examples of `x`, which is in the shape of the model. `targets` are ignored, unless
+        `SUPPORTS_TARGETS` is True.
+        """
         raise NotImplementedError
 
+    def _predict_clean(self, x):
+        """Returns the predictions of the clean inputs. Inside `generate`, they are not computed again."""
+        if self._clean is not None and self._clean[0] is x:
+            return self._clean[1]
+        return self.model_container.predict(x)
+
+    def _clean_scores(self, x):
+        """Returns the scores of the clean inputs, if they are computed by `generate`. Otherwise, returns None."""
+        if self._clean is not None and self._clean[0] is x:
+            return self._clean[2]
+        return None
+
+    def _get_art_labels(self, x, targets=None):
+        """
+        Returns the labels for an ART attack. Without targets, they are the one-hot encoded clean predictions, which
+        ART would compute again.
+        """
+        if targets is not None:
+            return targets
+        num_classes = self.model_container.data_container.num_classes
+        return onehot_encoding(self._predict_clean(x), num_classes)
+
     def set_params(self, **kwargs):
         """Sets parameters for the attack algorithm."""
         for key, value in kwargs.items():
@@ -38,6 +152,169 @@ class AttackContainer(abc.ABC):
     def attack_params(self):
         return self._params
 
+    def enable_checkpoint(self, path, chunk_size=None):
+        """
+        Saves the adversarial examples into `path` as soon as a mini-batch is finished. When `generate` is called
+        again with the same parameters, model and inputs, the finished samples are loaded instead.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the checkpoint.
+        chunk_size : int, optional
+            Number of samples in each saved mini-batch. Use `batch_size` of the attack, if it is None.
+        """
+        self._checkpoint_path = path
+        self._checkpoint_size = chunk_size
+
+    def clear_checkpoint(self):
+        """Removes the checkpoint directory."""
+        if self._checkpoint_path is not None \
+                and os.path.isdir(self._checkpoint_path):
+            shutil.rmtree(self._checkpoint_path)
+
+    def _open_checkpoint(self, x, targets=None):
+        """Returns the AttackCheckpoint for the inputs, or None when it is disabled."""
+        if self._checkpoint_path is None:
+            return None
+        # `targets` are the labels of the attack here, and `_generate` has
+        # already set `targeted`.
+        key = self._get_key(x, targets, self._params.get('targeted'))
+        return AttackCheckpoint(self._checkpoint_path, key, x.shape)
+
+    def _get_key(self, x, targets=None, targeted=None):
+        """
+        Returns a key of the attack, its parameters, the model weights and the inputs. `targeted` is the mode of the
+        run, and it is True when the targets are given, if it is None.
+        """
+        params = dict(self._params, use_art=getattr(self, '_use_art', False))
+        if 'targeted' in params:
+            params['targeted'] = (targets is not None if targeted is None
+                                  else targeted)
+        return AttackCheckpoint.make_key(
+            self.__class__.__name__, params, x, targets,
+            *self._get_weights())
+
+    def _get_model_hash(self):
+        """Returns a hash of the model weights."""
+        return AttackCheckpoint.make_key('model', {}, *self._get_weights())
+
+    def _get_weights(self):
+        model = self.model_container.model
+        return [p.detach().cpu().numpy() for p in model.state_dict().values()]
+
+    def _generate_in_chunks(self, generate_fn, x, targets=None):
+        """
+        Calls `generate_fn(x, targets)` on the chunks of the inputs, which are not in the checkpoint, and saves the
+        results after each chunk. Without a checkpoint, it is called once on all inputs.
+        """
+        checkpoint = self._open_checkpoint(x, targets)
+        if checkpoint is None:
+            return generate_fn(x, targets)
+        if targets is not None:
+            targets = np.asarray(targets)
+
+        chunk_size = self._checkpoint_size or self._params.get('batch_size', 64)
+        adv = checkpoint.load(np.zeros(x.shape, dtype=np.float32))
+        pending = np.where(~checkpoint.finished)[0]
+        for start in range(0, len(pending), chunk_size):
+            indices = pending[start: start + chunk_size]
+            t = targets[indices] if targets is not None else None
+            adv[indices] = generate_fn(x[indices], t)
+            checkpoint.save(indices, adv[indices])
+            logger.debug('Checkpoint: %d of %d samples are finished.',
+                         checkpoint.num_finished, len(x))
+        return adv
+
+    def generate_all_targets(self, count=1000, use_testset=True, x=None,
+                             return_adv=False, **kwargs):
+        """
+        Runs the targeted attack of each sample against all other classes. The inputs are repeated once for each
+        target, and all of them are generated in one run. The clean predictions are computed once, and they are used
+        to choose the targets.
+
+        Parameters
+        ----------
+        count : int
+            The number of samples from the test set.
+        use_testset : bool
+            Use test set to generate adversarial examples.
+        x : numpy.ndarray, optional
+            The inputs, when `use_testset` is False.
+        return_adv : bool
+            Also return the adversarial examples and their predictions.
+
+        Returns
+        -------
+        dict
+            `success` is a (n, num_classes) boolean matrix. An entry is True, if the sample is classified as the
+            target class. `l2` is a (n, num_classes) matrix of the L2 norms of the perturbations. The entries of the
+            clean predictions are False and NaN. `x` and `pred_clean` are the inputs and the clean predictions. With
+            `return_adv`, `adv` has the shape (n, num_classes, ...), where the clean inputs are on the entries of the
+            clean predictions, and `pred_adv` has the shape (n, num_classes).
+        """
+        assert self.SUPPORTS_TARGETS, \
+            '{} does not support targeted attack.'.format(
+                self.__class__.__name__)
+        assert use_testset or x is not None
+
+        since = time.time()
+        self.set_params(**kwargs)
+        dc = self.model_container.data_container
+        if use_testset:
+            x = np.copy(dc.x_test[:count])
+        else:
+            x = np.copy(x)
+
+        # handle (h, w, c) to (c, h, w)
+        if dc.data_type == 'image' and x.shape[1] not in (1, 3):
+            xx = swap_image_channel(x)
+        else:
+            xx = x
+
+        n = len(xx)
+        num_classes = dc.num_classes
+        pred_clean = self.model_container.predict(xx)
+        # all classes except the clean prediction, (n, num_classes - 1)
+        targets = (pred_clean[:, np.newaxis]
+                   + np.arange(1, num_classes)) % num_classes
+        targets = targets.astype(np.int64)
+        rows = np.repeat(np.arange(n), num_classes - 1)
+        cols = targets.reshape(-1)
+        x_rep = np.repeat(xx, num_classes - 1, axis=0)
+
+        adv = self._generate(x_rep, cols)
+        pred_adv = self.model_container.predict(adv)
+        success = np.zeros((n, num_classes), dtype=np.bool_)
+        success[rows, cols] = pred_adv == cols
+        l2 = np.full((n, num_classes), np.nan, dtype=np.float32)
+        l2[rows, cols] = get_l2_norm(
+            adv.reshape(len(adv), -1), x_rep.reshape(len(adv), -1))
+
+        time_elapsed = time.time() - since
+        logger.info('Time to complete %d targeted adv. examples: %dm %.3fs',
+                    len(adv), int(time_elapsed // 60), time_elapsed % 60)
+        logger.info('Success rate of all targets: %f',
+                    success.sum() / len(adv))
+
+        outputs = {
+            'success': success,
+            'l2': l2,
+            'x': x,
+            'pred_clean': pred_clean,
+        }
+        if return_adv:
+            adv_all = np.repeat(xx[:, np.newaxis], num_classes, axis=1) \
+                .astype(np.float32)
+            adv_all[rows, cols] = adv
+            if x.shape != xx.shape:
+                adv_all = np.stack([swap_image_channel(a) for a in adv_all])
+            pred_all = np.repeat(pred_clean[:, np.newaxis], num_classes, axis=1)
+            pred_all[rows, cols] = pred_adv
+            outputs['adv'] = adv_all
+            outputs['pred_adv'] = pred_all
+        return outputs
+
     def predict(self, adv, x):
         """Returns the predictions for adversarial examples and clean inputs."""
         pred_adv = self.model_container.predict(adv)
@@ -81,15 +358,55 @@ class AttackContainer(abc.ABC):
             np.save(filename_y, y_clean.astype(np.int64), allow_pickle=False)
         logger.info('Saved results to %s', filename_adv)
 
+    def save_attack_store(self,
+                          filename,
+                          x_adv,
+                          y_adv=None,
+                          x_clean=None,
+                          y_clean=None,
+                          overwrite=False,
+                          encoding='auto'):
+        """
+        Saving adversarial examples into an AdvStore directory, with the parameters of the attack and the hash of the
+        model. When the clean inputs are given, the adversarial examples are saved as the exact difference from them,
+        see `AdvStore`. Same as `save_attack`, the time is appended to the name, if the store exists and `overwrite`
+        is False. Returns the AdvStore.
+        """
+        assert isinstance(x_adv, np.ndarray)
+
+        if x_clean is None:
+            encoding = 'dense'
+        path = os.path.join('save', filename)
+        if not overwrite and os.path.exists(path):
+            new_path = path + '_' + get_time_str()
+            logger.info('Store %s already exists. Save new store as %s',
+                        path, new_path)
+            path = new_path
+        store = AdvStore.create(
+            path,
+            attack_name=self.__class__.__name__,
+            params=self._params,
+            model_hash=self._get_model_hash(),
+            encoding=encoding,
+            overwrite=overwrite)
+        store.append(
+            x_adv.astype(np.float32),
+            pred=y_adv.astype(np.int64) if y_adv is not None else None,
+            x=x_clean.astype(np.float32) if x_clean is not None else None,
+            y=y_clean.astype(np.int64) if y_clean is not None else None)
+        logger.info('Saved results to %s (%d bytes)', path, store.nbytes)
+        return store
+
     @staticmethod
     def load_adv_examples(filename):
         """
-        Load adversarial examples from a numpy binary file
+        Load adversarial examples from a numpy binary file, or an AdvStore directory. The arrays in an AdvStore are
+        memory-mapped.
 
         Parameters
         ----------
         filename : str
-            File name
+            File name, or the directory of an AdvStore.
 
         Returns
         -------
@@ -102,6 +419,10 @@ class AttackContainer(abc.ABC):
         y_true : numpy.ndarray, optional
             List of true labels.
         """
+        if AdvStore.is_store(filename):
+            store = AdvStore.open(filename)
+            return tuple(store.load(name) for name in AdvStore.NAMES)
+
         postfix = ['adv', 'pred', 'x', 'y']
         data_files = [filename.replace('_adv', '_' + s) for s in postfix]
         if not os.path.exists(data_files[1]):
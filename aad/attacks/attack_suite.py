@@ -0,0 +1,236 @@
+"""
+This module implements a runner of several attacks on the same model and inputs.
+"""
+import collections
+import logging
+import time
+
+import numpy as np
+import torch
+
+from ..basemodels import ModelContainerPT
+from ..utils import swap_image_channel
+from .art_classifier import to_art_input
+from .attack_cache import get_attack_cache
+from .attack_container import AttackContainer
+from .fgsm_attack import FGSMContainer
+from .pgd_attack import PGDContainer
+
+logger = logging.getLogger(__name__)
+
+
+class AttackSuite:
+    """
+    AttackSuite runs several attacks on the same inputs, and shares the work which they have in common:
+
+    - The clean inputs are predicted once. The predictions are the labels of the untargeted attacks and the returned
+      `pred_clean`, and DeepFool starts from the clean scores.
+    - The gradient of the loss at the clean inputs is computed in the same forward pass. It is the first step of
+      BIM and PGD without `random_init`, and it is the whole of FGSM with L-inf norm. Then, FGSM is computed in
+      NumPy without ART, including the `minimal` search. BIM and PGD skip their first forward/backward pass, when
+      their `batch_size` matches the mini-batches of the gradient.
+
+    The other attacks run as usual, and they only share the clean predictions. The outputs of each attack are the
+    same as the ones from its own `generate`. They are also loaded from and saved into the attack cache under the same
+    key, so the suite and `generate` share the entries.
+
+    Examples
+    --------
+    >>> suite = AttackSuite(mc, {'FGSM': {'eps': 0.3}, 'BIM': {'eps': 0.3}, 'DeepFool': {}})
+    >>> outputs = suite.generate(count=1000)
+    >>> adv, pred_adv, x_clean, pred_clean = outputs['BIM']
+    """
+
+    def __init__(self, model_container, attacks):
+        """
+        Create an AttackSuite instance.
+
+        Parameters
+        ----------
+        model_container : ModelContainerPT
+            A trained model.
+        attacks : dict
+            The name of each attack, and either an AttackContainer on the same model or the parameters of the attack
+            from `get_attack(name)`. They are run in the given order.
+        """
+        from . import get_attack
+
+        assert isinstance(model_container, ModelContainerPT)
+        self.model_container = model_container
+        self.attacks = collections.OrderedDict()
+        for name, attack in attacks.items():
+            if not isinstance(attack, AttackContainer):
+                attack = get_attack(name)(model_container, **attack)
+            assert attack.model_container is model_container, \
+                f'{name} is not on the same model.'
+            self.attacks[name] = attack
+
+    def generate(self, count=1000, use_testset=True, x=None):
+        """
+        Generate adversarial examples with all attacks.
+
+        Parameters
+        ----------
+        count : int
+            The number of adversarial examples will be generated from the test set.
+        use_testset : bool
+            Use test set to generate adversarial examples.
+        x : numpy.ndarray, optional
+            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
+            be ignored.
+
+        Returns
+        -------
+        collections.OrderedDict
+            The name of each attack, and its `adv`, `pred_adv`, `x_clean` and `pred_clean`.
+        """
+        assert use_testset or x is not None
+
+        since = time.time()
+        dc = self.model_container.data_container
+        if use_testset:
+            x = np.copy(dc.x_test[:count])
+            y = np.copy(dc.y_test[:count])
+        else:
+            x = np.copy(x)
+
+        # handle (h, w, c) to (c, h, w)
+        if dc.data_type == 'image' and x.shape[1] not in (1, 3):
+            xx = swap_image_channel(x)
+        else:
+            xx = x
+
+        outputs = collections.OrderedDict()
+        pending = collections.OrderedDict()
+        for name, attack in self.attacks.items():
+            cache = self._get_cache(attack)
+            outputs[name] = (cache.get(attack._get_key(x))
+                             if cache is not None else None)
+            if outputs[name] is None:
+                pending[name] = attack
+            else:
+                logger.info('Load %s from the attack cache.', name)
+        if len(pending) == 0:
+            return outputs
+
+        batch_size = self._get_grad_batch_size(pending.values())
+        pred_clean, scores, grads = self._clean_pass(xx, batch_size)
+        if use_testset:
+            acc = np.sum(np.equal(pred_clean, y)) / len(y)
+            logger.info('Accuracy on clean set: %f', acc)
+
+        for name, attack in pending.items():
+            since_attack = time.time()
+            attack._clean = (xx, pred_clean, scores)
+            try:
+                if grads is not None and self._is_fused_fgsm(attack):
+                    adv = self._fgsm(attack, to_art_input(xx), pred_clean,
+                                     grads)
+                elif (grads is not None
+                        and self._is_fused_pgd(attack, batch_size)):
+                    adv = attack._generate(xx, first_grad=grads)
+                else:
+                    adv = attack._generate(xx)
+            finally:
+                attack._clean = None
+            pred_adv = self.model_container.predict(adv)
+
+            # ensure the outputs and inputs have same shape
+            if x.shape != adv.shape:
+                adv = swap_image_channel(adv)
+            outputs[name] = (adv, pred_adv, x, pred_clean)
+            cache = self._get_cache(attack)
+            if cache is not None:
+                cache.put(attack._get_key(x), outputs[name])
+            logger.info('%s: success rate %f in %.3fs', name,
+                        np.mean(pred_adv != pred_clean),
+                        time.time() - since_attack)
+
+        time_elapsed = time.time() - since
+        logger.info('Time to complete %d attacks on %d samples: %dm %.3fs',
+                    len(outputs), len(x), int(time_elapsed // 60),
+                    time_elapsed % 60)
+        return outputs
+
+    @staticmethod
+    def _get_cache(attack):
+        """Returns the cache of the attack, or the one from `set_attack_cache`."""
+        return attack.cache if attack.cache is not None else get_attack_cache()
+
+    @staticmethod
+    def _is_fused_fgsm(attack):
+        params = attack.attack_params
+        return (isinstance(attack, FGSMContainer)
+                and params['norm'] == np.inf
+                and params['num_random_init'] == 0
+                and not params['targeted'])
+
+    @staticmethod
+    def _is_fused_pgd(attack, batch_size):
+        params = attack.attack_params
+        return (isinstance(attack, PGDContainer)
+                and not getattr(attack, '_use_art', False)
+                and not params['random_init']
+                and params['batch_size'] == batch_size)
+
+    def _get_grad_batch_size(self, attacks):
+        """
+        Returns the mini-batch size of the shared gradient. It follows the first BIM or PGD attack, since their first
+        step must see the same mini-batches. Returns None, if no attack uses the gradient.
+        """
+        fgsm_size = None
+        for attack in attacks:
+            if self._is_fused_pgd(attack, attack.attack_params['batch_size']):
+                return attack.attack_params['batch_size']
+            if fgsm_size is None and self._is_fused_fgsm(attack):
+                fgsm_size = attack.attack_params['batch_size']
+        return fgsm_size
+
+    def _clean_pass(self, x, batch_size):
+        """
+        Returns the predictions and the scores of the clean inputs. When `batch_size` is given, also returns the
+        gradient of the loss, where the predictions are the labels. Otherwise, the gradient is None.
+        """
+        if batch_size is None:
+            pred, scores = self.model_container.predict(x, require_score=True)
+            return pred, scores, None
+
+        device = self.model_container.device
+        model = self.model_container.model
+        model.eval()
+        # same as the attacks, the gradient is computed in float32
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        num_classes = self.model_container.data_container.num_classes
+        scores = np.zeros((len(x), num_classes), dtype=np.float32)
+        grads = np.zeros_like(x)
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            xb = torch.from_numpy(x[start: end]).to(device).requires_grad_(True)
+            outputs = model(xb)
+            labels = outputs.argmax(dim=1)
+            loss = model.loss_fn(outputs, labels)
+            grads[start: end] = torch.autograd.grad(loss, xb)[0].cpu().numpy()
+            scores[start: end] = outputs.detach().cpu().numpy()
+        return np.argmax(scores, axis=1), scores, grads
+
+    def _fgsm(self, attack, x, labels, grads):
+        """Returns the FGSM examples from the gradient at the clean inputs."""
+        params = attack.attack_params
+        clip_min, clip_max = self.model_container.data_container.data_range
+        perturbation = np.sign(grads)
+        if not params['minimal']:
+            return np.clip(x + params['eps'] * perturbation, clip_min, clip_max)
+
+        # Same as ART, the perturbation grows by eps_step until the prediction
+        # changes or it reaches eps.
+        adv = np.copy(x)
+        active = np.arange(len(x))
+        current_eps = params['eps_step']
+        while len(active) > 0 and current_eps <= params['eps']:
+            adv[active] = np.clip(
+                x[active] + current_eps * perturbation[active],
+                clip_min, clip_max)
+            pred = self.model_container.predict(adv[active])
+            active = active[pred == labels[active]]
+            current_eps += params['eps_step']
+        return adv
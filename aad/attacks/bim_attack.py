@@ -2,88 +2,47 @@
 This module implements the BIM attack.
 """
 import logging
-import time
 
 import numpy as np
 from art.attacks.evasion import BasicIterativeMethod
-from art.classifiers import PyTorchClassifier
 
-from ..utils import get_range, swap_image_channel
-from .attack_container import AttackContainer
+from .art_classifier import get_art_classifier, to_art_input
+from .pgd_attack import PGDContainer
 
 logger = logging.getLogger(__name__)
 
 
-class BIMContainer(AttackContainer):
-    def __init__(self, model_container, eps=0.3, eps_step=0.1, max_iter=100,
-                 targeted=False, batch_size=64):
-        super(BIMContainer, self).__init__(model_container)
-
-        params_received = {
-            'eps': eps,
-            'eps_step': eps_step,
-            'max_iter': max_iter,
-            'targeted': targeted,
-            'batch_size': batch_size}
-        self._params = params_received
-
-        # use IBM ART pytorch module wrapper
-        # the model used here should be already trained
-        model = self.model_container.model
-        loss_fn = self.model_container.model.loss_fn
-        dc = self.model_container.data_container
-        clip_values = get_range(dc.x_train, dc.data_type == 'image')
-        optimizer = self.model_container.model.optimizer
-        num_classes = self.model_container.data_container.num_classes
-        dim_data = self.model_container.data_container.dim_data
-        self.classifier = PyTorchClassifier(
-            model=model,
-            clip_values=clip_values,
-            loss=loss_fn,
-            optimizer=optimizer,
-            input_shape=dim_data,
-            nb_classes=num_classes)
-
-    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
-
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
+class BIMContainer(PGDContainer):
+    """
+    Basic Iterative Method. By default, it uses the PyTorch implementation in PGDContainer. Set `use_art` to True to
+    use IBM ART's BasicIterativeMethod instead. `early_exit` is only supported by the PyTorch implementation.
+    """
 
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
-
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
-        else:
-            xx = x
-
-        adv = self._generate(xx, targets)
-        y_adv, y_clean = self.predict(adv, xx)
-
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, y_adv, x, y_clean
+    def __init__(self, model_container, eps=0.3, eps_step=0.1, max_iter=100,
+                 targeted=False, batch_size=64, early_exit=False,
+                 use_art=False):
+        super(BIMContainer, self).__init__(
+            model_container,
+            norm=np.inf,
+            eps=eps,
+            eps_step=eps_step,
+            max_iter=max_iter,
+            targeted=targeted,
+            random_init=False,
+            batch_size=batch_size,
+            early_exit=early_exit)
+        self._use_art = use_art
+        self.classifier = None
+
+        if use_art:
+            if early_exit:
+                logger.warning('ART does not support early exit. Ignored.')
+            self.classifier = get_art_classifier(self.model_container)
+
+    def _generate(self, x, targets=None, first_grad=None):
+        if not self._use_art:
+            return super(BIMContainer, self)._generate(x, targets, first_grad)
 
-    def _generate(self, x, targets=None):
         targeted = targets is not None
         # handle the situation where targets are more than test set
         if targets is not None:
@@ -91,12 +50,13 @@ class BIMContainer(AttackContainer):
             targets = targets[:len(x)]  # trancate targets
 
         self._params['targeted'] = targeted
-        attack = BasicIterativeMethod(
-            classifier=self.classifier, **self._params)
+        params = {k: v for k, v in self._params.items()
+                  if k not in ('norm', 'random_init', 'early_exit')}
+        self.classifier = get_art_classifier(self.model_container)
+        attack = BasicIterativeMethod(classifier=self.classifier, **params)
 
-        # predict the outcomes
-        if targets is not None:
-            adv = attack.generate(x, targets)
-        else:
-            adv = attack.generate(x)
-        return adv
+        def generate_fn(x, labels):
+            return attack.generate(to_art_input(x), labels)
+
+        return self._generate_in_chunks(
+            generate_fn, x, self._get_art_labels(x, targets))
@@ -2,19 +2,18 @@
 This module implements the Carlini and Wagner L2 attack.
 """
 import logging
-import time
 
-import numpy as np
 from art.attacks.evasion import CarliniL2Method
-from art.classifiers import PyTorchClassifier
 
-from ..utils import get_range, swap_image_channel
+from .art_classifier import get_art_classifier, to_art_input
 from .attack_container import AttackContainer
 
 logger = logging.getLogger(__name__)
 
 
 class CarliniL2Container(AttackContainer):
+    SUPPORTS_TARGETS = True
+
     def __init__(self, model_container, confidence=0.0, targeted=False,
                  learning_rate=1e-2, binary_search_steps=10, max_iter=100,
                  initial_const=1e-2, max_halving=5, max_doubling=10, batch_size=8):
@@ -33,62 +32,7 @@ class CarliniL2Container(AttackContainer):
             'max_doubling': max_doubling,
             'batch_size': batch_size}
 
-        # use IBM ART pytorch module wrapper
-        # the model used here should be already trained
-        model = self.model_container.model
-        dc = self.model_container.data_container
-        loss_fn = model.loss_fn
-        dc = self.model_container.data_container
-        clip_values = get_range(dc.x_train, dc.data_type == 'image')
-        optimizer = model.optimizer
-        num_classes = dc.num_classes
-        dim_data = dc.dim_data
-        self.classifier = PyTorchClassifier(
-            model=model,
-            clip_values=clip_values,
-            loss=loss_fn,
-            optimizer=optimizer,
-            input_shape=dim_data,
-            nb_classes=num_classes)
-
-    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
-
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
-
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
-
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
-        else:
-            xx = x
-
-        adv = self._generate(xx, targets)
-        y_adv, y_clean = self.predict(adv, xx)
-
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, y_adv, x, y_clean
+        self.classifier = get_art_classifier(self.model_container)
 
     def _generate(self, x, targets=None):
         targeted = targets is not None
@@ -98,12 +42,12 @@ class CarliniL2Container(AttackContainer):
             targets = targets[:len(x)]  # trancate targets
 
         self._params['targeted'] = targeted
+        self.classifier = get_art_classifier(self.model_container)
         attack = CarliniL2Method(
             classifier=self.classifier, **self._params)
 
-        # predict the outcomes
-        if targets is not None:
-            adv = attack.generate(x, targets)
-        else:
-            adv = attack.generate(x)
-        return adv
+        def generate_fn(x, labels):
+            return attack.generate(to_art_input(x), labels)
+
+        return self._generate_in_chunks(
+            generate_fn, x, self._get_art_labels(x, targets))
@@ -1,6 +1,7 @@
 """
 This module implements the Carlini and Wagner L2 attack.
 """
+import collections
 import logging
 import time
 
@@ -8,8 +9,7 @@ import numpy as np
 import torch
 from torch.utils.data import DataLoader
 
-from ..datasets import GenericDataset
-from ..utils import get_range, swap_image_channel
+from ..datasets import BatchIndexSampler, GenericDataset
 from .attack_container import AttackContainer
 
 logger = logging.getLogger(__name__)
@@ -35,7 +35,10 @@ class CarliniL2V2Container(AttackContainer):
                  abort_early=True,
                  batch_size=32,
                  clip_values=None,
-                 check_prob=True):
+                 check_prob=True,
+                 search_mode='sequential',
+                 parallel_consts=None,
+                 refine_steps=2):
         """
         Create an instance of Carlini and Wagner L2-norm attack Container.
 
@@ -61,102 +64,52 @@ class CarliniL2V2Container(AttackContainer):
             The clipping lower bound and upper bound for adversarial examples.
         check_prob : bool
             The score should not use softmax probability! Turn is off, if you know what you are doing.
+        search_mode : {'sequential', 'parallel', 'hybrid', 'queue'}
+            How to search the constant c. 'sequential' runs `binary_search_steps` optimisations one after another.
+            'parallel' optimises `parallel_consts` constants for each input at once, by expanding the mini-batch, and
+            keeps the successful example with the smallest L2 norm. 'hybrid' runs the parallel sweep first, and then
+            refines c with `refine_steps` sequential binary search steps. 'queue' runs the sequential search for each
+            sample on its own: `abort_early` checks the loss of each sample, a sample leaves the mini-batch once all
+            its search steps are done, and the free rows are filled from a queue of the remaining inputs.
+        parallel_consts : int, optional
+            The number of constants in the parallel sweep. The constants are `initial_const * 10^k`. Use
+            `binary_search_steps`, if it is None. The mini-batch is `parallel_consts` times larger in the sweep.
+        refine_steps : int
+            The number of sequential binary search steps after the parallel sweep in 'hybrid' mode.
         """
         super(CarliniL2V2Container, self).__init__(model_container)
 
         dc = self.model_container.data_container
-        data = dc.x_train
-        dmax = np.max(data)
-        dmin = np.min(data)
+        data_range = dc.data_range
+        dmax = np.max(data_range[1])
+        dmin = np.min(data_range[0])
         if dmax > 1.0 or dmin < 0.0:
             logger.warning(
                 'The data is range [%f, %f]. Consider using a normalised dataset.',
                 dmin, dmax)
 
         if clip_values is None:
-            clip_values = get_range(dc.x_train, dc.data_type == 'image')
+            clip_values = data_range
+        assert search_mode in ('sequential', 'parallel', 'hybrid', 'queue'), \
+            f'Received unknown search mode "{search_mode}"'
 
         self._params = {
             'targeted': targeted,
             'learning_rate': learning_rate,
             'binary_search_steps': binary_search_steps,
             'max_iter': max_iter,
+            'confidence': confidence,
             'initial_const': initial_const,
             'c_range': c_range,
             'clip_values': clip_values,
             'abort_early': abort_early,
             'batch_size': batch_size,
+            'search_mode': search_mode,
+            'parallel_consts': parallel_consts,
+            'refine_steps': refine_steps,
+            'check_prob': check_prob,
         }
 
-        self.confidence = confidence
-        self.check_prob = check_prob
-
-    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
-        """
-        Generate adversarial examples.
-
-        Parameters
-        ----------
-        count : int
-            The number of adversarial examples will be generated from the test set. This parameter will not be used
-            when 
-        use_testset : bool
-            Use test set to generate adversarial examples.
-        x : numpy.ndarray, optional
-            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
-            be ignored.
-        targets : numpy.ndarray, optional
-            The expected labels for targeted attack.
-
-        Returns
-        -------
-        adv : numpy.ndarray
-            The adversarial examples which have same shape as x.
-        pred_adv :  : numpy.ndarray
-            The predictions of adv. examples.
-        x_clean : numpy.ndarray
-            The clean inputs.
-        pred_clean : numpy.ndarray
-            The prediction of clean inputs.
-        """
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
-
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
-
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
-
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
-        else:
-            xx = x
-
-        adv = self._generate(xx, targets)
-        pred_adv, pred_clean = self.predict(adv, xx)
-
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, pred_adv, x, pred_clean
-
     def _generate(self, inputs, targets=None):
         num_advs = len(inputs)
         num_classes = self.model_container.data_container.num_classes
@@ -164,49 +117,44 @@ class CarliniL2V2Container(AttackContainer):
         c_range = self._params['c_range']
         initial_const = self._params['initial_const']
         batch_size = self._params['batch_size']
-        lr = self._params['learning_rate']
         binary_search_steps = self._params['binary_search_steps']
-        repeat = binary_search_steps >= 10
-        max_iter = self._params['max_iter']
-        abort_early = self._params['abort_early']
+        search_mode = self._params['search_mode']
+        num_consts = self._params['parallel_consts'] or binary_search_steps
 
         # prepare data
         # Assume the predictions on clean inputs are correct.
-        labels = self.model_container.predict(inputs)
+        labels = self._predict_clean(inputs)
+        checkpoint = self._open_checkpoint(inputs, labels)
+        if search_mode == 'queue':
+            return self._search_queue(inputs, labels, checkpoint)
+
         dataset = GenericDataset(inputs, labels)
+        # The results are written in the order of the inputs, so the batches
+        # must not be shuffled.
         dataloader = DataLoader(
             dataset,
-            batch_size,
-            shuffle=True,
+            batch_size=None,
+            sampler=BatchIndexSampler(len(dataset), batch_size, shuffle=False),
             num_workers=0)
 
-        full_input_np = np.zeros_like(inputs, dtype=np.float32)
         full_adv_np = np.zeros_like(inputs, dtype=np.float32)
-        full_l2_np = 1e9 * np.ones(num_advs, dtype=np.float32)
-        full_label_np = -np.ones(num_advs, dtype=np.int64)
-        full_pred_np = -np.ones(num_advs, dtype=np.int64)
+        if checkpoint is not None:
+            checkpoint.load(full_adv_np)
 
         count = 0  # only count the image can be classified correct
         self._log_time_start()
         for x, y in dataloader:
+            # skip the mini-batches which are saved in the checkpoint
+            if checkpoint is not None and \
+                    checkpoint.is_done(slice(count, count + len(x))):
+                count += len(x)
+                continue
             since = time.time()
 
             x = x.to(device)
             y = y.to(device)
             batch_size = len(x)
 
-            # c is the lagrange multiplier for optimization objective
-            lower_bounds_np = np.ones(
-                batch_size, dtype=np.float32) * c_range[0]
-            c_np = np.ones(batch_size, dtype=np.float32) * initial_const
-            upper_bounds_np = np.ones(
-                batch_size, dtype=np.float32) * c_range[1]
-
-            # overall results
-            o_best_l2_np = np.ones(batch_size, dtype=np.float32) * self.INF
-            o_best_pred_np = -np.ones(batch_size, dtype=np.int64)
-            o_best_adv = torch.zeros_like(x)  # uses same device as x
-
             # we optimize over the tanh-space
             x_tanh = self._to_tanh(x, device)
             assert x_tanh.size() == x.size()
@@ -217,107 +165,48 @@ class CarliniL2V2Container(AttackContainer):
             targets_oh = self._onehot_encoding(targets)
             assert targets_oh.size() == (batch_size, num_classes)
 
-            # the perturbation variable to optimize (In Carlini's code it's denoted as `modifier`)
-            pert_tanh = torch.zeros_like(
-                x, requires_grad=True)  # uses same device as x
-            assert device == 'cpu' or pert_tanh.is_cuda
-
-            # we retrain it for every batch
-            optimizer = torch.optim.Adam([pert_tanh], lr=lr)
-
-            for sstep in range(binary_search_steps):
-                # at least try upper bound once
-                if repeat and sstep == binary_search_steps - 1:
-                    c_np = upper_bounds_np
-
-                c = torch.from_numpy(c_np)
-                c = c.to(device)
-
-                best_l2_np = np.ones(batch_size, dtype=np.float32) * self.INF
-                best_pred_np = -np.ones(batch_size, dtype=np.int64)
-
-                # previous (summed) batch loss, to be used in early stopping policy
-                prev_batch_loss = self.INF  # type: float
-
-                # optimization step
-                for ostep in range(max_iter):
-                    loss, l2_norms, adv_outputs, advs = self._optimize(
-                        optimizer, x_tanh, pert_tanh, targets_oh, c)
-
-                    # check if we should abort search if we're getting nowhere
-                    if abort_early and ostep % (max_iter//10) == 0:
-                        loss = loss.cpu().detach().item()
-                        assert type(prev_batch_loss) == type(loss)
-                        if loss > prev_batch_loss * (1-1e-4):
-                            break
-                        prev_batch_loss = loss  # only check it 10 times
-
-                    # update result
-                    adv_outputs_np = adv_outputs.cpu().detach().numpy()
-                    targets_np = targets.cpu().detach().numpy()
-
-                    # compensate outputs with parameter confidence
-                    adv_outputs_np = self._compensate_confidence(
-                        adv_outputs_np, targets_np)
-                    adv_predictions_np = np.argmax(adv_outputs_np, axis=1)
-
-                    for i in range(batch_size):
-                        i_l2 = l2_norms[i].item()
-                        i_adv_pred = adv_predictions_np[i]
-                        i_target = targets_np[i]
-                        i_adv = advs[i]  # a tensor
-
-                        if self._does_attack_success(i_adv_pred, i_target):
-                            if i_l2 < best_l2_np[i]:
-                                best_l2_np[i] = i_l2
-                                best_pred_np[i] = i_adv_pred
-
-                            if i_l2 < o_best_l2_np[i]:
-                                o_best_l2_np[i] = i_l2
-                                o_best_pred_np[i] = i_adv_pred
-                                o_best_adv[i] = i_adv
-
-                # binary search for c
-                for i in range(batch_size):
-                    i_target = targets_np[i]
-                    assert best_pred_np[i] == - \
-                        1 or self._does_attack_success(
-                            best_pred_np[i], i_target)
-                    assert o_best_pred_np[i] == - \
-                        1 or self._does_attack_success(
-                            o_best_pred_np[i], i_target)
-
-                    if best_pred_np[i] != -1:  # successful, try lower `c` value
-                        # update upper bound, and divide c by 2
-                        upper_bounds_np[i] = min(upper_bounds_np[i], c_np[i])
-                        # 1e9 was used in carlini's implementation
-                        if upper_bounds_np[i] < c_range[1] * 0.1:
-                            c_np[i] = (lower_bounds_np[i] +
-                                       upper_bounds_np[i]) / 2.
-
-                    else:  # failure, try larger `c` value
-                        # either multiply by 10 if no solution found yet
-                        # or do binary search with the known upper bound
-                        lower_bounds_np[i] = max(lower_bounds_np[i], c_np[i])
-
-                        # 1e9 was used in carlini's implementation
-                        if upper_bounds_np[i] < c_range[1] * 0.1:
-                            c_np[i] = (lower_bounds_np[i] +
-                                       upper_bounds_np[i]) / 2.
-                        else:
-                            c_np[i] *= 10
+            if search_mode == 'sequential':
+                # c is the lagrange multiplier for optimization objective
+                lower_bounds = torch.full(
+                    (batch_size,), c_range[0], dtype=torch.float32, device=device)
+                c = torch.full(
+                    (batch_size,), initial_const, dtype=torch.float32, device=device)
+                upper_bounds = torch.full(
+                    (batch_size,), c_range[1], dtype=torch.float32, device=device)
+
+                # overall results
+                o_best = self._init_best(x)
+
+                # the perturbation variable to optimize (In Carlini's code it's denoted as `modifier`)
+                pert_tanh = torch.zeros_like(
+                    x, requires_grad=True)  # uses same device as x
+                assert pert_tanh.device == x.device
+
+                self._search_sequential(
+                    x_tanh, pert_tanh, targets, targets_oh,
+                    c, lower_bounds, upper_bounds, o_best,
+                    binary_search_steps, repeat=binary_search_steps >= 10)
+            else:
+                o_best, c, lower_bounds, upper_bounds, pert_tanh = \
+                    self._search_parallel(
+                        x_tanh, targets, targets_oh, num_consts)
+                if search_mode == 'hybrid':
+                    self._search_sequential(
+                        x_tanh, pert_tanh, targets, targets_oh,
+                        c, lower_bounds, upper_bounds, o_best,
+                        self._params['refine_steps'], repeat=False)
+            o_best_l2, _, o_best_adv = o_best
 
             # save results
-            full_l2_np[count: count+batch_size] = o_best_l2_np
-            full_label_np[count: count+batch_size] = y.cpu().detach().numpy()
-            full_pred_np[count: count+batch_size] = o_best_pred_np
-            full_input_np[count: count+batch_size] = x.cpu().detach().numpy()
             full_adv_np[count: count +
                         batch_size] = o_best_adv.cpu().detach().numpy()
+            if checkpoint is not None:
+                checkpoint.save(slice(count, count + batch_size),
+                                full_adv_np[count: count + batch_size])
 
             # display logs
             time_elapsed = time.time() - since
-            mean_l2 = np.mean(o_best_l2_np)
+            mean_l2 = o_best_l2.mean().item()
             debug_str = '[{:4d}/{:4d}] - {:2.0f}m {:2.1f}s - L2 mean: {:.4f}'.format(
                 count,
                 num_advs,
@@ -331,6 +220,364 @@ class CarliniL2V2Container(AttackContainer):
         self._log_time_end('Carlini & Wagner Attack L2')
         return full_adv_np
 
+    def _init_best(self, x):
+        """Returns the best L2 norms, predictions and adversarial examples."""
+        device = x.device
+        best_l2 = torch.full(
+            (len(x),), self.INF, dtype=torch.float32, device=device)
+        best_pred = -torch.ones(len(x), dtype=torch.int64, device=device)
+        best_adv = torch.zeros_like(x)  # uses same device as x
+        return [best_l2, best_pred, best_adv]
+
+    def _search_sequential(self, x_tanh, pert_tanh, targets, targets_oh, c,
+                           lower_bounds, upper_bounds, o_best, steps, repeat):
+        """
+        Runs the binary search steps one after another. The perturbation and
+        the optimizer carry over between the steps. `o_best` is updated in
+        place.
+        """
+        lr = self._params['learning_rate']
+        # we retrain it for every batch
+        optimizer = torch.optim.Adam([pert_tanh], lr=lr)
+
+        for sstep in range(steps):
+            # at least try upper bound once
+            if repeat and sstep == steps - 1:
+                c = upper_bounds.clone()
+
+            best = self._optimize_const(
+                optimizer, x_tanh, pert_tanh, targets, targets_oh, c, o_best)
+            c, lower_bounds, upper_bounds = self._update_const(
+                best[1] != -1, c, lower_bounds, upper_bounds)
+
+    def _search_parallel(self, x_tanh, targets, targets_oh, num_consts):
+        """
+        Optimises `num_consts` constants for each input at once. The inputs
+        are repeated, so the mini-batch is `num_consts` times larger.
+
+        Returns the best results of each input, the next constants and their
+        bounds for a sequential search, and the perturbation of the selected
+        constant to continue with.
+        """
+        batch_size = len(x_tanh)
+        device = x_tanh.device
+        c_range = self._params['c_range']
+        lr = self._params['learning_rate']
+
+        # the constants of the k-th copy of the inputs: initial_const * 10^k
+        powers = torch.arange(num_consts, dtype=torch.float32, device=device)
+        consts = self._params['initial_const'] * torch.pow(10., powers)
+        consts = torch.clamp(consts, c_range[0], c_range[1])
+
+        # layout: (batch_size, num_consts) flattened row by row
+        x_tanh_ex = x_tanh.repeat_interleave(num_consts, dim=0)
+        targets_ex = targets.repeat_interleave(num_consts, dim=0)
+        targets_oh_ex = targets_oh.repeat_interleave(num_consts, dim=0)
+        c_ex = consts.repeat(batch_size)
+
+        pert_tanh = torch.zeros_like(x_tanh_ex, requires_grad=True)
+        optimizer = torch.optim.Adam([pert_tanh], lr=lr)
+        o_best_ex = self._init_best(x_tanh_ex)
+        self._optimize_const(
+            optimizer, x_tanh_ex, pert_tanh, targets_ex, targets_oh_ex,
+            c_ex, o_best_ex)
+
+        # pick the successful constant with the smallest L2 norm
+        l2_ex = o_best_ex[0].view(batch_size, num_consts)
+        successful = o_best_ex[1].view(batch_size, num_consts) != -1
+        selected = torch.argmin(l2_ex, dim=1)
+        rows = torch.arange(batch_size, device=device) * num_consts + selected
+        o_best = [o_best_ex[0][rows], o_best_ex[1][rows], o_best_ex[2][rows]]
+
+        # the bounds of c: the smallest successful constant and the largest
+        # failed constant below it.
+        c_grid = consts.expand(batch_size, num_consts)
+        upper_bounds = torch.where(
+            successful, c_grid, torch.full_like(c_grid, c_range[1])
+        ).min(dim=1)[0]
+        lower_bounds = torch.where(
+            ~successful & (c_grid < upper_bounds.unsqueeze(1)),
+            c_grid, torch.full_like(c_grid, c_range[0])).max(dim=1)[0]
+
+        # continue with the largest constant, if all constants failed
+        any_success = successful.any(dim=1)
+        selected = torch.where(
+            any_success, selected, torch.full_like(selected, num_consts - 1))
+        rows = torch.arange(batch_size, device=device) * num_consts + selected
+        c, lower_bounds, upper_bounds = self._update_const(
+            any_success, c_grid.gather(1, selected.unsqueeze(1)).squeeze(1),
+            lower_bounds, upper_bounds)
+        pert_tanh = pert_tanh.detach()[rows].requires_grad_(True)
+        return o_best, c, lower_bounds, upper_bounds, pert_tanh
+
+    def _search_queue(self, inputs, labels, checkpoint=None):
+        """
+        Runs the sequential binary search with a work queue. Each row of the
+        active mini-batch holds one sample with its own constant, iteration
+        counter, search step and Adam state. `abort_early` compares the loss
+        of each sample with its loss at the previous check, which is done
+        every `max_iter // 10` iterations with one host synchronisation. When
+        a sample finishes its last search step, it is removed and the next
+        input in the queue takes its place. With a checkpoint, the finished
+        samples are saved in groups of `batch_size`.
+        """
+        device = self.model_container.device
+        max_iter = self._params['max_iter']
+        abort_early = self._params['abort_early']
+        steps = self._params['binary_search_steps']
+        repeat = steps >= 10
+        batch_size = self._params['batch_size']
+        lr = self._params['learning_rate']
+        # check abort early 10 times in each binary search step
+        abort_interval = max(1, max_iter // 10)
+
+        x_all = torch.from_numpy(np.ascontiguousarray(inputs, dtype=np.float32))
+        y_all = torch.from_numpy(labels)
+        full_adv_np = np.zeros_like(inputs, dtype=np.float32)
+        if checkpoint is not None:
+            checkpoint.load(full_adv_np)
+            queue = collections.deque(np.where(~checkpoint.finished)[0])
+        else:
+            queue = collections.deque(range(len(inputs)))
+        # the finished samples which are not in the checkpoint yet
+        unsaved = []
+
+        state = None
+        indices = np.zeros(0, dtype=np.int64)  # input indices of the rows
+        counters = np.zeros(0, dtype=np.int64)  # iterations in this step
+        search_steps = np.zeros(0, dtype=np.int64)
+        it = 0
+        total_rows = 0
+
+        self._log_time_start()
+        while len(queue) > 0 or len(indices) > 0:
+            # fill the free rows from the queue
+            num_new = min(batch_size - len(indices), len(queue))
+            if num_new > 0:
+                new_indices = np.array(
+                    [queue.popleft() for _ in range(num_new)], dtype=np.int64)
+                new_state = self._init_queue_state(
+                    x_all[new_indices].to(device), y_all[new_indices].to(device))
+                if state is None:
+                    state = new_state
+                else:
+                    state = {k: torch.cat((state[k], new_state[k]))
+                             for k in state}
+                indices = np.append(indices, new_indices)
+                counters = np.append(counters, np.zeros(num_new, np.int64))
+                search_steps = np.append(
+                    search_steps, np.zeros(num_new, np.int64))
+
+            # one optimisation step for all active rows
+            pert_tanh = state['pert'].detach().requires_grad_(True)
+            losses, l2_norms, adv_outputs, advs = self._get_loss(
+                state['x_tanh'], pert_tanh, state['targets_oh'], state['c'])
+            grad, = torch.autograd.grad(torch.sum(losses), pert_tanh)
+            total_rows += len(indices)
+            counters += 1
+
+            with torch.no_grad():
+                self._adam_step(state, grad, lr)
+
+                # check if the samples are getting nowhere
+                # This is the only synchronisation with the host.
+                converged = torch.zeros_like(state['c'], dtype=torch.bool)
+                converged_np = np.zeros(len(indices), dtype=bool)
+                if abort_early and it % abort_interval == 0:
+                    converged = losses > state['prev_loss'] * (1-1e-4)
+                    state['prev_loss'] = losses
+                    converged_np = converged.cpu().numpy()
+                it += 1
+
+                # update result
+                adv_outputs = self._compensate_confidence(
+                    adv_outputs, state['targets_oh'])
+                adv_predictions = adv_outputs.argmax(dim=1)
+                success = self._does_attack_success(
+                    adv_predictions, state['targets']) & ~converged
+                self._update_queue_best(
+                    state, success, l2_norms, adv_predictions, advs)
+
+                # the end of a search step
+                step_end_np = converged_np | (counters >= max_iter)
+                if not step_end_np.any():
+                    continue
+                step_end = torch.from_numpy(step_end_np).to(device)
+                c, lower, upper = self._update_const(
+                    state['best_pred'] != -1,
+                    state['c'], state['lower'], state['upper'])
+                state['c'] = torch.where(step_end, c, state['c'])
+                state['lower'] = torch.where(step_end, lower, state['lower'])
+                state['upper'] = torch.where(step_end, upper, state['upper'])
+                state['best_l2'][step_end] = self.INF
+                state['best_pred'][step_end] = -1
+                state['prev_loss'][step_end] = self.INF
+                counters[step_end_np] = 0
+                search_steps[step_end_np] += 1
+
+                # at least try upper bound once
+                if repeat:
+                    last = torch.from_numpy(
+                        step_end_np & (search_steps == steps - 1)).to(device)
+                    state['c'] = torch.where(last, state['upper'], state['c'])
+
+                # save and remove the finished samples
+                finished_np = search_steps >= steps
+                if finished_np.any():
+                    finished = torch.from_numpy(finished_np).to(device)
+                    full_adv_np[indices[finished_np]] = \
+                        state['o_adv'][finished].cpu().numpy()
+                    unsaved.extend(indices[finished_np])
+                    if checkpoint is not None and (
+                            len(unsaved) >= batch_size or len(queue) == 0):
+                        unsaved = np.array(unsaved, dtype=np.int64)
+                        checkpoint.save(unsaved, full_adv_np[unsaved])
+                        unsaved = []
+                    keep = ~finished
+                    state = {k: v[keep] for k, v in state.items()}
+                    keep_np = ~finished_np
+                    indices = indices[keep_np]
+                    counters = counters[keep_np]
+                    search_steps = search_steps[keep_np]
+
+        if it > 0:
+            logger.debug(
+                'Average active batch size: %.2f in %d iterations',
+                total_rows / it, it)
+        self._log_time_end('Carlini & Wagner Attack L2')
+        return full_adv_np
+
+    def _init_queue_state(self, x, y):
+        """Returns the state of the new rows in the work queue."""
+        device = x.device
+        c_range = self._params['c_range']
+        n = len(x)
+
+        def full(value):
+            return torch.full((n,), value, dtype=torch.float32, device=device)
+
+        best_l2, best_pred, best_adv = self._init_best(x)
+        return {
+            'x_tanh': self._to_tanh(x, device),
+            'targets': y,
+            'targets_oh': self._onehot_encoding(y),
+            'pert': torch.zeros_like(x),
+            # Adam state of each row
+            'adam_m': torch.zeros_like(x),
+            'adam_v': torch.zeros_like(x),
+            'adam_t': full(0.),
+            'c': full(self._params['initial_const']),
+            'lower': full(c_range[0]),
+            'upper': full(c_range[1]),
+            'prev_loss': full(self.INF),
+            # the best results in the current search step
+            'best_l2': full(self.INF),
+            'best_pred': -torch.ones(n, dtype=torch.int64, device=device),
+            # the overall results
+            'o_l2': best_l2,
+            'o_pred': best_pred,
+            'o_adv': best_adv,
+        }
+
+    @staticmethod
+    def _adam_step(state, grad, lr, betas=(0.9, 0.999), eps=1e-8):
+        """Same as torch.optim.Adam, but each row has its own step count, so
+        the rows can be removed and added independently."""
+        beta1, beta2 = betas
+        m, v, t = state['adam_m'], state['adam_v'], state['adam_t']
+        t.add_(1.)
+        m.mul_(beta1).add_(grad, alpha=1-beta1)
+        v.mul_(beta2).addcmul_(grad, grad, value=1-beta2)
+        shape = (-1,) + (1,) * (grad.dim() - 1)
+        bias_correction1 = (1 - torch.pow(beta1, t)).view(shape)
+        bias_correction2 = (1 - torch.pow(beta2, t)).view(shape)
+        denom = (v.sqrt() / bias_correction2.sqrt()).add_(eps)
+        state['pert'].sub_(lr * m / denom / bias_correction1)
+
+    @staticmethod
+    def _update_queue_best(state, success, l2_norms, preds, advs):
+        improved = success & (l2_norms < state['best_l2'])
+        state['best_l2'] = torch.where(improved, l2_norms, state['best_l2'])
+        state['best_pred'] = torch.where(improved, preds, state['best_pred'])
+
+        improved = success & (l2_norms < state['o_l2'])
+        state['o_l2'] = torch.where(improved, l2_norms, state['o_l2'])
+        state['o_pred'] = torch.where(improved, preds, state['o_pred'])
+        mask = improved.view((-1,) + (1,) * (advs.dim() - 1))
+        state['o_adv'] = torch.where(mask, advs, state['o_adv'])
+
+    def _optimize_const(self, optimizer, x_tanh, pert_tanh, targets,
+                        targets_oh, c, o_best):
+        """
+        Runs one binary search step for the constants `c`. Returns the best
+        L2 norms and predictions within this step. The overall results in
+        `o_best` are updated in place.
+        """
+        max_iter = self._params['max_iter']
+        abort_early = self._params['abort_early']
+        # check abort early 10 times in each binary search step
+        abort_interval = max(1, max_iter // 10)
+        device = x_tanh.device
+
+        best_l2 = torch.full(
+            (len(x_tanh),), self.INF, dtype=torch.float32, device=device)
+        best_pred = -torch.ones(len(x_tanh), dtype=torch.int64, device=device)
+
+        # previous (summed) batch loss, to be used in early stopping policy
+        prev_batch_loss = self.INF  # type: float
+
+        # optimization step
+        for ostep in range(max_iter):
+            loss, l2_norms, adv_outputs, advs = self._optimize(
+                optimizer, x_tanh, pert_tanh, targets_oh, c)
+
+            # check if we should abort search if we're getting nowhere
+            # This is the only synchronisation with the host.
+            if abort_early and ostep % abort_interval == 0:
+                loss = loss.item()
+                if loss > prev_batch_loss * (1-1e-4):
+                    break
+                prev_batch_loss = loss  # only check it 10 times
+
+            # update result
+            with torch.no_grad():
+                # compensate outputs with parameter confidence
+                adv_outputs = self._compensate_confidence(
+                    adv_outputs, targets_oh)
+                adv_predictions = adv_outputs.argmax(dim=1)
+                success = self._does_attack_success(adv_predictions, targets)
+
+                improved = success & (l2_norms < best_l2)
+                best_l2 = torch.where(improved, l2_norms, best_l2)
+                best_pred = torch.where(improved, adv_predictions, best_pred)
+
+                o_best_l2, o_best_pred, o_best_adv = o_best
+                improved = success & (l2_norms < o_best_l2)
+                o_best[0] = torch.where(improved, l2_norms, o_best_l2)
+                o_best[1] = torch.where(improved, adv_predictions, o_best_pred)
+                mask = improved.view((-1,) + (1,) * (advs.dim() - 1))
+                o_best[2] = torch.where(mask, advs, o_best_adv)
+        return best_l2, best_pred
+
+    def _update_const(self, successful, c, lower_bounds, upper_bounds):
+        """Binary search for c. Returns the new c and its bounds."""
+        c_range = self._params['c_range']
+        # successful, update upper bound and try lower `c` value
+        upper_bounds = torch.where(
+            successful, torch.min(upper_bounds, c), upper_bounds)
+        # failure, update lower bound and try larger `c` value
+        lower_bounds = torch.where(
+            successful, lower_bounds, torch.max(lower_bounds, c))
+        # do binary search with the known upper bound. Otherwise, multiply by
+        # 10 if no solution found yet.
+        # 1e9 was used in carlini's implementation
+        has_upper_bound = upper_bounds < c_range[1] * 0.1
+        c = torch.where(
+            has_upper_bound,
+            (lower_bounds + upper_bounds) / 2.,
+            torch.where(successful, c, c * 10))
+        return c, lower_bounds, upper_bounds
+
     @staticmethod
     def _arctanh(x, epsilon=1e-6):
         assert isinstance(x, torch.Tensor)
@@ -388,6 +635,19 @@ class CarliniL2V2Container(AttackContainer):
 
     def _optimize(self, optimizer, inputs_tanh, pert_tanh, targets_oh, const):
         assert isinstance(optimizer, torch.optim.Optimizer)
+
+        optimizer.zero_grad()
+        losses, l2_norms, adv_outputs, advs = self._get_loss(
+            inputs_tanh, pert_tanh, targets_oh, const)
+        loss = torch.sum(losses)
+        loss.backward()
+        optimizer.step()
+
+        return loss, l2_norms, adv_outputs, advs
+
+    def _get_loss(self, inputs_tanh, pert_tanh, targets_oh, const):
+        """Returns the loss of each sample, the L2 norms, the outputs and the
+        adversarial examples."""
         assert isinstance(inputs_tanh, torch.Tensor)
         assert isinstance(pert_tanh, torch.Tensor)
         assert isinstance(targets_oh, torch.Tensor)
@@ -395,12 +655,11 @@ class CarliniL2V2Container(AttackContainer):
 
         batch_size = inputs_tanh.size(0)
         is_targeted = self._params['targeted']
-        confidence = self.confidence
+        confidence = self._params['confidence']
         device = self.model_container.device
 
         assert const.size() == (batch_size,)
 
-        optimizer.zero_grad()
         # the adversarial examples in image space
         advs = self._from_tanh(inputs_tanh + pert_tanh, device)
         # the clean images converted back from tanh space
@@ -410,7 +669,7 @@ class CarliniL2V2Container(AttackContainer):
         model = self.model_container.model
         adv_outputs = model(advs)
 
-        if self.check_prob and torch.equal(
+        if self._params['check_prob'] and torch.equal(
                 torch.round(adv_outputs.sum(1)),
                 torch.ones(len(adv_outputs)).to(device)):
             raise ValueError(
@@ -431,31 +690,23 @@ class CarliniL2V2Container(AttackContainer):
                 target_outputs - other_outputs + confidence, min=0.)
         assert f_loss.size() == (batch_size,)
 
-        loss = torch.sum(l2_norms + const * f_loss)
-        loss.backward()
-        optimizer.step()
-
-        return loss, l2_norms, adv_outputs, advs
+        losses = l2_norms + const * f_loss
+        return losses, l2_norms, adv_outputs, advs
 
-    def _compensate_confidence(self, outputs, targets):
-        assert type(outputs) == np.ndarray
-        assert type(targets) == np.ndarray
+    def _compensate_confidence(self, outputs, targets_oh):
+        assert isinstance(outputs, torch.Tensor)
+        assert isinstance(targets_oh, torch.Tensor)
 
         is_targeted = self._params['targeted']
-        confidence = self.confidence
+        confidence = self._params['confidence']
 
-        outputs_comp = np.copy(outputs)
-        indices = np.arange(targets.shape[0])
         if is_targeted:
-            outputs_comp[indices, targets] -= confidence
-        else:
-            outputs_comp[indices, targets] += confidence
+            return outputs - confidence * targets_oh
+        return outputs + confidence * targets_oh
 
-        return outputs_comp
-
-    def _does_attack_success(self, pred, label):
+    def _does_attack_success(self, preds, labels):
+        """Returns a boolean mask of the successful samples."""
         is_targeted = self._params['targeted']
         if is_targeted:
-            return int(pred) == int(label)  # match the target label
-        else:
-            return int(pred) != int(label)  # anyting other than the true label
+            return preds == labels  # match the target label
+        return preds != labels  # anyting other than the true label
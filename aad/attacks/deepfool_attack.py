@@ -2,21 +2,31 @@
 This module implements the DeepFool attack.
 """
 import logging
-import time
 
 import numpy as np
+import torch
 from art.attacks.evasion import DeepFool
-from art.classifiers import PyTorchClassifier
 
-from ..utils import get_range, swap_image_channel
+from .art_classifier import get_art_classifier, to_art_input
 from .attack_container import AttackContainer
 
 logger = logging.getLogger(__name__)
 
 
 class DeepFoolContainer(AttackContainer):
+    """
+    DeepFool attack. By default, it uses the PyTorch implementation. Set `use_art` to True to use IBM ART's DeepFool
+    instead.
+
+    The PyTorch implementation only considers the `nb_grads` classes with the highest scores on the clean input of
+    each sample. In each iteration, the gradients of these classes are computed for the whole mini-batch by one
+    batched backward pass. A sample leaves the mini-batch as soon as its prediction changes.
+    """
+    # same as ART
+    TOL = 10e-8
+
     def __init__(self, model_container, max_iter=100, epsilon=1e-6,
-                 nb_grads=10, batch_size=16):
+                 nb_grads=10, batch_size=16, use_art=False):
         super(DeepFoolContainer, self).__init__(model_container,)
 
         self._params = {
@@ -25,91 +35,138 @@ class DeepFoolContainer(AttackContainer):
             'nb_grads': nb_grads,
             'batch_size': batch_size
         }
-
-        # use IBM ART pytorch module wrapper
-        # the model used here should be already trained
-        model = self.model_container.model
-        loss_fn = self.model_container.model.loss_fn
-        dc = self.model_container.data_container
-        clip_values = get_range(dc.x_train, dc.data_type == 'image')
-        optimizer = self.model_container.model.optimizer
-        num_classes = self.model_container.data_container.num_classes
-        dim_data = self.model_container.data_container.dim_data
-        self.classifier = PyTorchClassifier(
-            model=model,
-            clip_values=clip_values,
-            loss=loss_fn,
-            optimizer=optimizer,
-            input_shape=dim_data,
-            nb_classes=num_classes)
-
-    def generate(self, count=1000, use_testset=True, x=None, **kwargs):
+        self._use_art = use_art
+        self.classifier = None
+        # the average number of samples in each iteration
+        self.avg_active_batch_size = None
+
+        if not use_art:
+            return
+
+        self.classifier = get_art_classifier(self.model_container)
+
+    def _generate(self, x, targets=None):
+        if self._use_art:
+            self.classifier = get_art_classifier(self.model_container)
+            attack = DeepFool(self.classifier, **self._params)
+            return self._generate_in_chunks(
+                lambda x, _: attack.generate(to_art_input(x)), x)
+
+        self._total_size = 0
+        self._num_passes = 0
+        adv = self._generate_in_chunks(
+            lambda x, _: self._generate_torch(x), x)
+        if self._num_passes > 0:
+            self.avg_active_batch_size = self._total_size / self._num_passes
+            logger.info('Average active batch size: %.2f in %d passes',
+                        self.avg_active_batch_size, self._num_passes)
+        return adv
+
+    def _generate_torch(self, x):
+        scores = self._clean_scores(x)
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        adv = np.zeros_like(x)
+        batch_size = self._params['batch_size']
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            adv[start: end] = self._attack_batch(
+                x[start: end], scores[start: end] if scores is not None else None)
+        return adv
+
+    def _attack_batch(self, x_np, scores_np=None):
         """
-        Generate adversarial examples.
-
-        Parameters
-        ----------
-        count : int
-            The number of adversarial examples will be generated from the test set. This parameter will not be used
-            when 
-        use_testset : bool
-            Use test set to generate adversarial examples.
-        x : numpy.ndarray, optional
-            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
-            be ignored.
-        targets : numpy.ndarray, optional
-            The expected labels for targeted attack.
-
-        Returns
-        -------
-        adv : numpy.ndarray
-            The adversarial examples which have same shape as x.
-        pred_adv :  : numpy.ndarray
-            The predictions of adv. examples.
-        x_clean : numpy.ndarray
-            The clean inputs.
-        pred_clean : numpy.ndarray
-            The prediction of clean inputs.
+        Runs DeepFool on one mini-batch. Returns the adversarial examples as a numpy array. `scores_np` are the outputs
+        of the clean inputs, if they are known.
         """
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
+        max_iter = self._params['max_iter']
+        epsilon = self._params['epsilon']
+        device = self.model_container.device
+        model = self.model_container.model
+        model.eval()
 
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
-
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
+        clip_min, clip_max = self._get_clip_tensors(device)
+        x = torch.from_numpy(x_np).to(device)
+        batch = x.clone()
 
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
+        # the candidate classes of each sample. The 1st one is the prediction.
+        if scores_np is None:
+            with torch.no_grad():
+                outputs = model(x)
         else:
-            xx = x
-
-        # predict the outcomes
-        adv = self._generate(xx)
-        pred_adv, pred_clean = self.predict(adv, xx)
-
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, pred_adv, x, pred_clean
-
-    def _generate(self, x):
-        attack = DeepFool(self.classifier, **self._params)
-        return attack.generate(x)
+            outputs = torch.from_numpy(scores_np).to(device)
+        num_classes = outputs.size(1)
+        nb_grads = min(self._params['nb_grads'], num_classes)
+        classes = outputs.topk(nb_grads, dim=1)[1]
+        labels = classes[:, 0]
+        # indices of the active samples in the mini-batch
+        indices = torch.arange(len(x), device=device)
+
+        for _ in range(max_iter):
+            x_active = batch[indices].requires_grad_(True)
+            outputs = model(x_active)
+            self._total_size += len(indices)
+            self._num_passes += 1
+
+            # Stop if misclassification has been achieved
+            keep = outputs.argmax(dim=1) == labels
+            scores = outputs.gather(1, classes)
+            if not keep.all():
+                indices, classes, labels = \
+                    indices[keep], classes[keep], labels[keep]
+                if len(indices) == 0:
+                    break
+                # the finished samples have no gradient
+                scores = scores[keep]
+            grads = self._class_gradients(scores, x_active)
+            if len(grads) != len(indices):
+                grads, x_active = grads[keep], x_active[keep]
+
+            with torch.no_grad():
+                # differences from the predicted class
+                grad_diff = grads[:, 1:] - grads[:, :1]
+                f_diff = scores[:, 1:] - scores[:, :1]
+                grad_norm = grad_diff.flatten(2).norm(dim=2)
+                value = f_diff.abs() / (grad_norm + self.TOL)
+                # choose the closest decision boundary
+                l_var = value.argmin(dim=1)
+                rows = torch.arange(len(l_var), device=device)
+                r_var = f_diff[rows, l_var].abs() \
+                    / (grad_norm[rows, l_var] ** 2 + self.TOL)
+                shape = (-1,) + (1,) * (x.dim() - 1)
+                r_var = r_var.view(shape) * grad_diff[rows, l_var]
+                batch[indices] = torch.min(
+                    torch.max(x_active + r_var, clip_min), clip_max)
+
+        with torch.no_grad():
+            # apply overshoot parameter
+            adv = x + (1 + epsilon) * (batch - x)
+            adv = torch.min(torch.max(adv, clip_min), clip_max)
+        return adv.cpu().numpy()
+
+    def _class_gradients(self, scores, x):
+        """
+        Returns the gradients of all columns in `scores` w.r.t. `x`, in (batch, class, ...) shape. All columns are
+        computed by one batched backward pass. If the model does not support it, the columns are computed one by one.
+        """
+        k = scores.size(1)
+        grad_outputs = torch.eye(k, device=scores.device) \
+            .unsqueeze(1).expand(k, len(scores), k)
+        try:
+            grads = torch.autograd.grad(
+                scores, x, grad_outputs=grad_outputs, is_grads_batched=True)[0]
+        except RuntimeError as err:
+            logger.debug('Batched backward is not supported: %s', err)
+            grads = torch.stack([
+                torch.autograd.grad(scores[:, i].sum(), x,
+                                    retain_graph=i < k - 1)[0]
+                for i in range(k)])
+        return grads.transpose(0, 1)
+
+    def _get_clip_tensors(self, device):
+        dc = self.model_container.data_container
+        clip_min, clip_max = dc.data_range
+        clip_min = torch.as_tensor(
+            np.asarray(clip_min, dtype=np.float32), device=device)
+        clip_max = torch.as_tensor(
+            np.asarray(clip_max, dtype=np.float32), device=device)
+        return clip_min, clip_max
@@ -0,0 +1,272 @@
+"""
+This module implements the Projected Gradient Descent (PGD) attack in PyTorch.
+"""
+import logging
+
+import numpy as np
+import torch
+
+from .attack_container import AttackContainer
+
+logger = logging.getLogger(__name__)
+
+
+class PGDContainer(AttackContainer):
+    """
+    Projected Gradient Descent attack. With `norm=np.inf` and `random_init=False`, it is the Basic Iterative Method
+    (BIM).
+
+    The attack runs on the device of the model. Each mini-batch stays on the device for all iterations. The
+    perturbation is updated, clipped and projected in place, and the gradient buffer of the input is reused in every
+    iteration.
+
+    With `early_exit`, a sample leaves the mini-batch as soon as the attack succeeds on it, i.e., the prediction
+    differs from the label (untargeted) or matches the target (targeted). Its adversarial example is frozen at that
+    iteration, and the remaining iterations only run on the active samples.
+    """
+    SUPPORTS_TARGETS = True
+
+    def __init__(self, model_container, norm=np.inf, eps=0.3, eps_step=0.1,
+                 max_iter=100, targeted=False, random_init=False,
+                 batch_size=64, early_exit=False):
+        """
+        Create a PGDContainer instance.
+
+        Parameters
+        ----------
+        model_container : ModelContainerPT
+            A trained model.
+        norm : {np.inf, 2}
+            The norm of the perturbation.
+        eps : float
+            Maximum perturbation.
+        eps_step : float
+            Step size of each iteration.
+        max_iter : int
+            Number of iterations.
+        targeted : bool
+            Targeted attack. It is set by `generate`, when the targets are given.
+        random_init : bool
+            Start from a random point in the eps-ball around the input.
+        batch_size : int
+            Size of a mini-batch.
+        early_exit : bool
+            Stop the iterations for the samples which are already misclassified (untargeted) or classified as the
+            target (targeted).
+        """
+        super(PGDContainer, self).__init__(model_container)
+
+        assert norm in (np.inf, 2), f'Expecting np.inf or 2, got {norm}'
+        params_received = {
+            'norm': norm,
+            'eps': eps,
+            'eps_step': eps_step,
+            'max_iter': max_iter,
+            'targeted': targeted,
+            'random_init': random_init,
+            'batch_size': batch_size,
+            'early_exit': early_exit}
+        self._params = params_received
+
+        dc = self.model_container.data_container
+        self._clip_values = dc.data_range
+        # the average number of samples in each forward/backward pass
+        self.avg_active_batch_size = None
+
+    def _generate(self, x, targets=None, first_grad=None):
+        """
+        `first_grad` is the gradient of the loss at `x` with the clean predictions as labels. The mini-batches must
+        be the same as the ones of this attack. If it is given, the first forward/backward pass is skipped. It is
+        only used by the untargeted attack without `random_init`.
+        """
+        targeted = targets is not None
+        # handle the situation where targets are more than test set
+        if targets is not None:
+            assert len(targets) >= len(x)
+            targets = np.asarray(targets[:len(x)])  # trancate targets
+            if len(targets.shape) == 2:  # one-hot encoding
+                targets = np.argmax(targets, axis=1)
+            labels = targets.astype(np.int64)
+        else:
+            # Same as ART, use the predictions on clean inputs as labels to
+            # avoid the label leaking effect.
+            labels = self._predict_clean(x)
+        self._params['targeted'] = targeted
+
+        # The chunks of a checkpoint do not follow the mini-batches of
+        # `first_grad`, so the first pass is computed again.
+        if (targeted or self._params['random_init']
+                or self._checkpoint_path is not None):
+            first_grad = None
+
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        self._total_size = 0
+        self._num_passes = 0
+        adv = self._generate_in_chunks(
+            lambda xb, lb: self._generate_batches(xb, lb, first_grad),
+            x, labels)
+
+        if self._num_passes > 0:
+            self.avg_active_batch_size = self._total_size / self._num_passes
+            batch_size = self._params['batch_size']
+            num_batches = int(np.ceil(len(x) / batch_size))
+            total_fixed = len(x) * self._params['max_iter']
+            logger.info(
+                'Average active batch size: %.2f - Without early exit: %.2f',
+                self.avg_active_batch_size, len(x) / num_batches)
+            logger.info(
+                'Samples in forward/backward passes: %d of %d (%.1f%%)',
+                self._total_size, total_fixed,
+                100. * self._total_size / total_fixed)
+        return adv
+
+    def _generate_batches(self, x, labels, first_grad=None):
+        """Runs the attack on the mini-batches of `x`."""
+        adv = np.zeros_like(x)
+        batch_size = self._params['batch_size']
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            grad = first_grad[start: end] if first_grad is not None else None
+            adv[start: end], active_sizes = self._attack_batch(
+                x[start: end], labels[start: end], grad)
+            self._total_size += sum(active_sizes)
+            self._num_passes += len(active_sizes)
+        return adv
+
+    def _get_clip_tensors(self, device):
+        clip_min, clip_max = self._clip_values
+        clip_min = torch.as_tensor(
+            np.asarray(clip_min, dtype=np.float32), device=device)
+        clip_max = torch.as_tensor(
+            np.asarray(clip_max, dtype=np.float32), device=device)
+        return clip_min, clip_max
+
+    def _attack_batch(self, x_np, y_np, grad_np=None):
+        """
+        Runs all iterations on one mini-batch. Returns the adversarial examples
+        as a numpy array and the number of active samples in each iteration.
+        `grad_np` is the gradient at `x_np`, if it is known.
+        """
+        norm = self._params['norm']
+        eps = self._params['eps']
+        eps_step = self._params['eps_step']
+        targeted = self._params['targeted']
+        early_exit = self._params['early_exit']
+        device = self.model_container.device
+        model = self.model_container.model
+        loss_fn = model.loss_fn
+        model.eval()
+
+        clip_min, clip_max = self._get_clip_tensors(device)
+        x = torch.from_numpy(x_np).to(device)
+        y = torch.from_numpy(y_np).to(device)
+
+        x_adv = x.clone()
+        if self._params['random_init']:
+            x_adv.add_(self._random_ball(x, norm, eps))
+            self._clip_(x_adv, clip_min, clip_max)
+        # the output buffer. Only used when the samples can exit early.
+        adv = x_adv.clone() if early_exit else None
+        # indices of the active samples in the mini-batch
+        indices = torch.arange(len(x), device=device)
+        x_adv.requires_grad_(True)
+        # one gradient buffer is reused by all iterations.
+        x_adv.grad = torch.zeros_like(x_adv)
+        # the sign of the step: descent for targeted, ascent for untargeted.
+        alpha = -eps_step if targeted else eps_step
+        active_sizes = []
+        num_iter = self._params['max_iter']
+
+        if grad_np is not None and num_iter > 0:
+            # The first step uses the given gradient. No sample exits here,
+            # since the labels are the predictions of the clean inputs.
+            x_adv.grad.copy_(torch.from_numpy(grad_np))
+            with torch.no_grad():
+                self._step_(x_adv, x, alpha, clip_min, clip_max)
+            num_iter -= 1
+
+        for _ in range(num_iter):
+            x_adv.grad.zero_()
+            output = model(x_adv)
+            active_sizes.append(len(x_adv))
+
+            keep = None
+            if early_exit:
+                with torch.no_grad():
+                    pred = output.argmax(dim=1)
+                    done = pred == y if targeted else pred != y
+                if done.any():
+                    adv[indices[done]] = x_adv.detach()[done]
+                    keep = ~done
+                    if not keep.any():
+                        break
+                    # the successful samples are excluded from the gradient.
+                    output, y = output[keep], y[keep]
+
+            loss = loss_fn(output, y)
+            # only accumulate the gradient of the input
+            loss.backward(inputs=[x_adv])
+            if keep is not None:
+                x_adv = self._shrink(x_adv, keep)
+                x, indices = x[keep], indices[keep]
+
+            with torch.no_grad():
+                self._step_(x_adv, x, alpha, clip_min, clip_max)
+
+        if early_exit:
+            adv[indices] = x_adv.detach()
+            return adv.cpu().numpy(), active_sizes
+        return x_adv.detach().cpu().numpy(), active_sizes
+
+    def _step_(self, x_adv, x, alpha, clip_min, clip_max):
+        """Moves `x_adv` along its gradient, and clips and projects it in place."""
+        norm = self._params['norm']
+        grad = x_adv.grad
+        if norm == np.inf:
+            grad.sign_()
+        else:
+            grad.div_(self._l2_norm(grad) + 1e-7)
+        x_adv.add_(grad, alpha=alpha)
+        self._clip_(x_adv, clip_min, clip_max)
+        self._project_(x_adv, x, norm, self._params['eps'])
+
+    @staticmethod
+    def _shrink(x_adv, keep):
+        """Returns a new leaf with the active samples and their gradients."""
+        x_new = x_adv.detach()[keep].requires_grad_(True)
+        x_new.grad = x_adv.grad[keep]
+        return x_new
+
+    @staticmethod
+    def _l2_norm(x):
+        """Returns the L2 norm of each sample, shaped for broadcasting."""
+        shape = (len(x),) + (1,) * (x.dim() - 1)
+        return x.reshape(len(x), -1).norm(p=2, dim=1).view(shape)
+
+    @staticmethod
+    def _clip_(x, clip_min, clip_max):
+        torch.maximum(x, clip_min, out=x)
+        torch.minimum(x, clip_max, out=x)
+
+    @classmethod
+    def _project_(cls, x_adv, x, norm, eps):
+        """Projects `x_adv` into the eps-ball around `x` in place."""
+        x_adv.sub_(x)
+        if norm == np.inf:
+            x_adv.clamp_(-eps, eps)
+        else:
+            l2 = cls._l2_norm(x_adv)
+            x_adv.mul_(torch.clamp(eps / (l2 + 1e-12), max=1.0))
+        x_adv.add_(x)
+
+    @classmethod
+    def _random_ball(cls, x, norm, eps):
+        """Draws a random point from the eps-ball for each sample."""
+        if norm == np.inf:
+            return torch.empty_like(x).uniform_(-eps, eps)
+        direction = torch.randn_like(x)
+        direction.div_(cls._l2_norm(direction) + 1e-12)
+        dim = x[0].numel()
+        shape = (len(x),) + (1,) * (x.dim() - 1)
+        radius = eps * torch.rand(shape, device=x.device) ** (1.0 / dim)
+        return direction * radius
@@ -0,0 +1,227 @@
+"""
+This module implements a query oracle for black-box attacks.
+"""
+import collections
+import hashlib
+import logging
+import time
+
+import numpy as np
+import torch
+
+from ..basemodels import ModelContainerPT
+
+logger = logging.getLogger(__name__)
+
+
+class QueryOracle:
+    """
+    QueryOracle answers the queries of a black-box attack with the scores of the model. It sits between the attack and
+    the model, and it has three jobs:
+
+    - Coalesce: the queries from `submit` are queued, and `flush` runs them through the model in batches of
+      `batch_size`.
+    - Deduplicate: each input is identified by a hash of its bytes. The scores of the last `window` distinct inputs
+      are kept, so a repeated input is answered without calling the model. This includes the repeats within one flush.
+    - Budget: each query belongs to an owner, i.e., the sample which is attacked. Only the inputs which reach the model
+      count towards the budget of the owner. A flush which exceeds the budget of any owner raises RuntimeError, so the
+      attack should check `remaining` and stop the samples early.
+
+    Examples
+    --------
+    >>> oracle = QueryOracle(mc, max_queries=10000)
+    >>> ticket = oracle.submit(x_perturbed, owners)
+    >>> scores = oracle.result(ticket)
+    >>> oracle.log_stats()
+    """
+
+    def __init__(self, model_container, max_queries=None, batch_size=256,
+                 window=2**16):
+        """
+        Create a QueryOracle instance.
+
+        Parameters
+        ----------
+        model_container : ModelContainerPT
+            A trained model.
+        max_queries : int, optional
+            Maximum number of model queries of each owner. No limit, if it is None.
+        batch_size : int
+            Maximum number of inputs in one call of the model.
+        window : int
+            Number of distinct inputs whose scores are kept for deduplication. Use 0 to disable it.
+        """
+        assert isinstance(model_container, ModelContainerPT)
+        assert max_queries is None or max_queries > 0
+        self.model_container = model_container
+        self.max_queries = max_queries
+        self.batch_size = batch_size
+        self.window = window
+        self._scores = collections.OrderedDict()
+        self._counts = collections.Counter()
+        self._pending = []
+        self._results = {}
+        self._next_ticket = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Resets the statistics. The cached scores and the budgets are kept."""
+        # number of requested inputs
+        self.num_queries = 0
+        # number of inputs which reached the model
+        self.num_evaluated = 0
+        # number of calls of the model
+        self.num_calls = 0
+        self.model_time = 0.0
+
+    @property
+    def num_hits(self):
+        """Number of inputs which are answered without the model."""
+        return self.num_queries - self.num_evaluated
+
+    @property
+    def hit_rate(self):
+        """Fraction of the inputs which are answered without the model."""
+        return self.num_hits / self.num_queries if self.num_queries else 0.0
+
+    @property
+    def throughput(self):
+        """Number of evaluated inputs per second of model time."""
+        return self.num_evaluated / self.model_time if self.model_time else 0.0
+
+    def stats(self):
+        """Returns the statistics as a dict."""
+        return {
+            'queries': self.num_queries,
+            'evaluated': self.num_evaluated,
+            'hits': self.num_hits,
+            'hit_rate': self.hit_rate,
+            'calls': self.num_calls,
+            'throughput': self.throughput,
+        }
+
+    def log_stats(self):
+        logger.info(
+            'Queries: %d - Evaluated: %d - Cache hit rate: %.2f%% - '
+            'Model calls: %d - Throughput: %.1f inputs/s',
+            self.num_queries, self.num_evaluated, 100. * self.hit_rate,
+            self.num_calls, self.throughput)
+
+    def num_used(self, owners):
+        """Returns the number of model queries of each owner."""
+        return np.array([self._counts[o] for o in owners], dtype=np.int64)
+
+    def remaining(self, owners):
+        """Returns the remaining budget of each owner. It is infinite, if there is no limit."""
+        if self.max_queries is None:
+            return np.full(len(owners), np.inf)
+        return self.max_queries - self.num_used(owners)
+
+    def reset_budget(self, owners=None):
+        """Resets the query counts of the given owners, or of all owners."""
+        if owners is None:
+            self._counts.clear()
+        else:
+            for o in owners:
+                self._counts.pop(o, None)
+
+    def submit(self, x, owners):
+        """
+        Queues a batch of queries, and returns a ticket for `result`.
+
+        Parameters
+        ----------
+        x : torch.Tensor, numpy.ndarray
+            The inputs in the shape of the model.
+        owners : list of int
+            The owner of each input.
+        """
+        assert len(x) == len(owners)
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._pending.append((ticket, x, list(owners)))
+        return ticket
+
+    def result(self, ticket):
+        """Returns the scores of a submitted batch. The queue is flushed, if it is not done yet."""
+        if ticket not in self._results:
+            self.flush()
+        return self._results.pop(ticket)
+
+    def query(self, x, owners):
+        """Submits a batch, and returns its scores."""
+        return self.result(self.submit(x, owners))
+
+    def flush(self):
+        """Runs all queued queries."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        is_numpy = [isinstance(x, np.ndarray) for _, x, _ in pending]
+        device = self.model_container.device
+        x = torch.cat([torch.as_tensor(x, dtype=torch.float32).to(device)
+                       for _, x, _ in pending])
+        owners = [o for _, _, ows in pending for o in ows]
+        self.num_queries += len(x)
+
+        digests = self._hash(x)
+        # the first occurrence of each input which is not in the window
+        missing = collections.OrderedDict()
+        for i, d in enumerate(digests):
+            if d not in self._scores and d not in missing:
+                missing[d] = i
+        miss_idx = list(missing.values())
+
+        if self.max_queries is not None:
+            charges = collections.Counter(owners[i] for i in miss_idx)
+            exceeded = [o for o, n in charges.items()
+                        if self._counts[o] + n > self.max_queries]
+            if exceeded:
+                # the queued queries are refused
+                self.num_queries -= len(x)
+                raise RuntimeError('The query budget of {} is exceeded.'
+                                   .format(exceeded[:5]))
+        for i in miss_idx:
+            self._counts[owners[i]] += 1
+
+        new_scores = self._evaluate(x[miss_idx]) if miss_idx else None
+        fresh = {d: new_scores[j] for j, d in enumerate(missing)}
+        scores = torch.stack([
+            fresh[d] if d in fresh else self._scores[d] for d in digests])
+        for d in digests:
+            if d in self._scores:
+                self._scores.move_to_end(d)
+        self._remember(fresh)
+
+        start = 0
+        for (ticket, xx, _), numpy_out in zip(pending, is_numpy):
+            out = scores[start: start + len(xx)]
+            start += len(xx)
+            self._results[ticket] = out.cpu().numpy() if numpy_out else out
+
+    def _evaluate(self, x):
+        since = time.time()
+        model = self.model_container.model
+        model.eval()
+        with torch.no_grad():
+            outputs = []
+            for batch in x.split(self.batch_size):
+                outputs.append(model(batch))
+                self.num_calls += 1
+        self.model_time += time.time() - since
+        self.num_evaluated += len(x)
+        return torch.cat(outputs)
+
+    def _hash(self, x):
+        """Returns the digest of each input."""
+        arr = x.detach().float().cpu().contiguous().numpy().reshape(len(x), -1)
+        return [hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+                for row in arr]
+
+    def _remember(self, fresh):
+        if self.window <= 0:
+            return
+        for d, score in fresh.items():
+            self._scores[d] = score
+        while len(self._scores) > self.window:
+            self._scores.popitem(last=False)
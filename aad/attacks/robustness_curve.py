@@ -0,0 +1,241 @@
+"""
+This module implements the robustness curve, i.e., the accuracy and the success rate over a grid of epsilons.
+"""
+import logging
+import time
+
+import numpy as np
+import torch
+
+from ..basemodels import ModelContainerPT
+from ..utils import swap_image_channel
+from .pgd_attack import PGDContainer
+
+logger = logging.getLogger(__name__)
+
+ATTACKS = ('FGSM', 'BIM', 'PGD')
+
+
+def robustness_curve(model_container,
+                     eps,
+                     attack='FGSM',
+                     count=1000,
+                     use_testset=True,
+                     x=None,
+                     y=None,
+                     targets=None,
+                     norm=np.inf,
+                     eps_step=0.1,
+                     max_iter=100,
+                     random_init=False,
+                     batch_size=64,
+                     return_adv=False):
+    """
+    Computes the accuracy and the success rate of an attack for each epsilon. The clean predictions are computed
+    once. For FGSM, the gradients of each mini-batch are computed once, and they are reused by all epsilons. For BIM
+    and PGD, the copies of a mini-batch for all epsilons are stacked into one batch, and they are advanced together.
+    Therefore, the model is called with `len(eps) * batch_size` samples.
+
+    Same as FGSMContainer and PGDContainer, the untargeted attacks use the clean predictions as labels.
+
+    Parameters
+    ----------
+    model_container : ModelContainerPT
+        A trained model.
+    eps : list of float
+        The grid of maximum perturbations.
+    attack : {'FGSM', 'BIM', 'PGD'}
+        The attack. 'BIM' is 'PGD' with `norm=np.inf` and `random_init=False`.
+    count : int
+        The number of samples from the test set.
+    use_testset : bool
+        Use test set to generate adversarial examples.
+    x : numpy.ndarray, optional
+        The inputs, when `use_testset` is False.
+    y : numpy.ndarray, optional
+        The true labels of `x`. Without them, the accuracy is computed against the clean predictions.
+    targets : numpy.ndarray, optional
+        The expected labels for targeted attack.
+    norm : {np.inf, 2}
+        The norm of the perturbation.
+    eps_step : float, list of float
+        Step size of BIM and PGD. It is either shared by all epsilons, or one for each epsilon.
+    max_iter : int
+        Number of iterations of BIM and PGD.
+    random_init : bool
+        Start PGD from a random point in the eps-ball.
+    batch_size : int
+        Number of samples in a mini-batch.
+    return_adv : bool
+        Also return the adversarial examples and their predictions for each epsilon.
+
+    Returns
+    -------
+    dict
+        `eps`, `accuracy` and `success_rate` are arrays with one value for each epsilon. `x`, `y` and `pred_clean`
+        are the inputs, the labels and the clean predictions. With `return_adv`, `adv` has the shape
+        (len(eps),) + x.shape, and `pred_adv` has the shape (len(eps), len(x)).
+    """
+    assert isinstance(model_container, ModelContainerPT)
+    assert attack in ATTACKS, \
+        'Expecting one of {}, got {}'.format(ATTACKS, attack)
+    assert norm in (np.inf, 2), f'Expecting np.inf or 2, got {norm}'
+    assert use_testset or x is not None
+    if attack == 'BIM':
+        norm, random_init = np.inf, False
+
+    since = time.time()
+    dc = model_container.data_container
+    if use_testset:
+        x = np.copy(dc.x_test[:count])
+        y = np.copy(dc.y_test[:count])
+    else:
+        x = np.copy(x)
+
+    # handle (h, w, c) to (c, h, w)
+    if dc.data_type == 'image' and x.shape[1] not in (1, 3):
+        xx = swap_image_channel(x)
+    else:
+        xx = x
+    xx = np.ascontiguousarray(xx, dtype=np.float32)
+
+    # the clean predictions are shared by all epsilons
+    pred_clean = model_container.predict(xx)
+    if targets is not None:
+        assert len(targets) >= len(x)
+        targets = np.asarray(targets[:len(x)])
+        if len(targets.shape) == 2:  # one-hot encoding
+            targets = np.argmax(targets, axis=1)
+        labels = targets.astype(np.int64)
+    else:
+        labels = pred_clean.astype(np.int64)
+
+    eps = np.asarray(eps, dtype=np.float32).reshape(-1)
+    eps_step = np.broadcast_to(
+        np.asarray(eps_step, dtype=np.float32), eps.shape)
+    pred_adv = np.zeros((len(eps), len(x)), dtype=np.int64)
+    adv_all = np.zeros((len(eps),) + xx.shape, dtype=np.float32) \
+        if return_adv else None
+
+    for start in range(0, len(xx), batch_size):
+        end = start + batch_size
+        if attack == 'FGSM':
+            adv = _fgsm_batch(model_container, xx[start: end],
+                              labels[start: end], eps, norm, targets is not None)
+        else:
+            adv = _pgd_batch(model_container, xx[start: end],
+                             labels[start: end], eps, eps_step, norm,
+                             max_iter, random_init, targets is not None)
+        with torch.no_grad():
+            outputs = model_container.model(adv.view((-1,) + xx.shape[1:]))
+        pred_adv[:, start: end] = outputs.argmax(dim=1).view(
+            len(eps), -1).cpu().numpy()
+        if return_adv:
+            adv_all[:, start: end] = adv.cpu().numpy()
+
+    y_true = y if y is not None else pred_clean
+    accuracy = np.mean(pred_adv == y_true, axis=1)
+    if targets is not None:
+        success_rate = np.mean(pred_adv == targets, axis=1)
+    else:
+        success_rate = np.mean(pred_adv != pred_clean, axis=1)
+
+    for e, acc, rate in zip(eps, accuracy, success_rate):
+        logger.debug('eps=%f: accuracy=%f, success rate=%f', e, acc, rate)
+    time_elapsed = time.time() - since
+    logger.info('Time to complete %d eps on %d samples: %dm %.3fs',
+                len(eps), len(x), int(time_elapsed // 60), time_elapsed % 60)
+
+    curve = {
+        'eps': eps,
+        'accuracy': accuracy,
+        'success_rate': success_rate,
+        'x': x,
+        'y': y,
+        'pred_clean': pred_clean,
+    }
+    if return_adv:
+        if x.shape[1:] != xx.shape[1:]:
+            adv_all = np.stack([swap_image_channel(a) for a in adv_all])
+        curve['adv'] = adv_all
+        curve['pred_adv'] = pred_adv
+    return curve
+
+
+def _get_clip_tensors(model_container):
+    device = model_container.device
+    clip_min, clip_max = model_container.data_container.data_range
+    clip_min = torch.as_tensor(
+        np.asarray(clip_min, dtype=np.float32), device=device)
+    clip_max = torch.as_tensor(
+        np.asarray(clip_max, dtype=np.float32), device=device)
+    return clip_min, clip_max
+
+
+def _input_gradient(model, x, labels):
+    """Returns the gradient of the loss w.r.t. `x`."""
+    x = x.clone().requires_grad_(True)
+    loss = model.loss_fn(model(x), labels)
+    return torch.autograd.grad(loss, x)[0]
+
+
+def _fgsm_batch(model_container, x_np, y_np, eps, norm, targeted):
+    """Returns the FGSM examples of all epsilons in (len(eps), batch, ...) shape."""
+    device = model_container.device
+    model = model_container.model
+    model.eval()
+    clip_min, clip_max = _get_clip_tensors(model_container)
+
+    x = torch.from_numpy(x_np).to(device)
+    y = torch.from_numpy(y_np).to(device)
+    grad = _input_gradient(model, x, y)
+    if norm == np.inf:
+        grad = grad.sign()
+    else:
+        grad = grad / (PGDContainer._l2_norm(grad) + 1e-7)
+    if targeted:
+        grad = -grad
+
+    shape = (len(eps),) + (1,) * x.dim()
+    eps = torch.from_numpy(eps).to(device).view(shape)
+    adv = x.unsqueeze(0) + eps * grad.unsqueeze(0)
+    return torch.min(torch.max(adv, clip_min), clip_max)
+
+
+def _pgd_batch(model_container, x_np, y_np, eps, eps_step, norm, max_iter,
+               random_init, targeted):
+    """Returns the BIM/PGD examples of all epsilons in (len(eps), batch, ...) shape."""
+    device = model_container.device
+    model = model_container.model
+    model.eval()
+    clip_min, clip_max = _get_clip_tensors(model_container)
+
+    num_eps = len(eps)
+    x = torch.from_numpy(x_np).to(device).repeat(
+        (num_eps,) + (1,) * (x_np.ndim - 1))
+    y = torch.from_numpy(y_np).to(device).repeat(num_eps)
+    # the epsilon and the step size of each row
+    shape = (-1,) + (1,) * (x.dim() - 1)
+    eps_rows = torch.from_numpy(eps).to(device) \
+        .repeat_interleave(len(x_np)).view(shape)
+    step_rows = torch.from_numpy(np.ascontiguousarray(eps_step)).to(device) \
+        .repeat_interleave(len(x_np)).view(shape)
+    if targeted:
+        step_rows = -step_rows
+
+    x_adv = x.clone()
+    if random_init:
+        x_adv.add_(PGDContainer._random_ball(x, norm, 1.0) * eps_rows)
+        PGDContainer._clip_(x_adv, clip_min, clip_max)
+
+    for _ in range(max_iter):
+        grad = _input_gradient(model, x_adv, y)
+        with torch.no_grad():
+            if norm == np.inf:
+                grad.sign_()
+            else:
+                grad.div_(PGDContainer._l2_norm(grad) + 1e-7)
+            x_adv.add_(grad * step_rows)
+            PGDContainer._clip_(x_adv, clip_min, clip_max)
+            PGDContainer._project_(x_adv, x, norm, eps_rows)
+    return x_adv.view((num_eps, len(x_np)) + x_np.shape[1:])
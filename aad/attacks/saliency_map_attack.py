@@ -2,115 +2,53 @@
 This module implements the Jacobian Saliency Map attack.
 """
 import logging
-import time
 
 import numpy as np
+import torch
 from art.attacks.evasion import SaliencyMapMethod
-from art.classifiers import PyTorchClassifier
 
-from ..utils import get_range, swap_image_channel
+from ..utils import get_random_targets
+from .art_classifier import get_art_classifier, to_art_input
 from .attack_container import AttackContainer
 
 logger = logging.getLogger(__name__)
 
 
 class SaliencyContainer(AttackContainer):
-    def __init__(self, model_container, theta=0.1, gamma=1.0, batch_size=16):
+    """
+    Jacobian Saliency Map attack (JSMA). By default, it uses the PyTorch implementation. Set `use_art` to True to use
+    IBM ART's SaliencyMapMethod instead.
+
+    Same as ART, each iteration increases the two features with the largest gradients of the target class by `theta`
+    (or decreases the two smallest ones, when `theta` is negative). The PyTorch implementation keeps the search domain
+    as a mask on the device. Only the two changed features are removed from it, when they reach the clip value, and
+    the pair is found by `topk` on the masked gradients. A sample leaves the mini-batch as soon as it is classified as
+    the target, the fraction of the changed features exceeds `gamma`, or its search domain is empty.
+    """
+    SUPPORTS_TARGETS = True
+
+    def __init__(self, model_container, theta=0.1, gamma=1.0, batch_size=16,
+                 use_art=False):
         super(SaliencyContainer, self).__init__(model_container)
 
         dim_data = model_container.data_container.dim_data
         assert len(dim_data) == 3, \
             'Jacobian Saliency Map attack only works on images'
+        assert 0 < gamma <= 1, 'gamma must be in (0, 1]'
 
         self._params = {
             'theta': theta,
             'gamma': gamma,
             'batch_size': batch_size}
+        self._use_art = use_art
+        self.classifier = None
+        # the average number of samples in each iteration
+        self.avg_active_batch_size = None
 
-        # use IBM ART pytorch module wrapper
-        # the model used here should be already trained
-        model = self.model_container.model
-        loss_fn = self.model_container.model.loss_fn
-        dc = self.model_container.data_container
-        clip_values = get_range(dc.x_train, dc.data_type == 'image')
-        optimizer = self.model_container.model.optimizer
-        num_classes = self.model_container.data_container.num_classes
-        dim_data = self.model_container.data_container.dim_data
-        logger.debug('clip_values = %s', str(clip_values))
-
-        self.classifier = PyTorchClassifier(
-            model=model,
-            clip_values=clip_values,
-            loss=loss_fn,
-            optimizer=optimizer,
-            input_shape=dim_data,
-            nb_classes=num_classes)
-
-    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
-        """
-        Generate adversarial examples.
-
-        Parameters
-        ----------
-        count : int
-            The number of adversarial examples will be generated from the test set. This parameter will not be used
-            when 
-        use_testset : bool
-            Use test set to generate adversarial examples.
-        x : numpy.ndarray, optional
-            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
-            be ignored.
-        targets : numpy.ndarray, optional
-            The expected labels for targeted attack.
-
-        Returns
-        -------
-        adv : numpy.ndarray
-            The adversarial examples which have same shape as x.
-        pred_adv :  : numpy.ndarray
-            The predictions of adv. examples.
-        x_clean : numpy.ndarray
-            The clean inputs.
-        pred_clean : numpy.ndarray
-            The prediction of clean inputs.
-        """
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
-
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
-
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
-
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
-        else:
-            xx = x
-
-        adv = self._generate(xx, targets)
-        pred_adv, pred_clean = self.predict(adv, xx)
+        if not use_art:
+            return
 
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, pred_adv, x, pred_clean
+        self.classifier = get_art_classifier(self.model_container)
 
     def _generate(self, x, targets=None):
         # handle the situation where targets are more than test set
@@ -118,12 +56,118 @@ class SaliencyContainer(AttackContainer):
             assert len(targets) >= len(x)
             targets = targets[:len(x)]  # trancate targets
 
-        attack = SaliencyMapMethod(
-            classifier=self.classifier, **self._params)
+        if self._use_art:
+            self.classifier = get_art_classifier(self.model_container)
+            attack = SaliencyMapMethod(
+                classifier=self.classifier, **self._params)
+
+            def generate_fn(x, targets):
+                # predict the outcomes
+                if targets is not None:
+                    return attack.generate(to_art_input(x), targets)
+                return attack.generate(to_art_input(x))
+
+            return self._generate_in_chunks(generate_fn, x, targets)
+
+        if targets is None:
+            # Same as ART, choose a random target from the incorrect classes
+            num_classes = self.model_container.data_container.num_classes
+            targets = get_random_targets(
+                self._predict_clean(x), num_classes)
+        targets = np.asarray(targets)
+        if len(targets.shape) == 2:  # one-hot encoding
+            targets = np.argmax(targets, axis=1)
+
+        self._total_size = 0
+        self._num_passes = 0
+        adv = self._generate_in_chunks(
+            self._generate_torch, x, targets.astype(np.int64))
+        if self._num_passes > 0:
+            self.avg_active_batch_size = self._total_size / self._num_passes
+            logger.info('Average active batch size: %.2f in %d passes',
+                        self.avg_active_batch_size, self._num_passes)
+        return adv
 
-        # predict the outcomes
-        if targets is not None:
-            adv = attack.generate(x, targets)
-        else:
-            adv = attack.generate(x)
+    def _generate_torch(self, x, targets):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        adv = np.zeros_like(x)
+        batch_size = self._params['batch_size']
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            adv[start: end] = self._attack_batch(
+                x[start: end], targets[start: end])
         return adv
+
+    def _attack_batch(self, x_np, t_np):
+        """Runs JSMA on one mini-batch. Returns the adversarial examples as a numpy array."""
+        theta = self._params['theta']
+        gamma = self._params['gamma']
+        device = self.model_container.device
+        model = self.model_container.model
+        model.eval()
+
+        shape = x_np.shape[1:]
+        batch = torch.from_numpy(x_np).to(device).reshape(len(x_np), -1)
+        num_features = batch.size(1)
+        targets = torch.from_numpy(t_np).to(device)
+        clip_min, clip_max = self._get_clip_tensors(device, shape)
+
+        # the search domain only contains the features which can be changed
+        if theta > 0:
+            search = batch < clip_max
+            clip_value, clip_fn, fill = clip_max, torch.min, -np.inf
+        else:
+            search = batch > clip_min
+            clip_value, clip_fn, fill = clip_min, torch.max, np.inf
+        # the features which have been changed
+        used = torch.zeros_like(search)
+        # indices of the active samples in the mini-batch
+        indices = torch.arange(len(batch), device=device)
+
+        while True:
+            x_active = batch[indices].requires_grad_(True)
+            outputs = model(x_active.view((-1,) + shape))
+            self._total_size += len(indices)
+            self._num_passes += 1
+
+            t_active = targets[indices]
+            with torch.no_grad():
+                keep = (outputs.argmax(dim=1) != t_active) \
+                    & (used[indices].sum(dim=1).float() / num_features
+                       <= gamma) \
+                    & search[indices].any(dim=1)
+            if not keep.all():
+                indices, t_active = indices[keep], t_active[keep]
+                if len(indices) == 0:
+                    break
+                outputs = outputs[keep]
+            score = outputs.gather(1, t_active.unsqueeze(1)).sum()
+            grads = torch.autograd.grad(score, x_active)[0]
+            if len(grads) != len(indices):
+                grads = grads[keep]
+
+            with torch.no_grad():
+                # pick the pair from the search domain
+                grads.masked_fill_(~search[indices], fill)
+                features = grads.topk(2, dim=1, largest=theta > 0)[1]
+                rows = indices.unsqueeze(1).expand_as(features)
+                values = clip_fn(batch[rows, features] + theta,
+                                 clip_value[features])
+                batch[rows, features] = values
+                used[rows, features] = True
+                # only the changed features can reach the clip value
+                search[rows, features] = values != clip_value[features]
+
+        return batch.view(x_np.shape).cpu().numpy()
+
+    def _get_clip_tensors(self, device, shape):
+        """Returns the clip values of each feature as flat tensors."""
+        dc = self.model_container.data_container
+        clip_min, clip_max = dc.data_range
+        clip_min = torch.as_tensor(
+            np.full(shape, clip_min, dtype=np.float32).reshape(-1),
+            device=device)
+        clip_max = torch.as_tensor(
+            np.full(shape, clip_max, dtype=np.float32).reshape(-1),
+            device=device)
+        return clip_min, clip_max
@@ -0,0 +1,168 @@
+"""
+This module implements an executor which runs an attack on multiple processes.
+"""
+import logging
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import torch
+
+from ..utils import master_seed
+from .attack_container import AttackContainer
+
+logger = logging.getLogger(__name__)
+
+# The attack of the running executor. The forked workers inherit it from the
+# parent process, so the model and the data are not pickled.
+_WORKER_STATE = {}
+
+
+class ShardedAttackExecutor:
+    """
+    ShardedAttackExecutor splits the inputs into contiguous shards and calls `generate` of the attack on each shard in
+    a separate process. The results are reassembled in the order of the inputs.
+
+    The workers are forked from the current process. Each worker loads the state_dict of the model into its own copy
+    of the model, limits PyTorch to `threads_per_worker` intra-op threads, and seeds all random number generators with
+    `seed + <shard index>`. Therefore, the results only depend on the seed and the number of shards.
+
+    When the checkpoint of the attack is enabled, each shard uses the sub-directory `shard_<index>` of it.
+
+    Fork is not available on Windows, and it does not work with CUDA. In both cases, the shards are generated one
+    after another in the current process.
+
+    Examples
+    --------
+    >>> attack = CarliniL2V2Container(mc, **params)
+    >>> executor = ShardedAttackExecutor(attack, num_workers=8)
+    >>> adv, pred_adv, x_clean, pred_clean = executor.generate(count=1000)
+    """
+
+    def __init__(self, attack, num_workers=None, threads_per_worker=None,
+                 num_shards=None, seed=None):
+        """
+        Create a ShardedAttackExecutor instance.
+
+        Parameters
+        ----------
+        attack : AttackContainer
+            The attack to run.
+        num_workers : int, optional
+            Number of worker processes. Use the number of CPU cores, if it is None.
+        threads_per_worker : int, optional
+            Number of PyTorch threads in each worker. Split the threads of the current process evenly, if it is None.
+        num_shards : int, optional
+            Number of shards. Same as `num_workers`, if it is None.
+        seed : int, optional
+            The base seed of the shards. Draw it from NumPy's global generator, if it is None.
+        """
+        assert isinstance(attack, AttackContainer)
+        self.attack = attack
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(
+            1, torch.get_num_threads() // self.num_workers)
+        self.num_shards = num_shards or self.num_workers
+        self.seed = seed
+        assert self.num_workers > 0 and self.num_shards > 0
+
+    def generate(self, count=1000, use_testset=True, x=None, targets=None,
+                 **kwargs):
+        """
+        Generate adversarial examples. The parameters are the same as `generate` in the attack.
+
+        Returns
+        -------
+        adv : numpy.ndarray
+            The adversarial examples which have same shape as x.
+        pred_adv : numpy.ndarray
+            The predictions of adv. examples.
+        x_clean : numpy.ndarray
+            The clean inputs.
+        pred_clean : numpy.ndarray
+            The prediction of clean inputs.
+        """
+        assert use_testset or x is not None
+
+        since = time.time()
+        if use_testset:
+            dc = self.attack.model_container.data_container
+            x = dc.x_test[:count]
+        x = np.asarray(x)
+        if targets is not None:
+            assert len(targets) >= len(x)
+            targets = np.asarray(targets)[:len(x)]
+
+        seed = self.seed
+        if seed is None:
+            seed = int(np.random.randint(0, 2**31 - 1 - self.num_shards))
+        shards = np.array_split(
+            np.arange(len(x)), min(self.num_shards, max(len(x), 1)))
+        tasks = [(i, indices, seed + i) for i, indices in enumerate(shards)]
+
+        _WORKER_STATE.update({
+            'attack': self.attack,
+            'state_dict': {k: v.detach().cpu().clone() for k, v in
+                           self.attack.model_container.model.state_dict().items()},
+            'x': x,
+            'targets': targets,
+            'kwargs': kwargs,
+            'threads': self.threads_per_worker,
+        })
+        try:
+            if self._can_fork() and self.num_workers > 1 and len(tasks) > 1:
+                logger.info('Run %d shards on %d workers with %d threads each.',
+                            len(tasks), self.num_workers, self.threads_per_worker)
+                ctx = mp.get_context('fork')
+                with ctx.Pool(min(self.num_workers, len(tasks))) as pool:
+                    results = pool.map(_run_shard, tasks)
+            else:
+                results = [_run_shard(task, in_worker=False) for task in tasks]
+        finally:
+            _WORKER_STATE.clear()
+
+        outputs = [np.concatenate([r[j] for r in results])
+                   for j in range(4)]
+        time_elapsed = time.time() - since
+        logger.info('Time to complete %d adv. examples in %d shards: %dm %.3fs',
+                    len(x), len(tasks), int(time_elapsed // 60),
+                    time_elapsed % 60)
+        return tuple(outputs)
+
+    def _can_fork(self):
+        if 'fork' not in mp.get_all_start_methods():
+            logger.warning('Fork is not supported. Run in one process.')
+            return False
+        if self.attack.model_container.device.type == 'cuda':
+            logger.warning('Cannot fork with CUDA. Run in one process.')
+            return False
+        return True
+
+
+def _run_shard(task, in_worker=True):
+    """Generates the adversarial examples of one shard."""
+    index, indices, seed = task
+    attack = _WORKER_STATE['attack']
+    targets = _WORKER_STATE['targets']
+    if in_worker:
+        torch.set_num_threads(_WORKER_STATE['threads'])
+        # The forked model shares its memory with the parent until it is
+        # written. Load a private copy of the weights.
+        attack.model_container.model.load_state_dict(
+            _WORKER_STATE['state_dict'])
+
+    checkpoint_path = attack._checkpoint_path
+    if checkpoint_path is not None:
+        attack.enable_checkpoint(
+            os.path.join(checkpoint_path, 'shard_{:03d}'.format(index)),
+            attack._checkpoint_size)
+    try:
+        master_seed(seed)
+        kwargs = dict(_WORKER_STATE['kwargs'])
+        if targets is not None:
+            kwargs['targets'] = targets[indices]
+        return attack.generate(
+            use_testset=False, x=_WORKER_STATE['x'][indices], **kwargs)
+    finally:
+        attack._checkpoint_path = checkpoint_path
@@ -0,0 +1,236 @@
+"""
+This module implements the attack on scikit-learn decision trees.
+"""
+import logging
+import time
+
+import numpy as np
+
+from ..basemodels import ModelContainerTree
+
+logger = logging.getLogger(__name__)
+
+
+class TreeAttackContainer:
+    """
+    The minimal adversarial examples of a scikit-learn DecisionTreeClassifier or ExtraTreeClassifier. The attack reads
+    the arrays of `model.tree_` directly. The region of each leaf is a box, i.e., an interval on every feature, and it
+    is computed once. For each input, the nearest box of another class (or the target class) is found by the distances
+    to all boxes, and the input is projected into it. The distances of a mini-batch are computed together in NumPy.
+
+    The result is exact under the given norm. The projected features are placed on the nearest float32 value inside
+    the box, so `offset=0` gives the smallest perturbation which changes the prediction. Unlike ART's
+    DecisionTreeAttack, the inputs are bounded by the range of the data container.
+
+    Examples
+    --------
+    >>> attack = TreeAttackContainer(mc, norm=np.inf)
+    >>> adv, pred_adv, x_clean, pred_clean = attack.generate(count=1000)
+    """
+
+    def __init__(self, model_container, norm=np.inf, offset=0.0,
+                 batch_size=256):
+        """
+        Create a TreeAttackContainer instance.
+
+        Parameters
+        ----------
+        model_container : ModelContainerTree
+            A trained tree classifier.
+        norm : {np.inf, 2}
+            The norm of the perturbation.
+        offset : float
+            The extra distance from the boundary of the box, so the adversarial examples are not on the thresholds.
+        batch_size : int
+            Number of samples in a mini-batch. The distances of a mini-batch take `batch_size * num_leaves` floats.
+        """
+        assert isinstance(model_container, ModelContainerTree)
+        assert norm in (np.inf, 2), f'Expecting np.inf or 2, got {norm}'
+        self.model_container = model_container
+        self._params = {
+            'norm': norm,
+            'offset': offset,
+            'batch_size': batch_size,
+        }
+        self._boxes = None
+        self._boxes_key = None
+
+    def set_params(self, **kwargs):
+        """Sets parameters for the attack algorithm."""
+        for key, value in kwargs.items():
+            if key in self._params.keys():
+                self._params[key] = value
+        return True
+
+    @property
+    def attack_params(self):
+        return self._params
+
+    def generate(self, count=1000, use_testset=True, x=None, targets=None,
+                 **kwargs):
+        """
+        Generate adversarial examples.
+
+        Parameters
+        ----------
+        count : int
+            The number of adversarial examples will be generated from the test set.
+        use_testset : bool
+            Use test set to generate adversarial examples.
+        x : numpy.ndarray, optional
+            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
+            be ignored.
+        targets : numpy.ndarray, optional
+            The expected labels for targeted attack.
+
+        Returns
+        -------
+        adv : numpy.ndarray
+            The adversarial examples which have same shape as x.
+        pred_adv :  : numpy.ndarray
+            The predictions of adv. examples.
+        x_clean : numpy.ndarray
+            The clean inputs.
+        pred_clean : numpy.ndarray
+            The prediction of clean inputs.
+        """
+        assert use_testset or x is not None
+
+        since = time.time()
+        self.set_params(**kwargs)
+        norm = self._params['norm']
+        assert norm in (np.inf, 2), f'Expecting np.inf or 2, got {norm}'
+
+        dc = self.model_container.data_container
+        if use_testset:
+            x = np.copy(dc.x_test[:count])
+            y = np.copy(dc.y_test[:count])
+        else:
+            x = np.copy(x)
+
+        pred_clean = self.model_container.predict(x)
+        if use_testset:
+            acc = np.sum(np.equal(pred_clean, y)) / len(y)
+            logger.info('Accuracy on clean set: %f', acc)
+
+        adv = self._generate(x, targets, pred_clean)
+        pred_adv = self.model_container.predict(adv)
+
+        time_elapsed = time.time() - since
+        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
+                    len(x), int(time_elapsed // 60), time_elapsed % 60)
+        return adv, pred_adv, x, pred_clean
+
+    def _generate(self, x, targets=None, pred=None):
+        lower, upper, leaf_classes = self._get_boxes()
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if pred is None:
+            pred = self.model_container.predict(x)
+        if targets is not None:
+            assert len(targets) >= len(x)
+            targets = np.asarray(targets[:len(x)])
+            if len(targets.shape) == 2:  # one-hot encoding
+                targets = np.argmax(targets, axis=1)
+
+        adv = np.copy(x)
+        batch_size = self._params['batch_size']
+        num_failed = 0
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            xb = x[start: end]
+            dist = self._box_distance(xb, lower, upper)
+            # only the leaves of another class, or of the target class
+            if targets is None:
+                invalid = leaf_classes[np.newaxis] == pred[start: end, None]
+            else:
+                invalid = leaf_classes[np.newaxis] != targets[start: end, None]
+            dist[invalid] = np.inf
+            nearest = np.argmin(dist, axis=1)
+            found = np.isfinite(dist[np.arange(len(xb)), nearest])
+            num_failed += np.sum(~found)
+            adv[start: end][found] = self._project(
+                xb[found], lower[nearest[found]], upper[nearest[found]])
+        if num_failed > 0:
+            logger.warning('%d samples have no reachable leaf.', num_failed)
+        return adv
+
+    def _box_distance(self, x, lower, upper):
+        """Returns the distances from the inputs to the boxes, in (len(x), num_leaves) shape."""
+        is_inf = self._params['norm'] == np.inf
+        dist = np.zeros((len(x), len(lower)), dtype=np.float32)
+        # one feature at a time, so there is no (len(x), num_leaves,
+        # num_features) array
+        for f in range(x.shape[1]):
+            xf = x[:, f, np.newaxis]
+            # the distance to the interval on this feature
+            d = np.maximum(lower[:, f] - xf, 0) + np.maximum(xf - upper[:, f], 0)
+            if is_inf:
+                np.maximum(dist, d, out=dist)
+            else:
+                dist += np.square(d)
+        return dist if is_inf else np.sqrt(dist)
+
+    def _project(self, x, lower, upper):
+        """Moves each input into its box, and the offset is added to the changed features."""
+        offset = self._params['offset']
+        adv = np.minimum(np.maximum(x, lower), upper)
+        if offset > 0:
+            adv = np.where(x < lower, np.minimum(lower + offset, upper), adv)
+            adv = np.where(x > upper, np.maximum(upper - offset, lower), adv)
+        return adv.astype(np.float32)
+
+    def _get_boxes(self):
+        """
+        Returns the lower and the upper bounds of each leaf in (num_leaves, num_features) shape, and the class of each
+        leaf. The bounds are float32 values inside the leaf, and the leaves outside the data range are removed.
+        """
+        model = self.model_container.model
+        dc = self.model_container.data_container
+        key = (id(model), id(model.tree_), dc.version)
+        if self._boxes_key == key:
+            return self._boxes
+
+        tree = model.tree_
+        num_features = tree.n_features
+        lower = np.full((tree.node_count, num_features), -np.inf)
+        upper = np.full((tree.node_count, num_features), np.inf)
+        left = tree.children_left
+        right = tree.children_right
+        # the parents are always before their children
+        for node in range(tree.node_count):
+            if left[node] == -1:
+                continue
+            f = tree.feature[node]
+            thr = tree.threshold[node]
+            # go left, if x[f] <= threshold
+            lower[left[node]] = lower[node]
+            upper[left[node]] = upper[node]
+            upper[left[node], f] = min(upper[node, f], thr)
+            lower[right[node]] = lower[node]
+            upper[right[node]] = upper[node]
+            lower[right[node], f] = max(lower[node, f], thr)
+        leaves = np.where(left == -1)[0]
+        lower = lower[leaves]
+        upper = upper[leaves]
+
+        # sklearn compares float32 inputs with float64 thresholds. The lower
+        # bounds are open, and the upper bounds are closed.
+        lower32 = lower.astype(np.float32)
+        lower32 = np.where(lower32 <= lower,
+                           np.nextafter(lower32, np.float32(np.inf)), lower32)
+        upper32 = upper.astype(np.float32)
+        upper32 = np.where(upper32 > upper,
+                           np.nextafter(upper32, np.float32(-np.inf)), upper32)
+
+        clip_min, clip_max = dc.data_range
+        lower32 = np.maximum(lower32, np.asarray(clip_min, dtype=np.float32))
+        upper32 = np.minimum(upper32, np.asarray(clip_max, dtype=np.float32))
+        valid = np.all(lower32 <= upper32, axis=1)
+
+        values = tree.value[leaves].reshape(len(leaves), -1)
+        leaf_classes = model.classes_[np.argmax(values, axis=1)]
+        self._boxes = (lower32[valid], upper32[valid], leaf_classes[valid])
+        self._boxes_key = key
+        logger.debug('%d of %d leaves are in the data range.',
+                     np.sum(valid), len(leaves))
+        return self._boxes
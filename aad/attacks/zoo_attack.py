@@ -2,14 +2,15 @@
 This module implements the ZOO attack.
 """
 import logging
-import time
 
 import numpy as np
+import torch
+import torch.nn.functional as F
 from art.attacks.evasion import ZooAttack
-from art.classifiers import PyTorchClassifier
 
-from ..utils import get_range, swap_image_channel
+from .art_classifier import get_art_classifier, to_art_input
 from .attack_container import AttackContainer
+from .query_oracle import QueryOracle
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,25 @@ class ZooContainer(AttackContainer):
     Zeroth-Order Optimization attack (Zoo) is a black-box attack. This attack 
     is a variant of the Carlini and Wagner attack which uses ADAM coordinate 
     descent to perform numerical estimation of gradients.
+
+    By default, it uses the PyTorch implementation. Set `use_art` to True to use IBM ART's ZooAttack instead. The
+    PyTorch implementation attacks `batch_size` samples at once. In each iteration, it picks `nb_parallel` coordinates
+    of each sample, and evaluates the 2 * nb_parallel * batch_size perturbed copies in one stacked forward pass. The
+    perturbation, the ADAM states and the sampling probabilities stay on the device. The perturbation of an image
+    starts at a size of at most 32x32, and it is doubled after 2000 and 10000 iterations, same as ART. The stacked
+    copies are passed to the model in slices of `FORWARD_SIZE`, which keeps the activations in the CPU cache.
+
+    All queries of the PyTorch implementation go through a QueryOracle, which answers repeated inputs from its cache,
+    and stops a sample before it exceeds `max_queries` model queries. The statistics are logged after `generate`, and
+    the oracle is kept in `self.oracle`.
     """
+    SUPPORTS_TARGETS = True
+    # the initial size of the perturbation, when `use_resize` is True
+    INIT_SIZE = 32
+    # the iterations where the perturbation is doubled
+    RESIZE_ITERS = (2000, 10000)
+    # the maximum number of perturbed copies in one call of the model
+    FORWARD_SIZE = 256
 
     def __init__(
             self,
@@ -35,7 +54,9 @@ class ZooContainer(AttackContainer):
             use_importance=True,
             nb_parallel=128,
             batch_size=1,
-            variable_h=1e-4):
+            variable_h=1e-4,
+            max_queries=None,
+            use_art=False):
         super(ZooContainer, self).__init__(model_container)
 
         self._params = {
@@ -50,91 +71,17 @@ class ZooContainer(AttackContainer):
             'use_importance': use_importance,
             'nb_parallel': nb_parallel,
             'batch_size': batch_size,
-            'variable_h': variable_h
+            'variable_h': variable_h,
+            'max_queries': max_queries
         }
+        self._use_art = use_art
+        self.classifier = None
+        self.oracle = None
 
-        # use IBM ART pytorch module wrapper
-        # the model used here should be already trained
-        model = self.model_container.model
-        loss_fn = self.model_container.model.loss_fn
-        dc = self.model_container.data_container
-        clip_values = get_range(dc.x_train, dc.data_type == 'image')
-        optimizer = self.model_container.model.optimizer
-        num_classes = self.model_container.data_container.num_classes
-        dim_data = self.model_container.data_container.dim_data
-        self.classifier = PyTorchClassifier(
-            model=model,
-            clip_values=clip_values,
-            loss=loss_fn,
-            optimizer=optimizer,
-            input_shape=dim_data,
-            nb_classes=num_classes)
-
-    def generate(self, count=1000, use_testset=True, x=None, targets=None, **kwargs):
-        """
-        Generate adversarial examples.
-
-        Parameters
-        ----------
-        count : int
-            The number of adversarial examples will be generated from the test set. This parameter will not be used
-            when 
-        use_testset : bool
-            Use test set to generate adversarial examples.
-        x : numpy.ndarray, optional
-            The data for generating adversarial examples. If this parameter is not null, `count` and `use_testset` will
-            be ignored.
-        targets : numpy.ndarray, optional
-            The expected labels for targeted attack.
-
-        Returns
-        -------
-        adv : numpy.ndarray
-            The adversarial examples which have same shape as x.
-        pred_adv :  : numpy.ndarray
-            The predictions of adv. examples.
-        x_clean : numpy.ndarray
-            The clean inputs.
-        pred_clean : numpy.ndarray
-            The prediction of clean inputs.
-        """
-        assert use_testset or x is not None
-
-        since = time.time()
-        # parameters should able to set before training
-        self.set_params(**kwargs)
-
-        dc = self.model_container.data_container
-        # handle the situation where testset has less samples than we want
-        if use_testset and len(dc.x_test) < count:
-            count = len(dc.x_test)
-
-        if use_testset:
-            x = np.copy(dc.x_test[:count])
-            y = np.copy(dc.y_test[:count])
-            acc = self.model_container.evaluate(x, y)
-            logger.info('Accuracy on clean set: %f', acc)
-        else:
-            x = np.copy(x)
-            count = len(x)
-
-        # handle (h, w, c) to (c, h, w)
-        data_type = self.model_container.data_container.data_type
-        if data_type == 'image' and x.shape[1] not in (1, 3):
-            xx = swap_image_channel(x)
-        else:
-            xx = x
+        if not use_art:
+            return
 
-        adv = self._generate(xx, targets)
-        pred_adv, pred_clean = self.predict(adv, xx)
-
-        # ensure the outputs and inputs have same shape
-        if x.shape != adv.shape:
-            adv = swap_image_channel(adv)
-        time_elapsed = time.time() - since
-        logger.info('Time to complete training %d adv. examples: %dm %.3fs',
-                    count, int(time_elapsed // 60), time_elapsed % 60)
-        return adv, pred_adv, x, pred_clean
+        self.classifier = get_art_classifier(self.model_container)
 
     def _generate(self, x, targets=None):
         targeted = targets is not None
@@ -144,12 +91,300 @@ class ZooContainer(AttackContainer):
             targets = targets[:len(x)]  # trancate targets
 
         self._params['targeted'] = targeted
-        attack = ZooAttack(
-            classifier=self.classifier, **self._params)
+        if self._use_art:
+            params = {k: v for k, v in self._params.items()
+                      if k != 'max_queries'}
+            if self._params['max_queries'] is not None:
+                logger.warning('max_queries is not supported by ART.')
+            self.classifier = get_art_classifier(self.model_container)
+            attack = ZooAttack(classifier=self.classifier, **params)
 
-        # predict the outcomes
-        if targets is not None:
-            adv = attack.generate(x, targets)
+            def generate_fn(x, labels):
+                return attack.generate(to_art_input(x), labels)
+
+            return self._generate_in_chunks(
+                generate_fn, x, self._get_art_labels(x, targets))
+
+        if targets is None:
+            # Same as ART, use the predictions on clean inputs as labels.
+            labels = self._predict_clean(x)
         else:
-            adv = attack.generate(x)
+            labels = np.asarray(targets)
+            if len(labels.shape) == 2:  # one-hot encoding
+                labels = np.argmax(labels, axis=1)
+        self.oracle = QueryOracle(
+            self.model_container, max_queries=self._params['max_queries'],
+            batch_size=self.FORWARD_SIZE)
+        # the id of the next sample, which owns the queries
+        self._next_owner = 0
+        adv = self._generate_in_chunks(
+            self._generate_torch, x, labels.astype(np.int64))
+        self.oracle.log_stats()
+        return adv
+
+    def _generate_torch(self, x, labels):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        adv = np.zeros_like(x)
+        batch_size = self._params['batch_size']
+        for start in range(0, len(x), batch_size):
+            end = start + batch_size
+            owners = np.arange(len(x[start: end])) + self._next_owner
+            self._next_owner += len(owners)
+            adv[start: end] = self._attack_batch(
+                x[start: end], labels[start: end], owners)
         return adv
+
+    def _attack_batch(self, x_np, y_np, owners):
+        """Runs all binary search steps on one mini-batch. Returns the adversarial examples as a numpy array."""
+        device = self.model_container.device
+        self.model_container.model.eval()
+        x = torch.from_numpy(x_np).to(device)
+        y = torch.from_numpy(y_np).to(device)
+
+        const = torch.full((len(x),), float(self._params['initial_const']),
+                           dtype=torch.float64, device=device)
+        lower_bound = torch.zeros_like(const)
+        upper_bound = torch.full_like(const, 1e10)
+        o_best_dist = torch.full_like(const, np.inf)
+        o_best_attack = x.clone()
+
+        for step in range(self._params['binary_search_steps']):
+            logger.debug('Binary search step %i (c_mean==%f)',
+                         step, const.mean().item())
+            best_dist, best_label, best_attack = self._search_step(
+                x, y, const, owners)
+            improved = best_dist < o_best_dist
+            o_best_attack[improved] = best_attack[improved]
+            o_best_dist[improved] = best_dist[improved]
+
+            # adjust the constant, same as ART
+            success = best_label >= 0
+            upper_bound = torch.where(
+                success, torch.min(upper_bound, const), upper_bound)
+            lower_bound = torch.where(
+                success, lower_bound, torch.max(lower_bound, const))
+            const = torch.where(
+                upper_bound < 1e9, (lower_bound + upper_bound) / 2,
+                torch.where(success, const, const * 10))
+
+        clip_min, clip_max = self._get_clip_tensors(device)
+        o_best_attack = torch.min(torch.max(o_best_attack, clip_min), clip_max)
+        return o_best_attack.cpu().numpy()
+
+    def _search_step(self, x, y, const, owners):
+        """
+        Runs the coordinate descent with fixed constants. Returns the smallest L2 distance, the label and the
+        adversarial example of each sample. The label is -1, if the attack is not successful. `owners` are the ids of
+        the samples in the query oracle.
+        """
+        max_iter = self._params['max_iter']
+        abort_early = self._params['abort_early']
+        max_queries = self._params['max_queries']
+        early_stop_iters = max_iter // 10 if max_iter >= 10 else max_iter
+        targeted = self._params['targeted']
+        device = x.device
+
+        resize = self._params['use_resize'] and x.dim() == 4
+        if resize:
+            noise_shape = (x.size(1), min(self.INIT_SIZE, x.size(2)),
+                           min(self.INIT_SIZE, x.size(3)))
+        else:
+            noise_shape = tuple(x.shape[1:])
+        # the perturbation and the ADAM states of each sample
+        noise = torch.zeros((len(x), int(np.prod(noise_shape))), device=device)
+        adam = self._init_adam(noise)
+        # the sampling probabilities of the coordinates. None is uniform.
+        prob = None
+
+        best_dist = torch.full((len(x),), np.inf, dtype=torch.float64,
+                               device=device)
+        best_label = torch.full((len(x),), -1, dtype=torch.int64,
+                                device=device)
+        best_attack = x.clone()
+        prev_loss = torch.full_like(best_dist, 1e6)
+        prev_l2 = torch.zeros_like(best_dist)
+        fine_tuning = torch.zeros(len(x), dtype=torch.bool, device=device)
+        # indices of the active samples in the mini-batch
+        active = torch.arange(len(x), device=device)
+
+        for i in range(max_iter):
+            if resize and i in self.RESIZE_ITERS:
+                new_shape = (noise_shape[0],
+                             min(2 * noise_shape[1], x.size(2)),
+                             min(2 * noise_shape[2], x.size(3)))
+                if new_shape != noise_shape:
+                    noise_shape, noise, prob = self._resize_noise(
+                        noise, noise_shape, new_shape)
+                    adam = self._init_adam(noise)
+
+            if max_queries is not None:
+                # a sample stops, if its budget cannot afford an iteration
+                cost = 2 * min(self._params['nb_parallel'], noise.size(1)) + 1
+                remaining = self.oracle.remaining(owners[active.cpu().numpy()])
+                active = active[torch.from_numpy(remaining >= cost)
+                                .to(device)]
+                if len(active) == 0:
+                    break
+
+            owners_active = owners[active.cpu().numpy()]
+            self._coordinate_step(x[active], y[active], const[active],
+                                  noise, adam, prob, active, noise_shape,
+                                  owners_active)
+            if prob is not None:
+                prob[active] = self._get_prob(
+                    noise[active].view((-1,) + noise_shape))
+
+            with torch.no_grad():
+                adv = self._get_adv(x[active], noise[active], noise_shape)
+                outputs = self.oracle.query(adv, owners_active)
+                l2, loss = self._get_loss(
+                    x[active], adv, outputs, y[active], const[active])
+
+            # reset ADAM, once a valid example has been found, to avoid
+            # overshooting.
+            fine_tune = (~fine_tuning[active]) & (loss == l2) \
+                & (prev_loss[active] != prev_l2[active])
+            if fine_tune.any():
+                rows = active[fine_tune]
+                fine_tuning[rows] = True
+                adam[0][rows], adam[1][rows], adam[2][rows] = 0, 0, 1
+            prev_l2[active] = l2
+
+            pred = outputs.argmax(dim=1)
+            success = pred == y[active] if targeted else pred != y[active]
+            improved = success & (l2 < best_dist[active])
+            rows = active[improved]
+            best_dist[rows] = l2[improved]
+            best_label[rows] = pred[improved]
+            best_attack[rows] = adv[improved]
+
+            # a sample stops, if its loss is not improved
+            if abort_early and i % early_stop_iters == 0:
+                stalled = loss > 0.9999 * prev_loss[active]
+                prev_loss[active] = loss
+                active = active[~stalled]
+                if len(active) == 0:
+                    break
+        return best_dist, best_label, best_attack
+
+    def _coordinate_step(self, x, y, const, noise, adam, prob, active,
+                         noise_shape, owners):
+        """
+        Estimates the gradients of `nb_parallel` coordinates of each active sample by symmetric differences, and
+        updates these coordinates of `noise` by ADAM.
+        """
+        beta1, beta2 = 0.9, 0.999
+        h = self._params['variable_h']
+        lr = self._params['learning_rate']
+        num_vars = noise.size(1)
+        nb_parallel = min(self._params['nb_parallel'], num_vars)
+        n = len(active)
+
+        # sample the coordinates without replacement
+        if prob is not None:
+            indices = torch.multinomial(prob[active], nb_parallel)
+        else:
+            indices = torch.rand((n, num_vars), device=noise.device) \
+                .topk(nb_parallel, dim=1)[1]
+
+        # (n, nb_parallel, 2, num_vars): +h and -h on each coordinate
+        copies = noise[active][:, None, None, :].repeat(1, nb_parallel, 2, 1)
+        index = indices[:, :, None]
+        copies[:, :, 0].scatter_add_(
+            2, index, torch.full(index.shape, h, device=noise.device))
+        copies[:, :, 1].scatter_add_(
+            2, index, torch.full(index.shape, -h, device=noise.device))
+
+        # all perturbed copies in one forward pass
+        num_copies = 2 * nb_parallel
+        x_rep = x.repeat_interleave(num_copies, dim=0)
+        with torch.no_grad():
+            adv = self._get_adv(
+                x_rep, copies.view(n * num_copies, num_vars), noise_shape)
+            outputs = self.oracle.query(
+                adv, np.repeat(owners, num_copies))
+            _, loss = self._get_loss(
+                x_rep, adv, outputs, y.repeat_interleave(num_copies),
+                const.repeat_interleave(num_copies))
+        loss = loss.view(n, nb_parallel, 2)
+        grads = ((loss[:, :, 0] - loss[:, :, 1]) / (2 * h)).float()
+
+        # ADAM on the chosen coordinates
+        mean, var, epochs = adam
+        rows = active[:, None]
+        m = beta1 * mean[rows, indices] + (1 - beta1) * grads
+        v = beta2 * var[rows, indices] + (1 - beta2) * grads ** 2
+        t = epochs[rows, indices]
+        corr = torch.sqrt(1 - beta2 ** t) / (1 - beta1 ** t)
+        mean[rows, indices] = m
+        var[rows, indices] = v
+        epochs[rows, indices] = t + 1
+        noise[rows, indices] -= lr * corr * m / (torch.sqrt(v) + 1e-8)
+
+    def _get_adv(self, x, noise, noise_shape):
+        """Returns the clipped adversarial examples from the perturbations."""
+        noise = noise.view((-1,) + noise_shape)
+        if noise.shape[1:] != x.shape[1:]:
+            noise = F.interpolate(noise, size=x.shape[2:], mode='bilinear',
+                                  align_corners=False)
+        clip_min, clip_max = self._get_clip_tensors(x.device)
+        return torch.min(torch.max(x + noise, clip_min), clip_max)
+
+    def _get_loss(self, x, adv, outputs, y, const):
+        """Returns the L2 distances and the losses of C&W in float64."""
+        confidence = self._params['confidence']
+        l2 = (adv - x).view(len(x), -1).pow(2).sum(dim=1).double()
+        outputs = outputs.double()
+        z_label = outputs.gather(1, y[:, None]).squeeze(1)
+        z_other = outputs.scatter(1, y[:, None], -np.inf).max(dim=1)[0]
+        if self._params['targeted']:
+            loss = torch.clamp(z_other - z_label + confidence, min=0)
+        else:
+            loss = torch.clamp(z_label - z_other + confidence, min=0)
+        return l2, const * loss + l2
+
+    def _resize_noise(self, noise, old_shape, new_shape):
+        """
+        Returns the new shape, the perturbations and the sampling probabilities which are upscaled from the previous
+        perturbations. The perturbations are upscaled in the same way as `_get_adv`, so the attack continues from the
+        same adversarial examples. Only the states of ADAM start over.
+        """
+        logger.debug('Resize the perturbation from %s to %s',
+                     old_shape, new_shape)
+        noise = noise.view((-1,) + old_shape)
+        prob = None
+        if self._params['use_importance']:
+            prob = self._get_prob(noise, new_shape)
+        noise = F.interpolate(noise, size=new_shape[1:], mode='bilinear',
+                              align_corners=False)
+        return new_shape, noise.reshape(len(noise), -1).contiguous(), prob
+
+    @staticmethod
+    def _get_prob(noise, shape=None):
+        """
+        Returns the sampling probabilities of each sample. The absolute perturbation is max-pooled in blocks of 1/8
+        of the image size, and it is upscaled to `shape`.
+        """
+        size = noise.shape[2:]
+        kernel = (max(size[0] // 8, 1), max(size[1] // 8, 1))
+        prob = F.max_pool2d(noise.abs(), kernel, ceil_mode=True)
+        prob = F.interpolate(prob, size=size if shape is None else shape[1:],
+                             mode='nearest')
+        # avoid zero probabilities
+        prob = prob.flatten(1) + 1e-8
+        return prob / prob.sum(dim=1, keepdim=True)
+
+    @staticmethod
+    def _init_adam(noise):
+        """Returns the mean, the variance and the epochs of ADAM."""
+        return (torch.zeros_like(noise), torch.zeros_like(noise),
+                torch.ones_like(noise))
+
+    def _get_clip_tensors(self, device):
+        dc = self.model_container.data_container
+        clip_min, clip_max = dc.data_range
+        clip_min = torch.as_tensor(
+            np.asarray(clip_min, dtype=np.float32), device=device)
+        clip_max = torch.as_tensor(
+            np.asarray(clip_max, dtype=np.float32), device=device)
+        return clip_min, clip_max
@@ -11,7 +11,7 @@ import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader, TensorDataset
 
-from ..datasets import DataContainer
+from ..datasets import DataContainer, LoaderMonitor
 from ..utils import name_handler, swap_image_channel
 
 logger = logging.getLogger(__name__)
@@ -54,6 +54,8 @@ class ModelContainerPT:
         self.loss_test = []
         self.accuracy_train = []
         self.accuracy_test = []
+        # throughput of the train DataLoader in the last call of `fit`
+        self.loader_report = None
 
     @property
     def model(self):
@@ -259,8 +261,8 @@ class ModelContainerPT:
         return accuracy
 
     def _fit_torch(self, max_epochs, batch_size, early_stop):
-        train_loader = self.data_container.get_dataloader(
-            batch_size, is_train=True)
+        train_loader = LoaderMonitor(self.data_container.get_dataloader(
+            batch_size, is_train=True))
         test_loader = self.data_container.get_dataloader(
             batch_size, is_train=False)
 
@@ -294,6 +296,11 @@ class ModelContainerPT:
                 epoch+1, max_epochs,
                 int(time_elapsed // 60), time_elapsed % 60,
                 tr_loss, tr_acc, va_loss, va_acc)
+            report = train_loader.report()
+            logger.debug(
+                'Train loader: %.1f batches/s - Stall time: %.3fs (%.1f%%)',
+                report['batches_per_sec'], report['stall'],
+                100. * report['stall_ratio'])
 
             # save best state
             if va_acc >= best_acc:
@@ -320,6 +327,12 @@ class ModelContainerPT:
                         epoch)
                     break
 
+        self.loader_report = train_loader.report(total=True)
+        logger.info(
+            'Train loader: %.1f batches/s - Stall time: %.3fs (%.1f%% of the train loop)',
+            self.loader_report['batches_per_sec'],
+            self.loader_report['stall'],
+            100. * self.loader_report['stall_ratio'])
         self._model.load_state_dict(best_model_state)
 
     def _train_torch(self, optimizer, loader):
@@ -1,9 +1,14 @@
 """
 Module for the dataset container.
 """
+from .batch_sampler import BatchIndexSampler
 from .custom_data_container import CustomDataContainer
 from .data_container import DataContainer
 from .dataset_list import (DATASET_LIST, MEAN_LOOKUP, STD_LOOKUP,
                            get_dataset_list, get_sample_mean, get_sample_std,
                            get_synthetic_dataset_dict)
 from .generic_dataset import GenericDataset
+from .loader_monitor import LoaderMonitor
+from .shared_data_container import SharedDataContainer
+from .transform_data_container import TransformDataContainer
+from .transform_dataset import TransformDataset
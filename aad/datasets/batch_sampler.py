@@ -0,0 +1,64 @@
+"""
+This module implements a Sampler which yields a whole mini-batch of indices at a time.
+"""
+import torch
+from torch.utils.data import Sampler
+
+
+class BatchIndexSampler(Sampler):
+    """
+    Class implements a Sampler which yields the indices of a mini-batch instead of a single index. It is used with a
+    batch-level Dataset, e.g.: GenericDataset, and `batch_size=None` in the DataLoader, so each mini-batch is fetched
+    with a single indexing operation and no collate function is called.
+
+    When `shuffle` is True, the indices are permuted once per epoch and each mini-batch is a slice of the
+    permutation. Otherwise, it yields contiguous slices, which are views of the data.
+
+    Examples
+    --------
+    >>> dataset = GenericDataset(x, y)
+    >>> sampler = BatchIndexSampler(len(dataset), batch_size=64, shuffle=True)
+    >>> loader = DataLoader(dataset, batch_size=None, sampler=sampler)
+    """
+
+    def __init__(self, num_samples, batch_size, shuffle=True, drop_last=False,
+                 generator=None):
+        """
+        Create a BatchIndexSampler instance.
+
+        Parameters
+        ----------
+        num_samples : int
+            Number of samples in the Dataset.
+        batch_size : int
+            Size of a mini-batch.
+        shuffle : bool
+            Permute the indices at the beginning of each epoch.
+        drop_last : bool
+            Drop the last mini-batch, if it is smaller than `batch_size`.
+        generator : torch.Generator, optional
+            The random number generator for the permutation. Use PyTorch's
+            global generator, if it is None.
+        """
+        assert num_samples >= 0 and batch_size > 0
+        self.num_samples = int(num_samples)
+        self.batch_size = int(batch_size)
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+
+    def __iter__(self):
+        n = self.num_samples
+        stop = n - n % self.batch_size if self.drop_last else n
+        if self.shuffle:
+            permutation = torch.randperm(n, generator=self.generator)
+            for start in range(0, stop, self.batch_size):
+                yield permutation[start: start + self.batch_size]
+        else:
+            for start in range(0, stop, self.batch_size):
+                yield slice(start, min(start + self.batch_size, n))
+
+    def __len__(self):
+        if self.drop_last:
+            return self.num_samples // self.batch_size
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
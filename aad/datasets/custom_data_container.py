@@ -3,7 +3,7 @@ This module implements the data container from external source.
 """
 import logging
 
-from ..utils import get_range, scale_normalize
+from ..utils import scale_normalize
 from .data_container import DataContainer
 
 logger = logging.getLogger(__name__)
@@ -63,16 +63,12 @@ class CustomDataContainer(DataContainer):
         normalize : bool
             Apply normalization.
         """
-        self._data_range = get_range(
-            self._x_train_np, is_image=(self._data_type == 'image'))
-        self._train_mean = self._x_train_np.mean(axis=0)
-        self._train_std = self._x_train_np.std(axis=0)
-
         if normalize:
-            (xmin, xmax) = self._data_range
+            (xmin, xmax) = self.data_range
             # NOTE: Carlini attack expects the data in range [0, 1]
             # mean = self._train_mean
             self._x_train_np = scale_normalize(
                 self._x_train_np, xmin, xmax, mean=None)
             self._x_test_np = scale_normalize(
                 self._x_test_np, xmin, xmax, mean=None)
+            self._version += 1
@@ -13,8 +13,9 @@ import torchvision as tv
 from scipy.io import arff
 from torch.utils.data import DataLoader
 
-from ..utils import (get_range, scale_normalize, shuffle_data,
+from ..utils import (get_range, get_stats, scale_normalize, shuffle_data,
                      swap_image_channel)
+from .batch_sampler import BatchIndexSampler
 from .dataset_list import get_sample_mean, get_sample_std
 from .generic_dataset import GenericDataset
 
@@ -39,6 +40,17 @@ class DataContainer:
         self._y_train_np = None
         self._x_test_np = None
         self._y_test_np = None
+        # The statistics of the train set are computed on demand and cached.
+        # `_version` is bumped whenever the train set is replaced.
+        self._version = 0
+        self._train_stats = None
+        # default parameters for the DataLoaders created by `get_dataloader`
+        self._loader_params = {
+            'num_workers': 0,
+            'pin_memory': False,
+            'persistent_workers': False,
+            'prefetch_factor': 2,
+        }
 
         assert self._data_type in ('image', 'numeric')
         if path is not None:
@@ -60,13 +72,38 @@ class DataContainer:
     def path(self):
         return self._path
 
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def loader_params(self):
+        """Get the default parameters of the DataLoaders."""
+        return dict(self._loader_params)
+
+    def set_loader_params(self, **kwargs):
+        """
+        Set the default parameters for the DataLoaders created by
+        `get_dataloader`, e.g.: `num_workers`, `pin_memory`,
+        `persistent_workers` and `prefetch_factor`. The model containers use
+        these defaults for training and validation.
+        """
+        for key, value in kwargs.items():
+            if key not in self._loader_params:
+                raise KeyError(f'{key} is not a DataLoader parameter.')
+            self._loader_params[key] = value
+
     @property
     def train_mean(self):
-        return self._train_mean
+        if self._train_mean is not None:
+            return self._train_mean
+        return self._get_train_stats()['mean']
 
     @property
     def train_std(self):
-        return self._train_std
+        if self._train_std is not None:
+            return self._train_std
+        return self._get_train_stats()['std']
 
     @property
     def dataframe(self):
@@ -74,8 +111,10 @@ class DataContainer:
 
     @property
     def data_range(self):
-        is_image = self._data_type == 'image'
-        return get_range(self._x_train_np, is_image=is_image)
+        stats = self._get_train_stats()
+        if self._data_type == 'image':
+            return (np.min(stats['min']), np.max(stats['max']))
+        return (stats['min'], stats['max'])
 
     @property
     def x_train(self):
@@ -84,9 +123,10 @@ class DataContainer:
     @x_train.setter
     def x_train(self, x):
         self._x_train_np = x
-        # update mean and mu
-        self._train_mean = self._x_train_np.mean(axis=0)
-        self._train_std = self._x_train_np.std(axis=0)
+        # mean and std will be recomputed from the new train set
+        self._train_mean = None
+        self._train_std = None
+        self._version += 1
 
     @property
     def y_train(self):
@@ -128,21 +168,28 @@ class DataContainer:
         # total length = train + test
         return len(self._x_train_np) + len(self._x_test_np)
 
-    def __call__(self, shuffle=True, normalize=False, size_train=0.8):
+    def __call__(self, shuffle=True, normalize=False, size_train=0.8,
+                 num_workers=None):
         """Load data and prepare for numpy arrays. `normalize` and `size_train`
-        are not used in image datasets
+        are not used in image datasets. `num_workers` is the number of worker
+        processes which load the images. Use the default DataLoader parameter,
+        if it is None.
         """
         since = time.time()
+        if num_workers is None:
+            num_workers = self._loader_params['num_workers']
         if self._data_type == 'image':
-            self._prepare_image_data(shuffle, num_workers=0)
+            self._prepare_image_data(shuffle, num_workers=num_workers)
+            self._version += 1
             self._train_mean = get_sample_mean(self.name)
             self._train_std = get_sample_std(self.name)
         else:
             if self.name is not 'Synthetic':
                 self._prepare_numeric_data(
                     shuffle, normalize, size_train)
-                self._train_mean = self._x_train_np.mean(axis=0)
-                self._train_std = self._x_train_np.std(axis=0)
+                self._version += 1
+                self._train_mean = None
+                self._train_std = None
             else:
                 logger.warning(
                     'Load the synthetic data from external source before proceed.')
@@ -158,27 +205,75 @@ class DataContainer:
                        batch_size=64,
                        is_train=True,
                        shuffle=True,
-                       num_workers=0):
+                       num_workers=None,
+                       pin_memory=None,
+                       persistent_workers=None,
+                       prefetch_factor=None):
         """
-        Returns a PyTorch DataLoader.
+        Returns a PyTorch DataLoader. The parameters which are None use the
+        defaults in `loader_params`.
+
+        With `num_workers` > 0, the data is moved into shared memory once and
+        the worker processes gather the mini-batches. `prefetch_factor` is the
+        number of mini-batches each worker loads in advance, which bounds the
+        depth of the queue. `persistent_workers` keeps the workers alive
+        between epochs.
         """
+        params = self._get_loader_params(
+            num_workers=num_workers,
+            pin_memory=pin_memory,
+            persistent_workers=persistent_workers,
+            prefetch_factor=prefetch_factor)
         try:
             x_np = self._x_train_np if is_train else self._x_test_np
             y_np = self._y_train_np if is_train else self._y_test_np
 
+            # swapping axes returns a view, the data is not copied here.
             if self._data_type == 'image' and x_np.shape[1] not in (1, 3):
                 x_np = swap_image_channel(x_np)
 
-            dataset = GenericDataset(x_np, y_np)
+            dataset = GenericDataset(
+                x_np, y_np, share_memory=params['num_workers'] > 0)
             dataloader = DataLoader(
                 dataset,
-                batch_size,
-                shuffle=shuffle,
-                num_workers=num_workers)
+                batch_size=None,
+                sampler=BatchIndexSampler(len(dataset), batch_size, shuffle),
+                **params)
             return dataloader
         except AttributeError:
             raise Exception('Call class instance first!')
 
+    def _get_loader_params(self, **kwargs):
+        """Merges the given parameters with the defaults. The worker options
+        are only passed to PyTorch when there are worker processes.
+        """
+        params = dict(self._loader_params)
+        params.update({k: v for k, v in kwargs.items() if v is not None})
+        params['pin_memory'] = bool(params['pin_memory']) \
+            and torch.cuda.is_available()
+        if params['num_workers'] == 0:
+            del params['persistent_workers']
+            del params['prefetch_factor']
+        return params
+
+    def _get_train_stats(self):
+        """Returns the cached statistics of the train set. They are recomputed
+        in a single pass when the train set has been replaced.
+        """
+        if self._train_stats is None \
+                or self._train_stats['version'] != self._version:
+            if self._x_train_np is None:
+                raise Exception('Call class instance first!')
+            x_min, x_max, mean, std = get_stats(self._x_train_np)
+            self._train_stats = {
+                'version': self._version,
+                'min': x_min,
+                'max': x_max,
+                'mean': mean,
+                'std': std,
+            }
+        return self._train_stats
+
     def _prepare_image_data(self, shuffle, num_workers):
         # for images, we prepare dataloader first, and then convert it to numpy array.
         dataset_train = self._get_dataset(train=True)
@@ -187,15 +282,19 @@ class DataContainer:
         batch_size = 128  # this batch size is only used for loading.
 
         # client should not access these loader directly
+        # each loader is only used once, so the workers are not kept.
+        params = self._get_loader_params(
+            num_workers=num_workers, persistent_workers=False)
         dataloader_train = DataLoader(
             dataset_train,
             batch_size,
-            shuffle=shuffle)
+            shuffle=shuffle,
+            **params)
         dataloader_test = DataLoader(
             dataset_test,
             batch_size,
             shuffle=shuffle,
-            num_workers=num_workers)
+            **params)
 
         self._x_train_np, self._y_train_np = self._loader_to_np(
             dataloader_train)
@@ -1,6 +1,8 @@
 """
 This module implements a generic Dataset. It can be used for both Tensor and numpy array.
 """
+import warnings
+
 import numpy as np
 import torch
 from torch.utils.data import Dataset
@@ -9,9 +11,14 @@ from torch.utils.data import Dataset
 class GenericDataset(Dataset):
     """
     Class implements a generic Dataset. It can be used for both Tensor and numpy array.
+
+    The Dataset accepts a single index, a slice, or a list/Tensor of indices. When it is indexed by a mini-batch, it
+    returns the whole batch with a single indexing operation. Use it with BatchIndexSampler and `batch_size=None` in
+    the DataLoader to avoid collating the samples one by one.
     """
 
-    def __init__(self, data, labels=None):
+    def __init__(self, data, labels=None, pin_memory=False,
+                 share_memory=False):
         """
         Create a Dataset instance.
 
@@ -21,21 +28,46 @@ class GenericDataset(Dataset):
             Input data.
         labels : torch.Tensor, numpy.ndarray, optional
             Input labels.
+        pin_memory : bool
+            Copy the data into page-locked memory once, so the contiguous mini-batches can be transferred to GPU
+            asynchronously. It is ignored when CUDA is not available.
+        share_memory : bool
+            Move the data into shared memory once, so the workers of a DataLoader do not copy the data.
         """
         assert isinstance(data, (torch.Tensor, np.ndarray)) \
             and isinstance(labels, (torch.Tensor, np.ndarray, type(None)))
 
-        if isinstance(data, np.ndarray):
-            data = torch.from_numpy(data)
-        self.data = data
-        if isinstance(labels, np.ndarray):
-            labels = torch.from_numpy(labels)
-        self.labels = labels
+        self.data = self._from_numpy(data)
+        self.labels = self._from_numpy(labels)
+
+        if pin_memory and torch.cuda.is_available():
+            self.data = self.data.pin_memory()
+            if self.labels is not None:
+                self.labels = self.labels.pin_memory()
+        elif share_memory:
+            # The storage is copied into shared memory. The numpy arrays are
+            # not altered.
+            self.data = self.data.share_memory_()
+            if self.labels is not None:
+                self.labels = self.labels.share_memory_()
 
     def __getitem__(self, index):
-        label = self.labels[index] if isinstance(
-            self.labels, torch.Tensor) else -1
-        return self.data[index], label
+        x = self.data[index]
+        if isinstance(self.labels, torch.Tensor):
+            return x, self.labels[index]
+        if isinstance(index, (int, np.integer)):
+            return x, -1
+        return x, -torch.ones(len(x), dtype=torch.int64)
 
     def __len__(self):
         return len(self.data)
+
+    @staticmethod
+    def _from_numpy(x):
+        if not isinstance(x, np.ndarray):
+            return x
+        # The arrays shared by SharedDataContainer are read-only. The Dataset
+        # never writes to the data, so PyTorch's warning can be ignored.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return torch.from_numpy(x)
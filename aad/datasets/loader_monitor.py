@@ -0,0 +1,95 @@
+"""
+This module implements a wrapper which measures the throughput of a DataLoader.
+"""
+import time
+
+
+class LoaderMonitor:
+    """
+    LoaderMonitor wraps a DataLoader and measures how long the training loop waits for the next mini-batch. If the
+    stall time is a small fraction of the elapsed time, the loop is compute-bound. Otherwise, it is input-bound, and
+    more workers or a larger prefetch queue may help.
+
+    The counters of the last epoch are reset by each call of `__iter__`. The totals are kept until `reset` is called.
+
+    Examples
+    --------
+    >>> loader = LoaderMonitor(dc.get_dataloader(batch_size=128))
+    >>> for x, y in loader:
+    ...     pass
+    >>> loader.report()
+    {'batches': 1, 'samples': 120, 'elapsed': ..., 'stall': ..., 'batches_per_sec': ..., 'stall_ratio': ...}
+    """
+
+    def __init__(self, loader):
+        """
+        Create a LoaderMonitor instance.
+
+        Parameters
+        ----------
+        loader : torch.utils.data.DataLoader
+            The DataLoader to monitor.
+        """
+        self.loader = loader
+        self.reset()
+
+    @property
+    def dataset(self):
+        """Get the Dataset of the monitored DataLoader."""
+        return self.loader.dataset
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self._epoch = self._new_counters()
+        time_start = time.perf_counter()
+        iterator = iter(self.loader)
+        try:
+            while True:
+                time_wait = time.perf_counter()
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    break
+                self._epoch['stall'] += time.perf_counter() - time_wait
+                self._epoch['batches'] += 1
+                self._epoch['samples'] += len(batch[0])
+                yield batch
+        finally:
+            # also count an epoch which is aborted by the training loop
+            self._epoch['elapsed'] = time.perf_counter() - time_start
+            for key, value in self._epoch.items():
+                self._total[key] += value
+
+    def reset(self):
+        """Clear all counters."""
+        self._epoch = self._new_counters()
+        self._total = self._new_counters()
+
+    def report(self, total=False):
+        """
+        Returns the throughput of the last epoch.
+
+        Parameters
+        ----------
+        total : bool
+            Returns the throughput since the last reset instead.
+
+        Returns
+        -------
+        dict
+            Number of batches and samples, elapsed time and stall time in seconds, batches per second, and the
+            fraction of the elapsed time spent on waiting for the input.
+        """
+        counters = dict(self._total if total else self._epoch)
+        elapsed = counters['elapsed']
+        counters['batches_per_sec'] = counters['batches'] / elapsed \
+            if elapsed > 0 else 0.0
+        counters['stall_ratio'] = counters['stall'] / elapsed \
+            if elapsed > 0 else 0.0
+        return counters
+
+    @staticmethod
+    def _new_counters():
+        return {'batches': 0, 'samples': 0, 'elapsed': 0.0, 'stall': 0.0}
@@ -0,0 +1,71 @@
+"""
+This module implements a copy-on-write DataContainer which shares the arrays of another DataContainer.
+"""
+import logging
+
+import numpy as np
+
+from .data_container import DataContainer
+
+logger = logging.getLogger(__name__)
+
+
+def _read_only_view(x):
+    """Returns a read-only view of a numpy array. The data is not copied."""
+    if not isinstance(x, np.ndarray):
+        return x
+    view = x.view()
+    view.flags.writeable = False
+    return view
+
+
+class SharedDataContainer(DataContainer):
+    """
+    SharedDataContainer shares the train and test sets of a parent DataContainer without copying them. The shared
+    arrays are read-only views. Assigning a new array to a field keeps a private override in this container only, the
+    parent is never altered.
+    """
+
+    def __init__(self, parent):
+        """
+        Create a SharedDataContainer instance.
+
+        Parameters
+        ----------
+        parent : DataContainer
+            The DataContainer which owns the data. It should be loaded already.
+        """
+        assert isinstance(parent, DataContainer), \
+            f'Expecting a DataContainer, got {type(parent)}'
+        dataset_dict = {
+            'name': parent.name,
+            'type': parent.data_type,
+            'num_classes': parent.num_classes,
+            'dim_data': parent.dim_data,
+        }
+        super(SharedDataContainer, self).__init__(dataset_dict, parent.path)
+        self._parent = parent
+        self._parent_version = parent.version
+
+        self._dataframe = parent.dataframe
+        self._x_train_np = _read_only_view(parent.x_train)
+        self._y_train_np = _read_only_view(parent.y_train)
+        self._x_test_np = _read_only_view(parent.x_test)
+        self._y_test_np = _read_only_view(parent.y_test)
+        # pre-defined statistics, e.g.: the mean of images.
+        self._train_mean = parent._train_mean
+        self._train_std = parent._train_std
+        self._loader_params = parent.loader_params
+
+    @property
+    def parent(self):
+        """Get the DataContainer which owns the shared data."""
+        return self._parent
+
+    def _get_train_stats(self):
+        # Reuse the parent's cache, if neither container has replaced the
+        # train set since this container was created.
+        if self._version == 0 \
+                and self._parent.version == self._parent_version:
+            return self._parent._get_train_stats()
+        return super(SharedDataContainer, self)._get_train_stats()
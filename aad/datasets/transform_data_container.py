@@ -0,0 +1,108 @@
+"""
+This module implements a DataContainer which applies a transformation on the fly.
+"""
+import logging
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+from .batch_sampler import BatchIndexSampler
+from .data_container import DataContainer
+from .shared_data_container import SharedDataContainer
+from .transform_dataset import TransformDataset
+
+logger = logging.getLogger(__name__)
+
+
+class TransformDataContainer(SharedDataContainer):
+    """
+    TransformDataContainer shares the data of a parent DataContainer and holds a transformation instead of the
+    transformed data. The DataLoader applies the transformation batch by batch. Reading `x_train` or `x_test` returns
+    the transformed set, which is created on demand and is not stored.
+    """
+
+    def __init__(self, parent, transform_train, transform_test=None,
+                 cache_size=0):
+        """
+        Create a TransformDataContainer instance.
+
+        Parameters
+        ----------
+        parent : DataContainer
+            The DataContainer which owns the data. It should be loaded already.
+        transform_train : callable
+            The transformation for the train set. It takes a batch of data and the indices of the batch, e.g.:
+            `transform(x, indices)`, and returns the transformed batch.
+        transform_test : callable, optional
+            The transformation for the test set. Use `transform_train`, if it is None.
+        cache_size : int
+            The maximum number of transformed batches kept by each DataLoader. Only use it when the transformation is
+            deterministic. 0 disables the cache.
+        """
+        super(TransformDataContainer, self).__init__(parent)
+        assert callable(transform_train)
+        self._transform_train = transform_train
+        self._transform_test = transform_test \
+            if transform_test is not None else transform_train
+        self._cache_size = cache_size
+
+    @property
+    def x_train(self):
+        x = self._x_train_np
+        return self._transform_train(x, np.arange(len(x)))
+
+    @x_train.setter
+    def x_train(self, x):
+        DataContainer.x_train.fset(self, x)
+
+    @property
+    def x_test(self):
+        x = self._x_test_np
+        return self._transform_test(x, np.arange(len(x)))
+
+    @x_test.setter
+    def x_test(self, x):
+        DataContainer.x_test.fset(self, x)
+
+    @property
+    def x_all(self):
+        return np.vstack((self.x_train, self.x_test))
+
+    def get_dataloader(self,
+                       batch_size=64,
+                       is_train=True,
+                       shuffle=True,
+                       num_workers=None,
+                       pin_memory=None,
+                       persistent_workers=None,
+                       prefetch_factor=None):
+        """
+        Returns a PyTorch DataLoader which transforms the data batch by batch.
+        With `num_workers` > 0, the transformation runs in the worker
+        processes.
+        """
+        params = self._get_loader_params(
+            num_workers=num_workers,
+            pin_memory=pin_memory,
+            persistent_workers=persistent_workers,
+            prefetch_factor=prefetch_factor)
+        try:
+            x_np = self._x_train_np if is_train else self._x_test_np
+            y_np = self._y_train_np if is_train else self._y_test_np
+            transform = self._transform_train if is_train \
+                else self._transform_test
+
+            dataset = TransformDataset(
+                x_np,
+                y_np,
+                transform,
+                is_image=self._data_type == 'image',
+                cache_size=self._cache_size)
+            dataloader = DataLoader(
+                dataset,
+                batch_size=None,
+                sampler=BatchIndexSampler(len(dataset), batch_size, shuffle),
+                **params)
+            return dataloader
+        except AttributeError:
+            raise Exception('Call class instance first!')
@@ -0,0 +1,77 @@
+"""
+This module implements a Dataset which transforms the data batch by batch.
+"""
+import collections
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from ..utils import swap_image_channel
+
+
+class TransformDataset(Dataset):
+    """
+    Class implements a Dataset which applies a transformation on a batch of samples when the batch is requested. The
+    transformed data is never stored, except in an optional bounded cache.
+
+    The Dataset is indexed by a mini-batch, e.g.: a slice or a list of indices, so it should be used with
+    BatchIndexSampler and `batch_size=None` in the DataLoader.
+    """
+
+    def __init__(self, data, labels, transform, is_image=False, cache_size=0):
+        """
+        Create a TransformDataset instance.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            Input data.
+        labels : numpy.ndarray, optional
+            Input labels.
+        transform : callable
+            It takes a batch of data and the indices of the batch, e.g.: `transform(x, indices)`, and returns the
+            transformed batch as a numpy array.
+        is_image : bool
+            Swap the channels of the transformed images from (h, w, c) to (c, h, w).
+        cache_size : int
+            The maximum number of transformed batches kept in memory. Only use it when the transformation is
+            deterministic. 0 disables the cache.
+        """
+        assert isinstance(data, np.ndarray) \
+            and isinstance(labels, (np.ndarray, type(None)))
+        assert callable(transform)
+
+        self.data = data
+        self.labels = labels
+        self.transform = transform
+        self.is_image = is_image
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+
+    def __getitem__(self, indices):
+        if isinstance(indices, slice):
+            indices = np.arange(len(self.data))[indices]
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        key = indices.tobytes()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        x = self.transform(self.data[indices], indices)
+        if self.is_image and x.shape[1] not in (1, 3):
+            x = swap_image_channel(x)
+        x = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32))
+        if self.labels is not None:
+            y = torch.from_numpy(self.labels[indices])
+        else:
+            y = -torch.ones(len(indices), dtype=torch.int64)
+
+        if self.cache_size > 0:
+            self._cache[key] = (x, y)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return x, y
+
+    def __len__(self):
+        return len(self.data)
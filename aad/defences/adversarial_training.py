@@ -11,7 +11,8 @@ from torch.utils.data import DataLoader
 
 from ..attacks import AttackContainer
 from ..basemodels import ModelContainerPT
-from ..datasets import GenericDataset
+from ..datasets import (BatchIndexSampler, GenericDataset,
+                        SharedDataContainer)
 from ..utils import swap_image_channel
 from .detector_container import DetectorContainer
 
@@ -45,7 +46,11 @@ class AdversarialTraining(DetectorContainer):
         if not np.all([isinstance(att, AttackContainer) for att in attacks]):
             raise ValueError('attacks is not a list of AttackContainer.')
 
-        self._discriminator = copy.deepcopy(model_container)
+        # The discriminator owns a copy of the model, but shares the dataset
+        # with the original model container.
+        dc = model_container.data_container
+        memo = {id(dc): SharedDataContainer(dc)}
+        self._discriminator = copy.deepcopy(model_container, memo)
 
         # place holder for parameters
         self._params = {
@@ -181,8 +186,8 @@ class AdversarialTraining(DetectorContainer):
         dataset = GenericDataset(x_train, y_train)
         train_loader = DataLoader(
             dataset,
-            batch_size,
-            shuffle=True,
+            batch_size=None,
+            sampler=BatchIndexSampler(len(dataset), batch_size, shuffle=True),
             num_workers=0)
 
         best_model_state = copy.deepcopy(model.state_dict())
@@ -9,7 +9,7 @@ import torch
 from scipy import stats
 from torch.utils.data import DataLoader
 
-from ..datasets import GenericDataset
+from ..datasets import BatchIndexSampler, GenericDataset
 from ..utils import swap_image_channel
 from .detector_container import DetectorContainer
 
@@ -206,8 +206,8 @@ class ApplicabilityDomainContainer(DetectorContainer):
         dataset = GenericDataset(x_np)
         dataloader = DataLoader(
             dataset,
-            batch_size=256,
-            shuffle=False,
+            batch_size=None,
+            sampler=BatchIndexSampler(len(dataset), 256, shuffle=False),
             num_workers=0)
 
         # run 1 sample to get size of output
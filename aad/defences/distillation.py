@@ -10,8 +10,8 @@ import torch
 import torch.nn as nn
 
 from ..basemodels import ModelContainerPT
-from ..datasets import DATASET_LIST, DataContainer, get_synthetic_dataset_dict
-from ..utils import get_data_path, is_probability
+from ..datasets import SharedDataContainer
+from ..utils import is_probability
 from .detector_container import DetectorContainer
 
 logger = logging.getLogger(__name__)
@@ -72,20 +72,9 @@ class DistillationContainer(DetectorContainer):
         logger.debug('Accuracy of smooth labels: %f',
                      correct / len(base_dc.y_train))
 
-        # create new data container and replace the label to smooth probability
-        dataset_name = base_dc.name
-        # handle synthetic dataset
-        if dataset_name == 'Synthetic':
-            data_dict = get_synthetic_dataset_dict(
-                len(base_dc), base_dc.num_classes, base_dc.dim_data[0])
-            dc = DataContainer(data_dict, get_data_path())
-            dc.x_test = np.copy(base_dc.x_test)
-            dc.y_test = np.copy(base_dc.y_test)
-        else:
-            dc = DataContainer(DATASET_LIST[dataset_name], get_data_path())
-            dc(shuffle=False)
-        # prevent the train set permutate.
-        dc.x_train = np.copy(base_dc.x_train)
+        # share the data with the base model, only replace the labels of the
+        # train set to smooth probability
+        dc = SharedDataContainer(base_dc)
         dc.y_train = prob_train
 
         # load pre-trained parameters
@@ -1,7 +1,7 @@
 """
 This module implements the Feature Squeezing defence.
 """
-import copy
+import functools
 import logging
 import os
 
@@ -11,6 +11,7 @@ from scipy.ndimage import median_filter
 from scipy.stats import mode
 
 from ..basemodels import ModelContainerPT, copy_model
+from ..datasets import TransformDataContainer
 from ..utils import name_handler, scale_normalize
 from .detector_container import DetectorContainer
 
@@ -29,7 +30,9 @@ class FeatureSqueezing(DetectorContainer):
                  bit_depth=None,
                  sigma=None,
                  kernel_size=None,
-                 pretrained=True):
+                 pretrained=True,
+                 fresh_noise=False,
+                 cache_size=0):
         """
         Create a FeatureSqueezing class instance.
 
@@ -50,6 +53,12 @@ class FeatureSqueezing(DetectorContainer):
             The kernel size for median filter. Required for 'median' filter. e.g.: 3
         pretrained : bool
             Load the pre-trained parameters before train the smoothing models.
+        fresh_noise : bool
+            Draw new noise for 'normal' filter in every epoch. Otherwise, each sample keeps the same noise during the
+            training.
+        cache_size : int
+            The maximum number of squeezed batches kept in memory by each DataLoader. The squeezed data is created
+            batch by batch during the training. 0 disables the cache.
         """
         super(FeatureSqueezing, self).__init__(model_container)
 
@@ -63,6 +72,8 @@ class FeatureSqueezing(DetectorContainer):
             'sigma': sigma,
             'kernel_size': kernel_size,
             'pretrained': pretrained,
+            'fresh_noise': fresh_noise,
+            'cache_size': cache_size,
         }
         self._smoothing_methods = smoothing_methods
         if 'median' in smoothing_methods \
@@ -87,23 +98,16 @@ class FeatureSqueezing(DetectorContainer):
                 num_classes=num_classes,
                 pretrained=pretrained,
             )
-            mc = ModelContainerPT(model, copy.deepcopy(data_container))
-            dc = mc.data_container
-
-            # replace train set with squeezed dataset
-            if method_name == 'binary':
-                x_train = self.apply_binary_transform(dc.x_train)
-                x_test = self.apply_binary_transform(dc.x_test)
-            elif method_name == 'normal':
-                x_train = self.apply_normal_transform(dc.x_train)
-                x_test = self.apply_normal_transform(dc.x_test)
-            elif method_name == 'median':
-                x_train = self.apply_median_transform(dc.x_train)
-                x_test = self.apply_median_transform(dc.x_test)
-            mc.data_container.x_train = x_train
-            mc.data_container.y_train = np.copy(dc.y_train)
-            mc.data_container.x_test = x_test
-            mc.data_container.y_test = np.copy(dc.y_test)
+            # The squeezed data is created on the fly, batch by batch. Fresh
+            # noise only applies on the train set.
+            use_fresh_noise = method_name == 'normal' and fresh_noise
+            dc = TransformDataContainer(
+                data_container,
+                transform_train=self._get_transform(
+                    method_name, use_fresh_noise),
+                transform_test=self._get_transform(method_name, False),
+                cache_size=0 if use_fresh_noise else cache_size)
+            mc = ModelContainerPT(model, dc)
             self._models.append({
                 'name': method_name,
                 'model_container': mc,
@@ -281,6 +285,24 @@ class FeatureSqueezing(DetectorContainer):
             if model['name'] == method:
                 return model['model_container']
 
+    def _get_transform(self, method_name, fresh_noise):
+        """Returns the transformation for a batch of the train set or the test set."""
+        # Without fresh noise, the noise is seeded by the indices of the
+        # samples, so a sample always gets the same noise.
+        seed = None
+        if method_name == 'normal' and not fresh_noise:
+            seed = np.random.randint(np.iinfo(np.int32).max)
+        return functools.partial(self._squeeze, method_name, seed)
+
+    def _squeeze(self, method_name, seed, x, indices):
+        if method_name == 'binary':
+            return self.apply_binary_transform(x)
+        elif method_name == 'normal':
+            return self.apply_normal_transform(x, indices=indices, seed=seed)
+        elif method_name == 'median':
+            return self.apply_median_transform(x)
+        raise ValueError('Unknown smoothing method "{}"'.format(method_name))
+
     def apply_binary_transform(self, x):
         """
         Apply binary transformation on input x. Rescale the input based on given bit depth. The parameters for
@@ -306,7 +328,7 @@ class FeatureSqueezing(DetectorContainer):
         res += clip_values[0]
         return res.astype(np.float32)
 
-    def apply_normal_transform(self, x):
+    def apply_normal_transform(self, x, indices=None, seed=None):
         """
         Add noise with Normal distribution to input x. The parameters for transformation were predefined when creating
         class instance.
@@ -315,6 +337,11 @@ class FeatureSqueezing(DetectorContainer):
         ----------
         x : np.ndarray
             Input data.
+        indices : np.ndarray, optional
+            The indices of the samples. Only used with `seed`.
+        seed : int, optional
+            If it is not None, the noise of each sample only depends on `seed` and its index. So the same sample always
+            gets the same noise, no matter which batch it is in. See `_seeded_normal`.
 
         Returns
         -------
@@ -325,10 +352,48 @@ class FeatureSqueezing(DetectorContainer):
         clip_values = self._params['clip_values']
         shape = x.shape
 
-        res = x + np.random.normal(0, scale=sigma, size=shape)
+        if seed is None:
+            noise = np.random.normal(0, scale=sigma, size=shape)
+        else:
+            assert indices is not None and len(indices) == len(x)
+            noise = sigma * self._seeded_normal(seed, indices, shape[1:])
+        res = x + noise
         res = np.clip(res, clip_values[0], clip_values[1])
         return res.astype(np.float32)
 
+    @staticmethod
+    def _seeded_normal(seed, indices, shape):
+        """
+        Returns the standard normal noise of the samples in (len(indices),) + shape. The noise of a sample is drawn
+        from a Philox generator keyed by `seed`, whose counter starts at a fixed offset for each index. So a run of
+        contiguous indices is drawn at once, and the uniform values are turned into normal ones by the Box-Muller
+        transform in float32.
+        """
+        size = int(np.prod(shape))
+        half = (size + 1) // 2
+        # a counter of Philox gives 4 64-bit words, i.e., 8 float32 values.
+        blocks = (2 * half + 7) // 8
+        indices = np.asarray(indices, dtype=np.int64)
+        uniform = np.empty((len(indices), 8 * blocks), dtype=np.float32)
+        breaks = np.where(np.diff(indices) != 1)[0] + 1
+        bounds = np.concatenate([[0], breaks, [len(indices)]])
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            bit_generator = np.random.Philox(
+                key=seed, counter=int(indices[start]) * blocks)
+            np.random.Generator(bit_generator).random(
+                out=uniform[start: stop], dtype=np.float32)
+
+        # Box-Muller. The uniform values are in [0, 1), so 1 - u > 0.
+        radius = uniform[:, :half]
+        theta = uniform[:, half: 2 * half]
+        np.log1p(np.negative(radius, out=radius), out=radius)
+        np.sqrt(np.multiply(radius, -2.0, out=radius), out=radius)
+        theta *= np.float32(2.0 * np.pi)
+        noise = np.empty((len(indices), 2 * half), dtype=np.float32)
+        np.multiply(radius, np.cos(theta), out=noise[:, :half])
+        np.multiply(radius, np.sin(theta, out=theta), out=noise[:, half:])
+        return noise[:, :size].reshape((len(indices),) + tuple(shape))
+
     def apply_median_transform(self, x):
         """
         Apply median filter on a given input x. The parameters for transformation were predefined when creating class
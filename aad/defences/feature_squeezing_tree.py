@@ -1,7 +1,6 @@
 """
 This module implements the Feature Squeezing defence.
 """
-import copy
 import logging
 import os
 
@@ -12,6 +11,7 @@ from scipy.stats import mode
 from sklearn.tree import ExtraTreeClassifier
 
 from ..basemodels import ModelContainerTree, copy_model
+from ..datasets import SharedDataContainer
 from ..utils import name_handler, scale_normalize
 from .detector_container import DetectorContainer
 
@@ -91,7 +91,8 @@ class FeatureSqueezingTree(DetectorContainer):
                 criterion='gini',
                 splitter='random',
             )
-            mc = ModelContainerTree(classifier, copy.deepcopy(data_container))
+            mc = ModelContainerTree(
+                classifier, SharedDataContainer(data_container))
             dc = mc.data_container
 
             # replace train set with squeezed dataset
@@ -104,10 +105,9 @@ class FeatureSqueezingTree(DetectorContainer):
             elif method_name == 'median':
                 x_train = self.apply_median_transform(dc.x_train)
                 x_test = self.apply_median_transform(dc.x_test)
-            mc.data_container.x_train = x_train
-            mc.data_container.y_train = np.copy(dc.y_train)
-            mc.data_container.x_test = x_test
-            mc.data_container.y_test = np.copy(dc.y_test)
+            # labels are shared with the original data container
+            dc.x_train = x_train
+            dc.x_test = x_test
             self._models.append({
                 'name': method_name,
                 'model_container': mc,
@@ -56,6 +56,64 @@ def get_range(data, is_image=False):
     return (x_min, x_max)
 
 
+def get_stats(data, chunk_bytes=1 << 22):
+    """
+    Computes the feature-wise min, max, mean and standard deviation of a numpy
+    array in one pass. The array is scanned in chunks of rows, so each chunk
+    stays in cache while all 4 statistics are updated.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Input data. The statistics are computed along the 1st axis.
+    chunk_bytes : int
+        The approximate size of a chunk in bytes.
+
+    Returns
+    -------
+    x_min : numpy.ndarray
+        Feature-wise minimum.
+    x_max : numpy.ndarray
+        Feature-wise maximum.
+    mean : numpy.ndarray
+        Feature-wise mean.
+    std : numpy.ndarray
+        Feature-wise standard deviation.
+    """
+    assert isinstance(data, np.ndarray), '{} is not a numpy array'.format(type(data))
+    assert len(data) > 0
+
+    n = len(data)
+    row_bytes = max(1, data[0].nbytes)
+    chunk_size = max(1, chunk_bytes // row_bytes)
+
+    x_min, x_max, mean, m2 = None, None, None, None
+    count = 0
+    for start in range(0, n, chunk_size):
+        chunk = data[start: start + chunk_size]
+        chunk_64 = chunk.astype(np.float64)
+        n_b = len(chunk)
+        mean_b = chunk_64.mean(axis=0)
+        m2_b = np.square(chunk_64 - mean_b).sum(axis=0)
+        if count == 0:
+            x_min = chunk.min(axis=0)
+            x_max = chunk.max(axis=0)
+            mean, m2 = mean_b, m2_b
+        else:
+            np.minimum(x_min, chunk.min(axis=0), out=x_min)
+            np.maximum(x_max, chunk.max(axis=0), out=x_max)
+            # Chan et al. parallel update for mean and variance
+            delta = mean_b - mean
+            total = count + n_b
+            mean = mean + delta * (n_b / total)
+            m2 = m2 + m2_b + np.square(delta) * (count * n_b / total)
+        count += n_b
+
+    dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+    std = np.sqrt(m2 / count)
+    return x_min, x_max, mean.astype(dtype), std.astype(dtype)
+
+
 def scale_normalize(data, xmin, xmax, mean=None):
     """
     Applies scaling. If mean is not none, set output to zero mean. Otherwise,
@@ -213,11 +271,10 @@ def get_random_targets(true_labels,
     numpy.ndarray
         The target labels. It has same shape as `true_labels`.
     """
-    count = len(true_labels)
-    classes = np.arange(num_classes)
-    targets = -np.ones_like(true_labels, dtype=np.int64)
-    for i in range(count):
-        targets[i] = np.random.choice(np.delete(classes, true_labels[i]))
+    true_labels = np.asarray(true_labels, dtype=np.int64)
+    # draw from num_classes - 1 classes, and skip the true label
+    targets = np.random.randint(0, num_classes - 1, size=true_labels.shape)
+    targets += targets >= true_labels
     if not use_onehot:
         return targets
     else:
@@ -6,10 +6,11 @@ import sys
 
 import numpy as np
 
-from aad.attacks import get_attack
+from aad.attacks import ShardedAttackExecutor, get_attack
 from aad.basemodels import ModelContainerPT, get_model
 from aad.utils import get_time_str, master_seed
-from cmd_utils import get_data_container, parse_model_filename, set_logging
+from cmd_utils import (enable_attack_cache, get_data_container,
+                       parse_model_filename, set_logging)
 
 logger = logging.getLogger('attack')
 
@@ -19,7 +20,12 @@ def run_attacks(model_container,
                 params,
                 count,
                 filename,
-                overwrite):
+                overwrite,
+                resume=False,
+                num_workers=1,
+                num_threads=None,
+                seed=None,
+                use_store=False):
     """Run selected adversarial attacks"""
     for att_name in selected_attacks:
         adv_filename = filename + '_' + att_name
@@ -27,7 +33,16 @@ def run_attacks(model_container,
         kwargs = params[att_name]
         logger.debug('%s params: %s', att_name, str(kwargs))
         attack = Attack(model_container, **kwargs)
-        adv, y_adv, x_clean, y_clean = attack.generate(count=count)
+        if resume:
+            checkpoint_path = os.path.join('save', 'checkpoints', adv_filename)
+            logger.info('Checkpoint of %s: %s', att_name, checkpoint_path)
+            attack.enable_checkpoint(checkpoint_path)
+        if num_workers > 1:
+            executor = ShardedAttackExecutor(
+                attack, num_workers, num_threads, seed=seed)
+            adv, y_adv, x_clean, y_clean = executor.generate(count=count)
+        else:
+            adv, y_adv, x_clean, y_clean = attack.generate(count=count)
         logger.info('# of adv created from %s: %d', filename, len(adv))
         not_match = y_adv != y_clean
         success_rate = len(not_match[not_match == True]) / len(adv)
@@ -35,8 +50,14 @@ def run_attacks(model_container,
         logger.info('Success rate of %s: %f', att_name, success_rate)
         logger.info('Accuracy on %s: %f', att_name, accuracy)
         logger.debug('Save adv. attack results into: %s', adv_filename)
-        attack.save_attack(adv_filename, adv, y_adv,
-                           x_clean, y_clean, overwrite)
+        if use_store:
+            attack.save_attack_store(adv_filename, adv, y_adv,
+                                     x_clean, y_clean, overwrite)
+        else:
+            attack.save_attack(adv_filename, adv, y_adv,
+                               x_clean, y_clean, overwrite)
+        # the results are saved. The checkpoint is no longer needed.
+        attack.clear_checkpoint()
 
 
 def main():
@@ -62,6 +83,24 @@ def main():
     parser.add_argument(
         '-w', '--overwrite', action='store_true', default=False,
         help='overwrite the existing file')
+    parser.add_argument(
+        '--store', action='store_true', default=False,
+        help='save the results into one directory, save/<model>_<dataset>_<attack>, with a manifest, instead of 4 .npy files. The adv. examples are saved as the exact difference from the clean inputs')
+    parser.add_argument(
+        '--cache', action='store_true', default=False,
+        help='reuse the adv. examples from identical attacks in save/attack_cache')
+    parser.add_argument(
+        '--cache_size', type=float, default=2.0,
+        help='maximum size of the attack cache in GB')
+    parser.add_argument(
+        '-r', '--resume', action='store_true', default=False,
+        help='save finished mini-batches into a checkpoint, and skip the ones saved by a previous run')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='the number of worker processes. The inputs are split into shards evenly')
+    parser.add_argument(
+        '-t', '--threads', type=int, default=None,
+        help='the number of PyTorch threads in each worker process')
     parser.add_argument(
         '-B', '--bim', action='store_true', default=False,
         help='Apply BIM attack')
@@ -85,6 +124,11 @@ def main():
     verbose = args.verbose
     save_log = args.savelog
     overwrite = args.overwrite
+    use_cache = args.cache
+    use_store = args.store
+    resume = args.resume
+    num_workers = args.jobs
+    num_threads = args.threads
 
     # Which attack should apply?
     # use binary encoding for attacks
@@ -125,9 +169,17 @@ def main():
     logger.info('verbose    :%r', verbose)
     logger.info('save_log   :%r', save_log)
     logger.info('overwrite  :%r', overwrite)
+    logger.info('cache      :%r', use_cache)
+    logger.info('store      :%r', use_store)
+    logger.info('resume     :%r', resume)
+    logger.info('jobs       :%d', num_workers)
+    logger.info('threads    :%s', num_threads)
     logger.info('dirname    :%r', dirname)
     logger.info('attacks    :%s', ', '.join(selected_attacks))
 
+    if use_cache:
+        enable_attack_cache(args.cache_size)
+
     if len(selected_attacks) == 0:
         logger.warning('No attack is selected. Exit.')
         sys.exit(0)
@@ -161,7 +213,12 @@ def main():
                 att_params,
                 num_adv,
                 model_name + '_' + dname,
-                overwrite)
+                overwrite,
+                resume,
+                num_workers,
+                num_threads,
+                seed,
+                use_store)
 
 
 # Examples:
@@ -171,6 +228,8 @@ def main():
 # python ./cmd/attack.py -m ./save/IrisNN_HTRU2_e200.pt -p ./cmd/AttackParams.json -lvw -BCDF
 # python ./cmd/attack.py -m ./save/IrisNN_WheatSeed_e300.pt -p ./cmd/AttackParams.json -lvw -BCDF
 # python ./cmd/attack.py -m ./save/MnistCnnV2_MNIST_e50.pt -p ./cmd/AttackParams.json -lvw -FBDCS
+# python ./cmd/attack.py -m ./save/CifarCnn_CIFAR10_e50.pt -p ./cmd/AttackParams.json -lvwr -C
+# python ./cmd/attack.py -m ./save/CifarCnn_CIFAR10_e50.pt -p ./cmd/AttackParams.json -lvw -j 8 -t 2 -C
 # python ./cmd/attack.py -m ./save/CifarCnn_CIFAR10_e50.pt -p ./cmd/AttackParams.json -lvw -BCDFS
 # python ./cmd/attack.py -m ./save/CifarResnet50_CIFAR10_e50.pt -p ./cmd/AttackParams.json -lvw -BCDFS
 # python ./cmd/attack.py -m ./save/CifarResnet50_SVHN_e50.pt -p ./cmd/AttackParams.json -lvw -BCDFS
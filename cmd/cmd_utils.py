@@ -1,6 +1,9 @@
 import logging
 import os
 
+import numpy as np
+
+from aad.attacks import AdvStore, AttackCache, set_attack_cache
 from aad.datasets import DATASET_LIST, DataContainer
 from aad.utils import get_data_path, get_time_str
 
@@ -21,10 +24,26 @@ def set_logging(headername, dname, verbose, save_log):
         logging.basicConfig(level=log_lvl)
 
 
-def get_data_container(dname, use_shuffle=True, use_normalize=True):
-    """Returns a DataContainer based on given name"""
+def enable_attack_cache(max_gb=2.0, path=os.path.join('save', 'attack_cache')):
+    """Uses an AttackCache for all attacks. The least recently used results
+    are removed when the cache is larger than `max_gb` GB."""
+    cache = AttackCache(path, max_bytes=int(max_gb * 2**30))
+    set_attack_cache(cache)
+    return cache
+
+
+def get_data_container(dname, use_shuffle=True, use_normalize=True,
+                       num_workers=0, prefetch_factor=2):
+    """Returns a DataContainer based on given name. `num_workers` and
+    `prefetch_factor` are the defaults of its DataLoaders."""
     dataset = DATASET_LIST[dname]
     dc = DataContainer(dataset, get_data_path())
+    if num_workers > 0:
+        dc.set_loader_params(
+            num_workers=num_workers,
+            pin_memory=True,
+            persistent_workers=True,
+            prefetch_factor=prefetch_factor)
     if dname in ('MNIST', 'CIFAR10', 'SVHN'):
         dc(shuffle=use_shuffle)
     elif dname == 'Iris':
@@ -49,3 +68,37 @@ def parse_model_filename(filename):
     model_name = arr[0]
     dataset_name = arr[1]
     return model_name, dataset_name
+
+
+def split_attack_filename(filename):
+    """
+    Splits "<prefix>_<adv|pred|x|y>.npy" into the path of the AdvStore,
+    "<prefix>", and the name of the array.
+    """
+    base, ext = os.path.splitext(filename)
+    prefix, _, name = base.rpartition('_')
+    if ext != '.npy' or name not in AdvStore.NAMES:
+        return None, None
+    return prefix, name
+
+
+def attack_file_exists(filename):
+    """Returns True, if the file exists, or the array is in an AdvStore."""
+    if os.path.exists(filename):
+        return True
+    path, name = split_attack_filename(filename)
+    return path is not None and AdvStore.is_store(path) \
+        and name in AdvStore.open(path)
+
+
+def load_attack_file(filename):
+    """
+    Loads an array which is saved by `save_attack`. If the file does not
+    exist, the array is memory-mapped from the AdvStore "<prefix>" instead.
+    """
+    if os.path.exists(filename):
+        return np.load(filename, allow_pickle=False)
+    path, name = split_attack_filename(filename)
+    if path is None or not AdvStore.is_store(path):
+        raise FileNotFoundError('{} does not exist!'.format(filename))
+    return AdvStore.open(path).load(name)
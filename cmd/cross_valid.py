@@ -11,7 +11,7 @@ from aad.basemodels import ModelContainerPT, get_model
 from aad.datasets import DATASET_LIST, DataContainer
 from aad.defences import ApplicabilityDomainContainer
 from aad.utils import get_data_path, get_time_str, master_seed, name_handler
-from cmd_utils import parse_model_filename, set_logging
+from cmd_utils import enable_attack_cache, parse_model_filename, set_logging
 from cross_valid_core import CrossValidation
 
 logger = logging.getLogger('CV')
@@ -43,6 +43,12 @@ def main():
     parser.add_argument(
         '-w', '--overwrite', action='store_true', default=False,
         help='overwrite the existing file')
+    parser.add_argument(
+        '--cache', action='store_true', default=False,
+        help='reuse the adv. examples from identical attacks in save/attack_cache')
+    parser.add_argument(
+        '--cache_size', type=float, default=2.0,
+        help='maximum size of the attack cache in GB')
     args = parser.parse_args()
     model_file = args.model
     param_file = args.param
@@ -52,6 +58,7 @@ def main():
     save_log = args.savelog
     does_ignore = args.ignore
     overwrite = args.overwrite
+    use_cache = args.cache
 
     model_name, data_name = parse_model_filename(model_file)
 
@@ -86,6 +93,9 @@ def main():
     logger.info('save_log      :%r', save_log)
     logger.info('Ignore saving :%r', does_ignore)
     logger.info('overwrite     :%r', overwrite)
+    logger.info('cache         :%r', use_cache)
+    if use_cache:
+        enable_attack_cache(args.cache_size)
     logger.debug('params       :%s', str(params))
 
     # load parameters
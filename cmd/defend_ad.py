@@ -1,15 +1,13 @@
 import argparse as ap
 import json
 import logging
-import os
 import sys
 
-import numpy as np
-
 from aad.basemodels import ModelContainerPT, get_model
 from aad.defences import ApplicabilityDomainContainer
 from aad.utils import get_time_str, master_seed
-from cmd_utils import get_data_container, parse_model_filename, set_logging
+from cmd_utils import (attack_file_exists, get_data_container,
+                       load_attack_file, parse_model_filename, set_logging)
 
 logger = logging.getLogger('defence')
 
@@ -61,12 +59,12 @@ def main():
 
     # check adv. examples and parameter config files
     for f in data_files[:2] + [param_file]:
-        if not os.path.exists(f):
+        if not attack_file_exists(f):
             logger.warning('%s does not exist. Exit.', f)
             sys.exit(0)
     # check clean samples
     for f in data_files[-2:]:
-        if not os.path.exists(f):
+        if not attack_file_exists(f):
             logger.warning(
                 'Cannot load files for clean samples. Skip checking clean set.')
             check_clean = False
@@ -130,15 +128,15 @@ def main():
 
     # check clean
     if check_clean:
-        x = np.load(data_files[2], allow_pickle=False)
-        y = np.load(data_files[3], allow_pickle=False)
+        x = load_attack_file(data_files[2])
+        y = load_attack_file(data_files[3])
         x_passed, blk_idx, blocked_counts = detect(ad, 'clean samples', x, y)
         result = result_prefix + ['clean'] + blocked_counts
         result_clean = '[result]' + ','.join([str(r) for r in result])
 
     # check adversarial examples
-    adv = np.load(data_files[0], allow_pickle=False)
-    pred = np.load(data_files[1], allow_pickle=False)
+    adv = load_attack_file(data_files[0])
+    pred = load_attack_file(data_files[1])
     adv_passed, adv_blk_idx, blocked_counts = detect(
         ad, 'adv. examples', adv, pred)
     result = result_prefix + ['adv'] + blocked_counts
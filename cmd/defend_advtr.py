@@ -3,13 +3,12 @@ import logging
 import os
 import sys
 
-import numpy as np
-
 from aad.attacks import BIMContainer
 from aad.basemodels import IrisNN, ModelContainerPT, get_model
 from aad.defences import AdversarialTraining
 from aad.utils import get_time_str, master_seed
-from cmd_utils import get_data_container, parse_model_filename, set_logging
+from cmd_utils import (attack_file_exists, get_data_container,
+                       load_attack_file, parse_model_filename, set_logging)
 
 LOG_NAME = 'DefAdvTr'
 logger = logging.getLogger(LOG_NAME)
@@ -123,7 +122,7 @@ def main():
 
     # check files
     for file_name in [model_file, y_file] + attack_files:
-        if not os.path.exists(file_name):
+        if not attack_file_exists(file_name):
             logger.error('%s does not exist!', file_name)
             raise FileNotFoundError('{} does not exist!'.format(file_name))
 
@@ -167,12 +166,12 @@ def main():
     else:
         adv_trainer.load(os.path.join('save', pretrain_file))
 
-    y = np.load(y_file, allow_pickle=False)
+    y = load_attack_file(y_file)
     for i in range(len(attack_list)):
         adv_file = attack_files[i]
         adv_name = attack_list[i]
         logger.debug('Load %s...', adv_file)
-        adv = np.load(adv_file, allow_pickle=False)
+        adv = load_attack_file(adv_file)
         accuracy = classifier_mc.evaluate(adv, y)
         logger.info('Accuracy on %s set: %f', adv_name, accuracy)
         blocked_indices = adv_trainer.detect(adv, return_passed_x=False)
@@ -3,12 +3,11 @@ import logging
 import os
 import sys
 
-import numpy as np
-
 from aad.basemodels import IrisNN, ModelContainerPT, get_model
 from aad.defences import FeatureSqueezing
 from aad.utils import get_time_str, master_seed
-from cmd_utils import get_data_container, parse_model_filename, set_logging
+from cmd_utils import (attack_file_exists, get_data_container,
+                       load_attack_file, parse_model_filename, set_logging)
 
 LOG_NAME = 'DefSqueeze'
 logger = logging.getLogger(LOG_NAME)
@@ -155,7 +154,7 @@ def main():
 
     # check files
     for file_name in [model_file, y_file] + attack_files:
-        if not os.path.exists(file_name):
+        if not attack_file_exists(file_name):
             logger.error('%s does not exist!', file_name)
             raise FileNotFoundError('{} does not exist!'.format(file_name))
 
@@ -202,12 +201,12 @@ def main():
         squeezer.load(model_file)
 
     # traverse all attacks
-    y = np.load(y_file, allow_pickle=False)
+    y = load_attack_file(y_file)
     for i in range(len(attack_list)):
         adv_file = attack_files[i]
         adv_name = attack_list[i]
         logger.debug('Load %s...', adv_file)
-        adv = np.load(adv_file, allow_pickle=False)
+        adv = load_attack_file(adv_file)
         acc_og = classifier_mc.evaluate(adv, y)
         acc_squeezer = squeezer.evaluate(adv, y)
         logger.info('Accuracy on %s set - OG: %f, Squeezer: %f',
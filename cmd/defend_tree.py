@@ -4,7 +4,6 @@ import logging
 import os
 import sys
 
-import numpy as np
 from art.attacks import DecisionTreeAttack
 from art.classifiers import SklearnClassifier
 from sklearn.tree import ExtraTreeClassifier
@@ -12,7 +11,8 @@ from sklearn.tree import ExtraTreeClassifier
 from aad.basemodels import ModelContainerTree
 from aad.defences import ApplicabilityDomainContainer
 from aad.utils import get_time_str, master_seed
-from cmd_utils import get_data_container, set_logging
+from cmd_utils import (attack_file_exists, get_data_container,
+                       load_attack_file, set_logging)
 
 LOG_NAME = 'DefTree'
 logger = logging.getLogger(LOG_NAME)
@@ -109,7 +109,7 @@ def main():
 
     # check files
     for file_name in [y_file] + attack_files:
-        if not os.path.exists(file_name):
+        if not attack_file_exists(file_name):
             logger.error('%s does not exist!', file_name)
             raise FileNotFoundError('{} does not exist!'.format(file_name))
 
@@ -131,7 +131,7 @@ def main():
     mc = ModelContainerTree(classifier, dc)
     mc.fit()
 
-    x = np.load(attack_files[0], allow_pickle=False)
+    x = load_attack_file(attack_files[0])
     art_classifier = SklearnClassifier(classifier)
     attack = DecisionTreeAttack(art_classifier)
     adv = attack.generate(x)
@@ -141,7 +141,7 @@ def main():
     ad.fit()
 
     # generate adversarial examples
-    y = np.load(y_file, allow_pickle=False)
+    y = load_attack_file(y_file)
 
     accuracy = mc.evaluate(adv, y)
     logger.info('Accuracy on DecisionTreeAttack set: %f', accuracy)
@@ -154,7 +154,7 @@ def main():
         adv_file = attack_files[i]
         adv_name = attack_list[i]
         logger.debug('Load %s...', adv_file)
-        adv = np.load(adv_file, allow_pickle=False)
+        adv = load_attack_file(adv_file)
         accuracy = mc.evaluate(adv, y)
         logger.info('Accuracy on %s set: %f', adv_name, accuracy)
         blocked_indices = ad.detect(adv, return_passed_x=False)
@@ -15,12 +15,13 @@ import time
 
 import numpy as np
 
-from aad.attacks import BIMContainer, get_attack
+from aad.attacks import (AttackSuite, BIMContainer, ShardedAttackExecutor,
+                         get_attack)
 from aad.basemodels import BCNN, IrisNN, ModelContainerPT
 from aad.defences import (AdversarialTraining, ApplicabilityDomainContainer,
                           DistillationContainer, FeatureSqueezing)
 from aad.utils import get_time_str, name_handler
-from cmd_utils import get_data_container, set_logging
+from cmd_utils import enable_attack_cache, get_data_container, set_logging
 
 LOG_NAME = 'Mul'
 logger = logging.getLogger(LOG_NAME)
@@ -72,7 +73,8 @@ def block_attack(offset, advs, defence, def_name, blocked_res):
                     def_name, len(blocked_indices), len(adv), ATTACK_LIST[j])
 
 
-def experiment(index, dname, max_epochs, adv_file, res_file):
+def experiment(index, dname, max_epochs, adv_file, res_file,
+               num_workers=1, num_threads=None):
     # STEP 1: select data
     dc = get_data_container(dname, use_shuffle=True, use_normalize=True)
 
@@ -126,19 +128,28 @@ def experiment(index, dname, max_epochs, adv_file, res_file):
     att_param_json = open(os.path.join(DIR_PATH, 'AttackParams.json'))
     att_params = json.load(att_param_json)
 
+    # Clean set is only used in evaluation phase.
+    att_configs = {att_name: att_params[att_name]
+                   for att_name in ATTACK_LIST if att_name != 'Clean'}
+    for att_name, kwargs in att_configs.items():
+        logger.debug('%s params: %s', att_name, str(kwargs))
+    if num_workers > 1:
+        outputs = {}
+        for att_name, kwargs in att_configs.items():
+            logger.debug('Running %s attack...', att_name)
+            attack = ShardedAttackExecutor(
+                get_attack(att_name)(mc, **kwargs), num_workers, num_threads)
+            outputs[att_name] = attack.generate(use_testset=False, x=x)
+    else:
+        # the attacks share the clean predictions and the first gradients
+        suite = AttackSuite(mc, att_configs)
+        outputs = suite.generate(use_testset=False, x=x)
+
     for i, att_name in enumerate(ATTACK_LIST):
-        # Clean set is only used in evaluation phase.
         if att_name == 'Clean':
             continue
 
-        logger.debug('[%d]Running %s attack...', i, att_name)
-        kwargs = att_params[att_name]
-        logger.debug('%s params: %s', att_name, str(kwargs))
-        Attack = get_attack(att_name)
-        attack = Attack(mc, **kwargs)
-        adv, pred_adv, x_clean, pred_clean_ = attack.generate(
-            use_testset=False,
-            x=x)
+        adv, pred_adv, x_clean, pred_clean_ = outputs[att_name]
         assert np.all(pred_clean == pred_clean_)
         assert np.all(x == x_clean)
         logger.info('created %d adv examples using %s from %s',
@@ -231,6 +242,18 @@ def main():
     parser.add_argument(
         '-w', '--overwrite', action='store_true', default=False,
         help='overwrite the existing file')
+    parser.add_argument(
+        '--cache', action='store_true', default=False,
+        help='reuse the adv. examples from identical attacks in save/attack_cache')
+    parser.add_argument(
+        '--cache_size', type=float, default=2.0,
+        help='maximum size of the attack cache in GB')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='the number of worker processes for generating adv. examples')
+    parser.add_argument(
+        '-t', '--threads', type=int, default=None,
+        help='the number of PyTorch threads in each worker process')
 
     # NOTE: the JSON file for parameter are hard coded.
     # We expect to run multiple attacks and defences in one iteration.
@@ -241,6 +264,9 @@ def main():
     verbose = args.verbose
     save_log = args.savelog
     overwrite = args.overwrite
+    use_cache = args.cache
+    num_workers = args.jobs
+    num_threads = args.threads
 
     # set logging config. Run this before logging anything!
     set_logging(LOG_NAME, dname, verbose, save_log)
@@ -254,6 +280,11 @@ def main():
     logger.info('verbose     :%r', verbose)
     logger.info('save_log    :%r', save_log)
     logger.info('overwrite   :%r', overwrite)
+    logger.info('cache       :%r', use_cache)
+    if use_cache:
+        enable_attack_cache(args.cache_size)
+    logger.info('jobs        :%d', num_workers)
+    logger.info('threads     :%s', num_threads)
 
     result_file = name_handler(
         os.path.join('save', f'{LOG_NAME}_{dname}_i{max_iterations}'),
@@ -273,7 +304,8 @@ def main():
     res_file.write(','.join(TITLE_RESULTS) + '\n')
     for i in range(max_iterations):
         since = time.time()
-        experiment(i, dname, max_epochs, adv_file, res_file)
+        experiment(i, dname, max_epochs, adv_file, res_file,
+                   num_workers, num_threads)
         time_elapsed = time.time() - since
         print('Completed {} [{}/{}]: {:d}m {:2.1f}s'.format(
             dname,
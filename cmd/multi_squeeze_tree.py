@@ -11,10 +11,9 @@ import argparse as ap
 import logging
 import os
 
-from art.attacks import DecisionTreeAttack
-from art.classifiers import SklearnClassifier
 from sklearn.tree import ExtraTreeClassifier
 
+from aad.attacks import TreeAttackContainer
 from aad.basemodels import ModelContainerTree
 from aad.defences import FeatureSqueezingTree
 from aad.utils import get_time_str, name_handler
@@ -68,14 +67,8 @@ def experiment(data_name, filter_list, bit_depth, sigma, kernel_size):
     num_blk_clean = len(blocked_indices)
 
     # generate adversarial examples
-    art_classifier = SklearnClassifier(classifier)
-    try:
-        attack = DecisionTreeAttack(art_classifier)
-        adv = attack.generate(x)
-    except IndexError as error:
-        # Output expected IndexErrors.
-        logger.error(error)
-        return num_blk_clean, -1
+    attack = TreeAttackContainer(mc)
+    adv, _, _, _ = attack.generate(use_testset=False, x=x)
 
     accuracy = mc.evaluate(adv, y)
     logger.info('Accuracy on DecisionTreeAttack: %f', accuracy)
@@ -163,8 +156,6 @@ def main():
         while i <= max_iterations:
             num_blk_clean, num_blk_adv = experiment(
                 data_name, filter_list, bit_depth, sigma, kernel_size)
-            if num_blk_adv == -1:
-                continue
             i += 1
             file.write(f'{i},{num_blk_clean},{num_blk_adv}\n')
         file.close()
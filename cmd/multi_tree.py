@@ -12,10 +12,9 @@ import json
 import logging
 import os
 
-from art.attacks import DecisionTreeAttack
-from art.classifiers import SklearnClassifier
 from sklearn.tree import ExtraTreeClassifier
 
+from aad.attacks import TreeAttackContainer
 from aad.basemodels import ModelContainerTree
 from aad.defences import ApplicabilityDomainContainer
 from aad.utils import get_time_str, name_handler
@@ -64,14 +63,8 @@ def experiment(data_name, params):
     num_blk_clean = len(blocked_indices)
 
     # generate adversarial examples
-    art_classifier = SklearnClassifier(classifier)
-    try:
-        attack = DecisionTreeAttack(art_classifier)
-        adv = attack.generate(x)
-    except IndexError as error:
-        # Output expected IndexErrors.
-        logger.error(error)
-        return num_blk_clean, -1
+    attack = TreeAttackContainer(mc)
+    adv, _, _, _ = attack.generate(use_testset=False, x=x)
 
     accuracy = mc.evaluate(adv, y)
     logger.info('Accuracy on DecisionTreeAttack: %f', accuracy)
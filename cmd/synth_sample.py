@@ -53,7 +53,7 @@ from aad.defences import (AdversarialTraining, ApplicabilityDomainContainer,
                           DistillationContainer, FeatureSqueezing)
 from aad.utils import (get_data_path, get_time_str, name_handler,
                        scale_normalize)
-from cmd_utils import get_data_container, set_logging
+from cmd_utils import enable_attack_cache, get_data_container, set_logging
 
 LOG_NAME = 'SynthSample'
 logger = logging.getLogger(LOG_NAME)
@@ -259,6 +259,12 @@ def main():
     parser.add_argument(
         '-w', '--overwrite', action='store_true', default=False,
         help='overwrite the existing file')
+    parser.add_argument(
+        '--cache', action='store_true', default=False,
+        help='reuse the adv. examples from identical attacks in save/attack_cache')
+    parser.add_argument(
+        '--cache_size', type=float, default=2.0,
+        help='maximum size of the attack cache in GB')
 
     args = parser.parse_args()
     sample_size = args.size
@@ -269,6 +275,7 @@ def main():
     verbose = args.verbose
     save_log = args.savelog
     overwrite = args.overwrite
+    use_cache = args.cache
 
     # set logging config. Run this before logging anything!
     dname = f'SyntheticS{sample_size}F{num_features}C{num_classes}'
@@ -286,6 +293,9 @@ def main():
     logger.info('verbose     :%r', verbose)
     logger.info('save_log    :%r', save_log)
     logger.info('overwrite   :%r', overwrite)
+    logger.info('cache       :%r', use_cache)
+    if use_cache:
+        enable_attack_cache(args.cache_size)
 
     result_file = name_handler(
         os.path.join('save', f'{LOG_NAME}_{dname}_i{max_iterations}'),
@@ -38,6 +38,12 @@ def main():
     parser.add_argument(
         '-m', '--model', type=str, choices=AVALIABLE_MODELS,
         help='select a model to train the data')
+    parser.add_argument(
+        '-k', '--workers', type=int, default=0,
+        help='the number of worker processes for loading the data')
+    parser.add_argument(
+        '-p', '--prefetch', type=int, default=2,
+        help='the number of batches loaded in advance by each worker')
     parser.add_argument(
         '-v', '--verbose', action='store_true', default=False,
         help='set logger level to debug')
@@ -56,6 +62,8 @@ def main():
     use_shuffle = args.shuffle
     use_normalize = args.normalize
     model_name = args.model
+    num_workers = args.workers
+    prefetch_factor = args.prefetch
     verbose = args.verbose
     save_log = args.savelog
     overwrite = args.overwrite
@@ -75,6 +83,8 @@ def main():
     logger.info('use_shuffle   :%r', use_shuffle)
     logger.info('use_normalize :%r', use_normalize)
     logger.info('model_name    :%s', model_name)
+    logger.info('num_workers   :%d', num_workers)
+    logger.info('prefetch      :%d', prefetch_factor)
     logger.info('verbose       :%r', verbose)
     logger.info('save_log      :%r', save_log)
     logger.info('overwrite     :%r', overwrite)
@@ -86,6 +96,8 @@ def main():
         dname,
         use_shuffle=use_shuffle,
         use_normalize=use_normalize,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor,
     )
 
     # select a model
@@ -146,6 +158,7 @@ if __name__ == "__main__":
     
     $ python ./cmd/train.py -d CIFAR10 -m CifarCnn -e 50 -vw
     $ python ./cmd/train.py -d CIFAR10 -m CifarResnet50 -e 50 -vwl
+    $ python ./cmd/train.py -d CIFAR10 -m CifarResnet50 -e 50 -k 8 -p 4 -vwl
     $ python ./cmd/train.py -d SVHN -m CifarCnn -e 50 -vwl
     $ python ./cmd/train.py -d SVHN -m CifarResnet50 -e 50 -vwl
     """
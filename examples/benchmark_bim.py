@@ -0,0 +1,89 @@
+"""
+Compares the running time of the PyTorch BIM implementation against IBM ART's BasicIterativeMethod.
+
+Example:
+$ python ./examples/benchmark_bim.py -d Iris -i 100 -r 3
+"""
+import argparse as ap
+import logging
+import time
+
+import numpy as np
+
+from aad.attacks import BIMContainer
+from aad.basemodels import IrisNN, MnistCnnV2, ModelContainerPT
+from aad.datasets import DATASET_LIST, DataContainer
+from aad.utils import get_data_path, master_seed
+
+logger = logging.getLogger('benchmark')
+
+
+def run(attack, count, repeat):
+    """Returns the best running time and the adversarial examples."""
+    best = np.inf
+    for _ in range(repeat):
+        master_seed(4096)
+        since = time.perf_counter()
+        adv, y_adv, x, y = attack.generate(count=count)
+        best = min(best, time.perf_counter() - since)
+    return best, adv, y_adv
+
+
+def main():
+    parser = ap.ArgumentParser()
+    parser.add_argument(
+        '-d', '--dataset', type=str, default='Iris',
+        choices=['BankNote', 'HTRU2', 'Iris', 'WheatSeed', 'MNIST'])
+    parser.add_argument(
+        '-e', '--epoch', type=int, default=50,
+        help='the number of epochs for training the model')
+    parser.add_argument(
+        '-n', '--number', type=int, default=1000,
+        help='the number of adv. examples')
+    parser.add_argument(
+        '-i', '--iteration', type=int, default=100,
+        help='the number of BIM iterations')
+    parser.add_argument(
+        '-b', '--batchsize', type=int, default=64, help='batch size')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='the number of runs, the best time is reported')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    master_seed(4096)
+
+    dc = DataContainer(DATASET_LIST[args.dataset], get_data_path())
+    if args.dataset == 'MNIST':
+        dc(shuffle=True)
+        model = MnistCnnV2()
+    else:
+        dc(shuffle=True, normalize=True)
+        num_features = dc.dim_data[0]
+        model = IrisNN(
+            num_features=num_features,
+            hidden_nodes=num_features*4,
+            num_classes=dc.num_classes)
+    mc = ModelContainerPT(model, dc)
+    mc.fit(max_epochs=args.epoch, batch_size=128)
+
+    params = {
+        'eps': 0.3,
+        'eps_step': 0.1,
+        'max_iter': args.iteration,
+        'batch_size': args.batchsize,
+    }
+    count = min(args.number, len(dc.x_test))
+    t_native, adv_native, y_native = run(
+        BIMContainer(mc, use_art=False, **params), count, args.repeat)
+    t_art, adv_art, y_art = run(
+        BIMContainer(mc, use_art=True, **params), count, args.repeat)
+
+    print(f'{args.dataset}: {count} samples, {args.iteration} iterations')
+    print(f'ART     : {t_art:.3f}s')
+    print(f'PyTorch : {t_native:.3f}s ({t_art / t_native:.1f}x)')
+    print('Max difference   : {:.6f}'.format(np.max(np.abs(adv_art - adv_native))))
+    print('Same predictions : {:.2f}%'.format(100. * np.mean(y_art == y_native)))
+
+
+if __name__ == '__main__':
+    main()
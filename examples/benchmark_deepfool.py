@@ -0,0 +1,98 @@
+"""
+Compares the running time of the PyTorch DeepFool implementation against IBM ART's DeepFool.
+
+Example:
+$ python ./examples/benchmark_deepfool.py -d MNIST -n 1000 -r 3
+"""
+import argparse as ap
+import logging
+import time
+
+import numpy as np
+
+from aad.attacks import DeepFoolContainer
+from aad.basemodels import CifarCnn, IrisNN, MnistCnnV2, ModelContainerPT
+from aad.datasets import DATASET_LIST, DataContainer
+from aad.utils import get_data_path, master_seed
+
+logger = logging.getLogger('benchmark')
+
+
+def run(attack, count, repeat):
+    """Returns the best running time and the adversarial examples."""
+    best = np.inf
+    for _ in range(repeat):
+        master_seed(4096)
+        since = time.perf_counter()
+        adv, y_adv, x, y = attack.generate(count=count)
+        best = min(best, time.perf_counter() - since)
+    return best, adv, y_adv, y
+
+
+def main():
+    parser = ap.ArgumentParser()
+    parser.add_argument(
+        '-d', '--dataset', type=str, default='MNIST',
+        choices=['BankNote', 'HTRU2', 'Iris', 'WheatSeed', 'MNIST',
+                 'CIFAR10'])
+    parser.add_argument(
+        '-e', '--epoch', type=int, default=50,
+        help='the number of epochs for training the model')
+    parser.add_argument(
+        '-n', '--number', type=int, default=1000,
+        help='the number of adv. examples')
+    parser.add_argument(
+        '-i', '--iteration', type=int, default=100,
+        help='the maximum number of DeepFool iterations')
+    parser.add_argument(
+        '-b', '--batchsize', type=int, default=16, help='batch size')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='the number of runs, the best time is reported')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    master_seed(4096)
+
+    dc = DataContainer(DATASET_LIST[args.dataset], get_data_path())
+    if args.dataset == 'MNIST':
+        dc(shuffle=True)
+        model = MnistCnnV2()
+    elif args.dataset == 'CIFAR10':
+        dc(shuffle=True)
+        model = CifarCnn()
+    else:
+        dc(shuffle=True, normalize=True)
+        num_features = dc.dim_data[0]
+        model = IrisNN(
+            num_features=num_features,
+            hidden_nodes=num_features*4,
+            num_classes=dc.num_classes)
+    mc = ModelContainerPT(model, dc)
+    mc.fit(max_epochs=args.epoch, batch_size=128)
+
+    params = {
+        'max_iter': args.iteration,
+        'epsilon': 1e-6,
+        'nb_grads': 10,
+        'batch_size': args.batchsize,
+    }
+    count = min(args.number, len(dc.x_test))
+    native = DeepFoolContainer(mc, use_art=False, **params)
+    t_native, adv_native, y_native, y_clean = run(native, count, args.repeat)
+    t_art, adv_art, y_art, _ = run(
+        DeepFoolContainer(mc, use_art=True, **params), count, args.repeat)
+
+    print(f'{args.dataset}: {count} samples, {args.iteration} iterations')
+    print(f'ART     : {t_art:.3f}s ({count / t_art:.1f} samples/s)')
+    print(f'PyTorch : {t_native:.3f}s ({count / t_native:.1f} samples/s, '
+          f'{t_art / t_native:.1f}x)')
+    print('Average active batch size: {:.2f}'.format(
+        native.avg_active_batch_size))
+    print('Success rate     : ART {:.2f}%, PyTorch {:.2f}%'.format(
+        100. * np.mean(y_art != y_clean), 100. * np.mean(y_native != y_clean)))
+    print('Max difference   : {:.6f}'.format(np.max(np.abs(adv_art - adv_native))))
+    print('Same predictions : {:.2f}%'.format(100. * np.mean(y_art == y_native)))
+
+
+if __name__ == '__main__':
+    main()
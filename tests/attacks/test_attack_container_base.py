@@ -1,10 +1,11 @@
 import logging
 import os
+import tempfile
 import unittest
 
 import numpy as np
 
-from aad.attacks import AttackContainer
+from aad.attacks import AdvStore, AttackContainer
 from aad.utils import master_seed
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,88 @@ class TestAttackContainer(unittest.TestCase):
         self.assertTrue(np.array_equal(pred, fpred))
         self.assertTrue(np.array_equal(y, fy))
 
+    def test_store(self):
+        adv = np.random.rand(100, 3, 8, 8).astype(np.float32)
+        pred = np.random.choice(range(10), 100, replace=True).astype(np.int64)
+        x = np.random.rand(100, 3, 8, 8).astype(np.float32)
+        y = np.random.choice(range(10), 100, replace=True).astype(np.int64)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test_attack')
+            store = AdvStore.create(
+                path, attack_name='Test', params={'eps': np.float32(0.3)})
+            # append batches during generation
+            for start in range(0, 100, 32):
+                end = start + 32
+                store.append(adv[start:end], pred=pred[start:end],
+                             x=x[start:end], y=y[start:end])
+            with self.assertRaises(FileExistsError):
+                AdvStore.create(path)
+
+            store = AdvStore.open(path)
+            self.assertEqual(len(store), 100)
+            self.assertEqual(store.names, ['adv', 'pred', 'x', 'y'])
+            self.assertEqual(store.params, {'eps': 0.30000001192092896})
+            fadv = store['adv']
+            self.assertEqual(fadv.shape, adv.shape)
+            # random-access slicing across the chunks
+            np.testing.assert_array_equal(fadv[30:70], adv[30:70])
+            np.testing.assert_array_equal(fadv[::7], adv[::7])
+            np.testing.assert_array_equal(fadv[-1], adv[-1])
+            indices = np.random.permutation(100)[:20]
+            np.testing.assert_array_equal(fadv[indices], adv[indices])
+            np.testing.assert_array_equal(np.asarray(store['y']), y)
+
+            fadv, fpred, fx, fy = AttackContainer.load_adv_examples(path)
+            np.testing.assert_array_equal(fadv, adv)
+            np.testing.assert_array_equal(fpred, pred)
+            np.testing.assert_array_equal(fx, x)
+            np.testing.assert_array_equal(fy, y)
+
+            # a single chunk is memory-mapped
+            store = AdvStore.create(path, overwrite=True)
+            store.append(adv)
+            fadv, fpred, _, _ = AttackContainer.load_adv_examples(path)
+            self.assertIsInstance(fadv, np.memmap)
+            self.assertIsNone(fpred)
+
+    def test_store_encoding(self):
+        x = np.random.rand(100, 3, 8, 8).astype(np.float32)
+        # a few pixels are changed, e.g.: JSMA
+        adv_sparse = np.copy(x)
+        adv_sparse.reshape(100, -1)[:, :5] = 1.0
+        # all pixels are changed by small values, e.g.: C&W L2
+        adv_small = np.clip(
+            x + np.random.normal(0, 1e-3, x.shape), 0, 1).astype(np.float32)
+        adv_small[0, 0, 0, 0] = -0.0
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test_attack')
+            for adv in [adv_sparse, adv_small]:
+                sizes = {}
+                for encoding in AdvStore.ENCODINGS:
+                    store = AdvStore.create(
+                        path, encoding=encoding, overwrite=True)
+                    for start in range(0, 100, 40):
+                        store.append(adv[start:start+40], x=x[start:start+40])
+                    sizes[encoding] = store.nbytes
+
+                    store = AdvStore.open(path)
+                    fadv = store['adv']
+                    # the reconstruction is exact
+                    np.testing.assert_array_equal(
+                        fadv[:].view(np.uint32), adv.view(np.uint32))
+                    np.testing.assert_array_equal(fadv[35:45], adv[35:45])
+                    np.testing.assert_array_equal(fadv[[99, 0, 50]],
+                                                  adv[[99, 0, 50]])
+                    np.testing.assert_array_equal(store.load('x'), x)
+                x_size = x.nbytes
+                self.assertLess(sizes['auto'] - x_size,
+                                sizes['dense'] - x_size)
+            self.assertLess(sizes['xor'], sizes['dense'])
+
+            with self.assertRaises(AssertionError):
+                AdvStore.create(path, encoding='sparse', overwrite=True) \
+                    .append(adv_sparse)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,11 @@
 import logging
 import os
+import shutil
+import tempfile
 import unittest
 
 import numpy as np
+import torch
 
 import aad.attacks as attacks
 from aad.basemodels import IrisNN, ModelContainerPT
@@ -125,6 +128,218 @@ class TestAttackIris(unittest.TestCase):
         l2 = np.max(get_l2_norm(adv, x_clean))
         logger.info('L2 norm = %f', l2)
 
+    def test_bim_early_exit(self):
+        params = {'eps': 0.3, 'eps_step': 0.1, 'max_iter': 100}
+        attack = attacks.BIMContainer(self.mc, early_exit=True, **params)
+        adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+        attack_full = attacks.BIMContainer(self.mc, **params)
+        adv_full, y_full, _, _ = attack_full.generate(count=NUM_ADV)
+
+        # the early exit does not lose any successful sample
+        success_rate = (y_adv != y_clean).sum() / len(y_adv)
+        success_full = (y_full != y_clean).sum() / len(y_full)
+        logger.info('Success rate with early exit: %f', success_rate)
+        self.assertGreaterEqual(success_rate, success_full)
+
+        # the perturbation is smaller, since the samples stop once they are
+        # misclassified
+        self.assertLessEqual(np.max(np.abs(adv - x_clean)), 0.3 + 1e-4)
+        self.assertLessEqual(
+            np.mean(get_l2_norm(adv, x_clean)),
+            np.mean(get_l2_norm(adv_full, x_clean)))
+
+        logger.info('Average active batch size: %f',
+                    attack.avg_active_batch_size)
+        self.assertLess(
+            attack.avg_active_batch_size, attack_full.avg_active_batch_size)
+
+    def test_deepfool_class_gradients(self):
+        attack = attacks.DeepFoolContainer(self.mc)
+        x = torch.from_numpy(
+            self.dc.x_test[:16].astype(np.float32)).requires_grad_(True)
+        scores = self.mc.model(x)
+        expected = [torch.autograd.grad(
+            scores[:, i].sum(), x, retain_graph=True)[0]
+            for i in range(scores.size(1))]
+
+        # all classes in one backward pass
+        grads = attack._class_gradients(scores, x)
+        self.assertEqual(grads.shape, (16, scores.size(1), x.size(1)))
+        for i, grad in enumerate(expected):
+            np.testing.assert_allclose(
+                grads[:, i].detach().numpy(), grad.numpy(), atol=1e-6)
+
+    def test_robustness_curve(self):
+        eps = [0.1, 0.3]
+        curve = attacks.robustness_curve(
+            self.mc, eps, attack='BIM', count=NUM_ADV, eps_step=0.1,
+            max_iter=20, return_adv=True)
+        self.assertEqual(curve['adv'].shape, (2,) + curve['x'].shape)
+        self.assertEqual(curve['pred_adv'].shape, (2, NUM_ADV))
+
+        # same as BIMContainer on each eps
+        for i, e in enumerate(eps):
+            attack = attacks.BIMContainer(
+                self.mc, eps=e, eps_step=0.1, max_iter=20)
+            adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+            np.testing.assert_allclose(curve['adv'][i], adv, atol=1e-5)
+            accuracy = self.mc.evaluate(adv, self.dc.y_test[:NUM_ADV])
+            self.assertAlmostEqual(curve['accuracy'][i], accuracy)
+            self.assertAlmostEqual(
+                curve['success_rate'][i], np.mean(y_adv != y_clean))
+
+        curve = attacks.robustness_curve(
+            self.mc, [0.0, 0.1, 0.3], attack='FGSM', count=NUM_ADV)
+        self.assertAlmostEqual(curve['success_rate'][0], 0.0)
+        self.assertLessEqual(
+            curve['success_rate'][1], curve['success_rate'][2])
+
+    def test_generate_predicts_once(self):
+        attack = attacks.PGDContainer(
+            self.mc, eps=0.3, eps_step=0.1, max_iter=10)
+        predict = self.mc.predict
+        sizes = []
+
+        def counted_predict(x, *args, **kwargs):
+            sizes.append(len(x))
+            return predict(x, *args, **kwargs)
+
+        self.mc.predict = counted_predict
+        try:
+            adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+        finally:
+            del self.mc.predict
+        # one call on the clean inputs, and one on the adv. examples
+        self.assertListEqual(sizes, [NUM_ADV, NUM_ADV])
+        np.testing.assert_array_equal(y_clean, self.mc.predict(x_clean))
+        np.testing.assert_array_equal(y_adv, self.mc.predict(adv))
+
+    def test_attack_suite(self):
+        configs = {
+            'FGSM': {'eps': 0.3, 'eps_step': 0.1, 'minimal': False},
+            'BIM': {'eps': 0.3, 'eps_step': 0.1, 'max_iter': 20},
+            'PGD': {'norm': 2, 'eps': 0.5, 'eps_step': 0.1, 'max_iter': 20},
+            'DeepFool': {'max_iter': 50, 'nb_grads': 3, 'batch_size': 16},
+        }
+        suite = attacks.AttackSuite(self.mc, configs)
+        outputs = suite.generate(count=NUM_ADV)
+        self.assertListEqual(list(outputs.keys()), list(configs.keys()))
+
+        # same as the independent runs
+        pred = self.mc.predict(self.dc.x_test[:NUM_ADV])
+        for name in ['BIM', 'PGD', 'DeepFool']:
+            attack = attacks.get_attack(name)(self.mc, **configs[name])
+            adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+            np.testing.assert_allclose(outputs[name][0], adv, atol=1e-6)
+            np.testing.assert_array_equal(outputs[name][1], y_adv)
+            np.testing.assert_array_equal(outputs[name][3], y_clean)
+            np.testing.assert_array_equal(outputs[name][3], pred)
+
+        # FGSM is a single step of the shared gradient
+        curve = attacks.robustness_curve(
+            self.mc, [0.3], 'FGSM', count=NUM_ADV, return_adv=True)
+        np.testing.assert_allclose(
+            outputs['FGSM'][0], curve['adv'][0], atol=1e-6)
+        np.testing.assert_array_equal(
+            outputs['FGSM'][1], curve['pred_adv'][0])
+
+    def test_attack_suite_cache(self):
+        configs = {
+            'BIM': {'eps': 0.3, 'eps_step': 0.1, 'max_iter': 20},
+            'DeepFool': {'max_iter': 50, 'nb_grads': 3, 'batch_size': 16},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = attacks.AttackCache(tmp)
+            attacks.set_attack_cache(cache)
+            try:
+                outputs = attacks.AttackSuite(self.mc, configs).generate(
+                    count=NUM_ADV)
+                self.assertEqual((cache.misses, len(cache)), (2, 2))
+
+                # the entries are shared with `generate`
+                attack = attacks.BIMContainer(self.mc, **configs['BIM'])
+                attack._attack_batch = None
+                adv, _, _, _ = attack.generate(count=NUM_ADV)
+                self.assertEqual(cache.hits, 1)
+                np.testing.assert_array_equal(outputs['BIM'][0], adv)
+
+                # nothing is computed again
+                suite = attacks.AttackSuite(self.mc, configs)
+                suite._clean_pass = None
+                cached = suite.generate(count=NUM_ADV)
+                self.assertEqual(cache.hits, 3)
+                for name in configs:
+                    np.testing.assert_array_equal(
+                        outputs[name][0], cached[name][0])
+            finally:
+                attacks.set_attack_cache(None)
+
+    def test_all_targets(self):
+        attack = attacks.BIMContainer(
+            self.mc, eps=0.3, eps_step=0.1, max_iter=100)
+        outputs = attack.generate_all_targets(count=NUM_ADV, return_adv=True)
+        num_classes = self.dc.num_classes
+        success = outputs['success']
+        l2 = outputs['l2']
+        self.assertTupleEqual(success.shape, (NUM_ADV, num_classes))
+        self.assertTupleEqual(l2.shape, (NUM_ADV, num_classes))
+        self.assertTupleEqual(
+            outputs['adv'].shape, (NUM_ADV, num_classes) + self.dc.dim_data)
+
+        # the clean predictions are not attacked
+        pred_clean = outputs['pred_clean']
+        rows = np.arange(NUM_ADV)
+        self.assertFalse(success[rows, pred_clean].any())
+        self.assertTrue(np.isnan(l2[rows, pred_clean]).all())
+        self.assertEqual(np.isnan(l2).sum(), NUM_ADV)
+        logger.info('Success rate of all targets: %f',
+                    success.sum() / (NUM_ADV * (num_classes - 1)))
+
+        # same as the attacks with one target at a time
+        for offset in range(1, num_classes):
+            targets = (pred_clean + offset) % num_classes
+            adv, y_adv, _, _ = attack.generate(
+                count=NUM_ADV, targets=targets)
+            np.testing.assert_allclose(
+                outputs['adv'][rows, targets], adv, atol=1e-6)
+            np.testing.assert_array_equal(
+                success[rows, targets], y_adv == targets)
+
+    def test_pgd(self):
+        attack = attacks.PGDContainer(
+            self.mc,
+            norm=2,
+            eps=0.6,
+            eps_step=0.1,
+            max_iter=100,
+            random_init=True)
+        adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+        self.assertFalse((adv == x_clean).all())
+
+        success_rate = (y_adv != y_clean).sum() / len(y_adv)
+        logger.info('Success rate of adv. attack: %f', success_rate)
+        self.assertGreaterEqual(success_rate, 0.5)
+
+        # Check the L2 norm of perturbation
+        l2 = np.max(get_l2_norm(adv, x_clean))
+        logger.info('L2 norm = %f', l2)
+        self.assertLessEqual(l2, 0.6 + 1e-4)
+
+        # Check bounding box
+        x_min, x_max = self.dc.data_range
+        self.assertTrue((adv <= x_max + 1e-6).all())
+        self.assertTrue((adv >= x_min - 1e-6).all())
+
+        # targeted attack
+        targets = (y_clean + 1) % self.dc.num_classes
+        adv, y_adv, _, _ = attack.generate(
+            count=NUM_ADV, norm=np.inf, eps=0.3, random_init=False,
+            targets=targets)
+        self.assertTrue(attack.attack_params['targeted'])
+        success_rate = (y_adv == targets).sum() / len(y_adv)
+        logger.info('Success rate of targeted attack: %f', success_rate)
+        self.assertGreaterEqual(success_rate, 0.5)
+
     def test_carlini(self):
         clip_values = get_range(self.dc.x_train)
         # Lower the upper bound of `c_range` will reduce the norm of perturbation.
@@ -169,6 +384,295 @@ class TestAttackIris(unittest.TestCase):
         l2 = np.max(get_l2_norm(adv, x_clean))
         logger.info('L2 norm = %f', l2)
 
+    def test_carlini_parallel(self):
+        clip_values = get_range(self.dc.x_train)
+        params = {
+            'learning_rate': 0.01,
+            'binary_search_steps': 5,
+            'max_iter': 200,
+            'initial_const': 0.01,
+            'c_range': (0, 1e4),
+            'batch_size': 16,
+            'clip_values': clip_values,
+        }
+        for mode in ['parallel', 'hybrid', 'queue']:
+            attack = attacks.CarliniL2V2Container(
+                self.mc, search_mode=mode, refine_steps=2, **params)
+            adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+
+            success_rate = (y_adv != y_clean).sum() / len(y_adv)
+            logger.info('[%s] Success rate of adv. attack: %f',
+                        mode, success_rate)
+            self.assertGreaterEqual(success_rate, 0.6)
+
+            # the successful samples are perturbed
+            failed = y_adv == y_clean
+            self.assertTrue((adv[~failed] != x_clean[~failed]).any())
+
+            # Check bounding box
+            self.assertLessEqual(np.max(adv), 1.0 + 1e-4)
+            self.assertGreaterEqual(np.min(adv), 0 - 1e-4)
+
+            l2 = np.max(get_l2_norm(adv, x_clean))
+            logger.info('[%s] L2 norm = %f', mode, l2)
+
+        with self.assertRaises(AssertionError):
+            attacks.CarliniL2V2Container(self.mc, search_mode='random')
+
+    def test_checkpoint(self):
+        clip_values = get_range(self.dc.x_train)
+        params = {
+            'binary_search_steps': 3,
+            'max_iter': 50,
+            'batch_size': 8,
+            'clip_values': clip_values,
+        }
+        x = self.dc.x_test[:NUM_ADV]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'carlini')
+            for mode in ['sequential', 'queue']:
+                attack = attacks.CarliniL2V2Container(
+                    self.mc, search_mode=mode, **params)
+                attack.enable_checkpoint(path)
+                adv, _, _, _ = attack.generate(use_testset=False, x=x)
+                self.assertTrue(os.path.exists(
+                    os.path.join(path, attacks.AttackCheckpoint.MANIFEST)))
+
+                # All samples are in the checkpoint. Nothing is optimised.
+                attack = attacks.CarliniL2V2Container(
+                    self.mc, search_mode=mode, **params)
+                attack.enable_checkpoint(path)
+                attack._optimize_const = None
+                attack._adam_step = None
+                adv2, _, _, _ = attack.generate(use_testset=False, x=x)
+                np.testing.assert_array_equal(adv, adv2)
+                attack.clear_checkpoint()
+                self.assertFalse(os.path.exists(path))
+
+            # another confidence does not resume from the checkpoint
+            attack = attacks.CarliniL2V2Container(self.mc, **params)
+            attack.enable_checkpoint(path)
+            attack.generate(use_testset=False, x=x)
+            attack = attacks.CarliniL2V2Container(
+                self.mc, confidence=5.0, **params)
+            expected, _, _, _ = attack.generate(use_testset=False, x=x)
+            attack.enable_checkpoint(path)
+            adv, _, _, _ = attack.generate(use_testset=False, x=x)
+            np.testing.assert_array_equal(adv, expected)
+            attack.clear_checkpoint()
+
+            # only the missing samples are generated
+            key = attacks.AttackCheckpoint.make_key('test', params, x)
+            checkpoint = attacks.AttackCheckpoint(path, key, x.shape)
+            checkpoint.save(slice(0, 10), x[:10])
+            checkpoint = attacks.AttackCheckpoint(path, key, x.shape)
+            self.assertEqual(checkpoint.num_finished, 10)
+            self.assertTrue(checkpoint.is_done(np.arange(10)))
+            self.assertFalse(checkpoint.is_done(np.arange(11)))
+            np.testing.assert_array_equal(
+                checkpoint.load(np.zeros_like(x))[:10], x[:10])
+
+            # the indices which are not contiguous have their own file
+            indices = np.arange(11, NUM_ADV, 2)
+            checkpoint.save(indices, x[indices])
+            self.assertTrue(os.path.exists(
+                os.path.join(path, 'part_00001_indices.npy')))
+            checkpoint = attacks.AttackCheckpoint(path, key, x.shape)
+            self.assertEqual(checkpoint.num_finished, 10 + len(indices))
+            self.assertFalse(checkpoint.is_done([10]))
+            adv = checkpoint.load(np.zeros_like(x))
+            np.testing.assert_array_equal(adv[indices], x[indices])
+            np.testing.assert_array_equal(adv[10], np.zeros_like(x[10]))
+
+            # a different run starts over
+            checkpoint = attacks.AttackCheckpoint(path, 'other', x.shape)
+            self.assertEqual(checkpoint.num_finished, 0)
+
+    def test_checkpoint_bim(self):
+        params = {'eps': 0.3, 'eps_step': 0.1, 'max_iter': 20, 'batch_size': 8}
+        x = self.dc.x_test[:NUM_ADV]
+        attack = attacks.BIMContainer(self.mc, **params)
+        adv, _, _, _ = attack.generate(use_testset=False, x=x)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bim')
+            # the job is killed after 2 mini-batches
+            attack = attacks.BIMContainer(self.mc, **params)
+            attack.enable_checkpoint(path)
+            attack_batch = attack._attack_batch
+            num_calls = [0]
+
+            def killed_after_2(*args):
+                if num_calls[0] == 2:
+                    raise KeyboardInterrupt
+                num_calls[0] += 1
+                return attack_batch(*args)
+
+            attack._attack_batch = killed_after_2
+            with self.assertRaises(KeyboardInterrupt):
+                attack.generate(use_testset=False, x=x)
+
+            # resume from the checkpoint
+            attack = attacks.BIMContainer(self.mc, **params)
+            attack.enable_checkpoint(path)
+            attack_batch = attack._attack_batch
+            num_calls = [0]
+
+            def count_calls(*args):
+                num_calls[0] += 1
+                return attack_batch(*args)
+
+            attack._attack_batch = count_calls
+            adv2, _, _, _ = attack.generate(use_testset=False, x=x)
+            self.assertEqual(num_calls[0], int(np.ceil((NUM_ADV - 16) / 8)))
+            np.testing.assert_array_equal(adv, adv2)
+
+    def test_sharded_executor(self):
+        attack = attacks.PGDContainer(
+            self.mc, eps=0.3, eps_step=0.1, max_iter=20, random_init=True)
+        x = self.dc.x_test[:NUM_ADV]
+        executor = attacks.ShardedAttackExecutor(
+            attack, num_workers=3, seed=SEED)
+        adv, y_adv, x_clean, y_clean = executor.generate(
+            use_testset=False, x=x)
+        self.assertEqual(adv.shape, x.shape)
+        # the results are in the order of the inputs
+        np.testing.assert_array_equal(x_clean, x)
+        np.testing.assert_array_equal(y_clean, self.mc.predict(x))
+        np.testing.assert_array_equal(y_adv, self.mc.predict(adv))
+
+        # same shards and seeds give same results in one process
+        executor = attacks.ShardedAttackExecutor(
+            attack, num_workers=1, num_shards=3, seed=SEED)
+        adv2, _, _, _ = executor.generate(use_testset=False, x=x)
+        np.testing.assert_array_equal(adv, adv2)
+
+    def test_attack_cache(self):
+        x = self.dc.x_test[:NUM_ADV]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = attacks.AttackCache(tmp)
+            attack = attacks.PGDContainer(
+                self.mc, eps=0.3, eps_step=0.1, max_iter=20, random_init=True)
+            attack.cache = cache
+            outputs = attack.generate(use_testset=False, x=x)
+            self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+
+            # an identical attack is loaded from the cache
+            attack = attacks.PGDContainer(
+                self.mc, eps=0.3, eps_step=0.1, max_iter=20, random_init=True)
+            attack._attack_batch = None
+            attacks.set_attack_cache(cache)
+            try:
+                cached = attack.generate(use_testset=False, x=x)
+            finally:
+                attacks.set_attack_cache(None)
+            self.assertEqual(cache.hits, 1)
+            for a, b in zip(outputs, cached):
+                np.testing.assert_array_equal(a, b)
+
+            # different parameters or inputs are not in the cache
+            attack = attacks.PGDContainer(
+                self.mc, eps=0.2, eps_step=0.1, max_iter=20)
+            attack.cache = cache
+            attack.generate(use_testset=False, x=x)
+            attack.generate(use_testset=False, x=x[:10])
+            self.assertEqual((cache.misses, len(cache)), (3, 3))
+
+            # the least recently used entries are removed
+            cache.max_bytes = cache.size // 3
+            attack.generate(use_testset=False, x=x[:20])
+            self.assertEqual(len(cache), 1)
+
+            # C&W with another confidence is not in the cache
+            cache.max_bytes = 2**31
+            params = {'binary_search_steps': 2, 'max_iter': 20}
+            attack = attacks.CarliniL2V2Container(self.mc, **params)
+            attack.cache = cache
+            adv, _, _, _ = attack.generate(use_testset=False, x=x)
+            attack = attacks.CarliniL2V2Container(
+                self.mc, confidence=5.0, **params)
+            attack.cache = cache
+            misses = cache.misses
+            adv2, _, _, _ = attack.generate(use_testset=False, x=x)
+            self.assertEqual(cache.misses, misses + 1)
+            self.assertFalse(np.array_equal(adv, adv2))
+
+        # the key follows the targets of the call, and the implementation
+        attack = attacks.PGDContainer(self.mc)
+        key = attack._get_key(x)
+        attack.set_params(targeted=True)
+        self.assertEqual(attack._get_key(x), key)
+        targets = np.zeros(len(x), dtype=np.int64)
+        self.assertNotEqual(attack._get_key(x, targets), key)
+        self.assertNotEqual(
+            attacks.DeepFoolContainer(self.mc)._get_key(x),
+            attacks.DeepFoolContainer(self.mc, use_art=True)._get_key(x))
+
+    def test_save_attack_store(self):
+        attack = attacks.BIMContainer(self.mc, eps=0.3, max_iter=20)
+        adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+        filename = os.path.join('test', 'test-iris-bim-store')
+        store = attack.save_attack_store(
+            filename, adv, y_adv, x_clean, y_clean, overwrite=True)
+        self.addCleanup(shutil.rmtree, store.path)
+
+        # an existing store is not lost, and the results are saved
+        store2 = attack.save_attack_store(
+            filename, adv, y_adv, x_clean, y_clean)
+        self.addCleanup(shutil.rmtree, store2.path)
+        self.assertNotEqual(store2.path, store.path)
+        fadv, _, _, _ = attacks.AttackContainer.load_adv_examples(store2.path)
+        np.testing.assert_array_equal(fadv, adv)
+
+    def test_art_classifier(self):
+        attacks.clear_art_classifiers()
+        attack1 = attacks.FGSMContainer(self.mc)
+        attack2 = attacks.DeepFoolContainer(self.mc, use_art=True)
+        self.assertIs(attack1.classifier, attack2.classifier)
+
+        # a new classifier is built, when the weights are changed
+        model = self.mc.model
+        state = {k: v.clone() for k, v in model.state_dict().items()}
+        try:
+            with torch.no_grad():
+                next(model.parameters()).add_(1.0)
+            classifier = attacks.get_art_classifier(self.mc)
+            self.assertIsNot(classifier, attack1.classifier)
+            self.assertIs(classifier, attacks.get_art_classifier(self.mc))
+        finally:
+            model.load_state_dict(state)
+
+    def test_query_oracle(self):
+        x = self.dc.x_test[:10].astype(np.float32)
+        oracle = attacks.QueryOracle(self.mc, max_queries=12, batch_size=4)
+        # the duplicates are only evaluated once
+        tickets = [oracle.submit(x, range(10)),
+                   oracle.submit(x[:5], range(5))]
+        scores = oracle.result(tickets[0])
+        np.testing.assert_allclose(scores, self.mc.get_score(x), atol=1e-6)
+        np.testing.assert_array_equal(oracle.result(tickets[1]), scores[:5])
+        self.assertEqual((oracle.num_queries, oracle.num_evaluated), (15, 10))
+        self.assertEqual(oracle.num_calls, 3)
+        self.assertAlmostEqual(oracle.hit_rate, 1 / 3)
+
+        # the cached inputs are free
+        oracle.query(np.repeat(x[:1], 20, axis=0), [0] * 20)
+        np.testing.assert_array_equal(oracle.remaining([0, 1]), [11, 11])
+        oracle.query(x[:1] + 0.01 * np.arange(1, 12)[:, None], [0] * 11)
+        self.assertEqual(oracle.remaining([0])[0], 0)
+        with self.assertRaises(RuntimeError):
+            oracle.query(x[:1] + 0.5, [0])
+
+        # ZOO stops the samples before they exceed the budget
+        attack = attacks.ZooContainer(
+            self.mc, learning_rate=1e-1, max_iter=100, binary_search_steps=5,
+            initial_const=1.0, use_resize=False, use_importance=False,
+            nb_parallel=4, batch_size=16, max_queries=100)
+        attack.generate(count=NUM_ADV)
+        self.assertLessEqual(
+            attack.oracle.num_used(range(NUM_ADV)).max(), 100)
+        self.assertGreater(attack.oracle.num_hits, 0)
+
     def test_deepfool(self):
         attack = attacks.DeepFoolContainer(
             self.mc,
@@ -206,5 +710,42 @@ class TestAttackIris(unittest.TestCase):
         logger.info('L2 norm = %f', l2)
 
 
+    def test_zoo(self):
+        attack = attacks.ZooContainer(
+            self.mc,
+            learning_rate=1e-1,
+            max_iter=100,
+            binary_search_steps=5,
+            initial_const=1.0,
+            use_resize=False,
+            use_importance=False,
+            nb_parallel=4,
+            batch_size=16)
+        adv, y_adv, x_clean, y_clean = attack.generate(count=NUM_ADV)
+        self.assertFalse((adv == x_clean).all())
+
+        success_rate = (y_adv != y_clean).sum() / len(y_adv)
+        logger.info('Success rate of adv. attack: %f', success_rate)
+        self.assertGreaterEqual(success_rate, 0.9)
+
+        # Check bounding box
+        self.assertLessEqual(np.max(adv), 1.0 + 1e-4)
+        self.assertGreaterEqual(np.min(adv), 0 - 1e-4)
+
+        l2 = np.max(get_l2_norm(adv, x_clean))
+        logger.info('L2 norm = %f', l2)
+
+        # the perturbation is kept, when it is upscaled
+        old_shape = (1, 2, 2)
+        new_shape = (1, 4, 4)
+        noise = 0.1 * torch.rand((2, int(np.prod(old_shape))))
+        x = torch.full((2,) + new_shape, 0.5)
+        shape, resized, _ = attack._resize_noise(noise, old_shape, new_shape)
+        self.assertTupleEqual(shape, new_shape)
+        self.assertTupleEqual(tuple(resized.shape), (2, 16))
+        np.testing.assert_allclose(
+            attack._get_adv(x, resized, new_shape).numpy(),
+            attack._get_adv(x, noise, old_shape).numpy(), atol=1e-6)
+
 if __name__ == '__main__':
     unittest.main()
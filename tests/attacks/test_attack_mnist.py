@@ -7,7 +7,8 @@ import numpy as np
 import aad.attacks as attacks
 from aad.basemodels import MnistCnnCW, ModelContainerPT
 from aad.datasets import DATASET_LIST, DataContainer
-from aad.utils import get_data_path, get_l2_norm, master_seed
+from aad.utils import (get_data_path, get_l2_norm, get_random_targets,
+                       master_seed)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -240,6 +241,20 @@ class TestAttackMNIST(unittest.TestCase):
         l2 = np.max(get_l2_norm(adv, x_clean))
         logger.info('L2 norm = %f', l2)
 
+    def test_saliency_same_as_art(self):
+        params = {'theta': 0.1, 'gamma': 0.1, 'batch_size': 16}
+        x = self.dc.x_test[:32]
+        targets = get_random_targets(self.mc.predict(x), 10)
+        attack = attacks.SaliencyContainer(self.mc, **params)
+        adv, y_adv, _, _ = attack.generate(
+            use_testset=False, x=x, targets=targets)
+        attack_art = attacks.SaliencyContainer(self.mc, use_art=True, **params)
+        adv_art, y_art, _, _ = attack_art.generate(
+            use_testset=False, x=x, targets=targets)
+
+        self.assertLessEqual(np.max(np.abs(adv - adv_art)), 1e-4)
+        self.assertTrue(np.array_equal(y_adv, y_art))
+
     def test_zoo(self):
         pass
     #     """
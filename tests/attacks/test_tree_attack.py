@@ -0,0 +1,76 @@
+import logging
+import unittest
+
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+from aad.attacks import TreeAttackContainer
+from aad.basemodels import ModelContainerTree
+from aad.datasets import DATASET_LIST, DataContainer
+from aad.utils import get_data_path, master_seed
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.DEBUG)
+
+SEED = 4096
+NAME = 'Iris'
+NUM_ADV = 30
+NUM_RANDOM = 20000
+
+
+class TestTreeAttack(unittest.TestCase):
+    """Test the attack on tree classifiers with Iris dataset"""
+
+    @classmethod
+    def setUpClass(cls):
+        master_seed(SEED)
+
+        cls.dc = DataContainer(DATASET_LIST[NAME], get_data_path())
+        cls.dc(shuffle=True, normalize=True)
+
+    def setUp(self):
+        master_seed(SEED)
+
+    def check_attack(self, classifier, norm):
+        mc = ModelContainerTree(classifier, self.dc)
+        mc.fit()
+        attack = TreeAttackContainer(mc, norm=norm)
+        adv, pred_adv, x_clean, pred_clean = attack.generate(count=NUM_ADV)
+
+        # every prediction is changed, and adv. examples are in the data range
+        self.assertTrue(np.all(pred_adv != pred_clean))
+        clip_min, clip_max = self.dc.data_range
+        self.assertTrue(np.all(adv >= clip_min))
+        self.assertTrue(np.all(adv <= clip_max))
+
+        # no random point of another class is closer than the adv. example
+        p = np.inf if norm == np.inf else 2
+        dist = np.linalg.norm(adv - x_clean, ord=p, axis=1)
+        points = np.random.uniform(
+            clip_min, clip_max, size=(NUM_RANDOM, x_clean.shape[1]))
+        points = points.astype(np.float32)
+        pred_points = mc.predict(points)
+        for i in range(NUM_ADV):
+            other = points[pred_points != pred_clean[i]]
+            d = np.linalg.norm(other - x_clean[i], ord=p, axis=1)
+            self.assertGreaterEqual(np.min(d) + 1e-5, dist[i])
+        logger.info('Mean distance: %f', np.mean(dist))
+
+        # targeted
+        targets = (pred_clean + 1) % self.dc.num_classes
+        _, pred_adv, _, _ = attack.generate(count=NUM_ADV, targets=targets)
+        self.assertTrue(np.all(pred_adv == targets))
+
+    def test_extra_tree(self):
+        classifier = ExtraTreeClassifier(criterion='gini', splitter='random')
+        self.check_attack(classifier, np.inf)
+        self.check_attack(classifier, 2)
+
+    def test_decision_tree(self):
+        classifier = DecisionTreeClassifier(criterion='gini')
+        self.check_attack(classifier, np.inf)
+        self.check_attack(classifier, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import logging
+import unittest
+
+import numpy as np
+import torch
+
+from aad.datasets import (DATASET_LIST, BatchIndexSampler, DataContainer,
+                          GenericDataset)
+from aad.utils import get_data_path, master_seed
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.DEBUG)
+
+SEED = 4096
+NAME = 'Iris'
+BATCH_SIZE = 32
+
+
+class TestBatchIndexSampler(unittest.TestCase):
+    """Test BatchIndexSampler and batch indexing in GenericDataset"""
+
+    @classmethod
+    def setUpClass(cls):
+        master_seed(SEED)
+        cls.dc = DataContainer(DATASET_LIST[NAME], get_data_path())
+        cls.dc(shuffle=True, normalize=True)
+
+    def setUp(self):
+        master_seed(SEED)
+
+    def test_sampler(self):
+        n = len(self.dc.x_train)
+        sampler = BatchIndexSampler(n, BATCH_SIZE, shuffle=True)
+        self.assertEqual(len(sampler), int(np.ceil(n / BATCH_SIZE)))
+        # each sample appears exactly once in an epoch
+        indices = torch.cat(list(sampler)).numpy()
+        self.assertEqual(len(indices), n)
+        np.testing.assert_equal(np.sort(indices), np.arange(n))
+        # a new permutation in every epoch
+        self.assertFalse(
+            np.array_equal(indices, torch.cat(list(sampler)).numpy()))
+
+        sampler = BatchIndexSampler(n, BATCH_SIZE, shuffle=False)
+        batches = list(sampler)
+        self.assertEqual(batches[0], slice(0, BATCH_SIZE))
+        self.assertEqual(batches[-1].stop, n)
+
+        sampler = BatchIndexSampler(n, BATCH_SIZE, drop_last=True)
+        self.assertEqual(len(sampler), n // BATCH_SIZE)
+        self.assertEqual(len(list(sampler)), n // BATCH_SIZE)
+
+    def test_dataloader(self):
+        x_train = self.dc.x_train
+        y_train = self.dc.y_train
+        loader = self.dc.get_dataloader(BATCH_SIZE, is_train=True)
+        self.assertEqual(len(loader.dataset), len(x_train))
+        self.assertEqual(len(loader), int(np.ceil(len(x_train) / BATCH_SIZE)))
+        n = 0
+        for x, y in loader:
+            self.assertLessEqual(len(x), BATCH_SIZE)
+            self.assertEqual(len(x), len(y))
+            n += len(x)
+        self.assertEqual(n, len(x_train))
+
+        # a mini-batch is fetched by a single indexing operation
+        dataset = GenericDataset(x_train, y_train)
+        indices = torch.randperm(len(dataset))[:BATCH_SIZE]
+        x, y = dataset[indices]
+        np.testing.assert_equal(x.numpy(), x_train[indices.numpy()])
+        np.testing.assert_equal(y.numpy(), y_train[indices.numpy()])
+
+        # contiguous batches without labels
+        dataset = GenericDataset(x_train)
+        loader = torch.utils.data.DataLoader(
+            dataset,
+            batch_size=None,
+            sampler=BatchIndexSampler(len(dataset), BATCH_SIZE, shuffle=False))
+        x, y = next(iter(loader))
+        np.testing.assert_equal(x.numpy(), x_train[:BATCH_SIZE])
+        np.testing.assert_equal(y.numpy(), -np.ones(BATCH_SIZE))
+
+        # shared memory for multi-worker loading
+        dataset = GenericDataset(x_train, y_train, share_memory=True)
+        self.assertTrue(dataset.data.is_shared())
+        self.assertTrue(dataset.labels.is_shared())
+
+
+if __name__ == '__main__':
+    unittest.main()
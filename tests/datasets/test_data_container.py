@@ -4,8 +4,9 @@ import unittest
 
 import numpy as np
 
-from aad.datasets import (DATASET_LIST, DataContainer, get_sample_mean,
-                          get_sample_std, get_synthetic_dataset_dict)
+from aad.datasets import (DATASET_LIST, DataContainer, LoaderMonitor,
+                          get_sample_mean, get_sample_std,
+                          get_synthetic_dataset_dict)
 from aad.utils import (get_data_path, master_seed, onehot_encoding,
                        swap_image_channel)
 
@@ -485,6 +486,57 @@ class TestDataContainer(unittest.TestCase):
         label_shape[0] = len(y_train) + len(y_test)
         self.assertTupleEqual(y_all.shape, tuple(label_shape))
 
+    def test_train_stats(self):
+        dc = self.init_datacontainer('Iris')
+        x_train = dc.x_train
+        version = dc.version
+
+        x_min, x_max = dc.data_range
+        np.testing.assert_equal(x_min, x_train.min(axis=0))
+        np.testing.assert_equal(x_max, x_train.max(axis=0))
+        np.testing.assert_array_almost_equal(dc.train_mean, x_train.mean(axis=0))
+        np.testing.assert_array_almost_equal(dc.train_std, x_train.std(axis=0))
+        # the statistics are cached
+        self.assertIs(dc.data_range[0], x_min)
+        self.assertEqual(dc.version, version)
+
+        # replacing the train set invalidates the cache
+        dc.x_train = x_train * 2.0
+        self.assertEqual(dc.version, version + 1)
+        x_min, x_max = dc.data_range
+        np.testing.assert_equal(x_max, 2.0 * x_train.max(axis=0))
+        np.testing.assert_array_almost_equal(
+            dc.train_mean, 2.0 * x_train.mean(axis=0))
+
+    def test_loader_params(self):
+        dc = self.init_datacontainer('Iris')
+        with self.assertRaises(KeyError):
+            dc.set_loader_params(batch_size=32)
+
+        dc.set_loader_params(num_workers=2, persistent_workers=True,
+                             prefetch_factor=4)
+        loader = dc.get_dataloader(batch_size=32, shuffle=False)
+        self.assertEqual(loader.num_workers, 2)
+        self.assertTrue(loader.persistent_workers)
+        self.assertEqual(loader.prefetch_factor, 4)
+        self.assertTrue(loader.dataset.data.is_shared())
+
+        monitor = LoaderMonitor(loader)
+        for _ in range(2):
+            x = np.concatenate([x.numpy() for x, _ in monitor])
+            np.testing.assert_equal(x, dc.x_train)
+        report = monitor.report()
+        self.assertEqual(report['batches'], len(loader))
+        self.assertEqual(report['samples'], len(dc.x_train))
+        self.assertGreater(report['batches_per_sec'], 0)
+        self.assertLessEqual(report['stall_ratio'], 1.0)
+        self.assertEqual(monitor.report(total=True)['batches'],
+                         2 * len(loader))
+
+        # the arguments override the defaults
+        loader = dc.get_dataloader(batch_size=32, num_workers=0)
+        self.assertEqual(loader.num_workers, 0)
+
     def test_synthetic_dict(self):
         dataset_dict = get_synthetic_dataset_dict(100, 10, 20)
         expectation = {
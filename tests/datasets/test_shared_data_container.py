@@ -0,0 +1,72 @@
+import logging
+import unittest
+
+import numpy as np
+
+from aad.datasets import DATASET_LIST, DataContainer, SharedDataContainer
+from aad.utils import get_data_path, master_seed
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.DEBUG)
+
+SEED = 4096
+NAME = 'Iris'
+
+
+class TestSharedDataContainer(unittest.TestCase):
+    """Test SharedDataContainer class"""
+
+    @classmethod
+    def setUpClass(cls):
+        master_seed(SEED)
+        cls.dc = DataContainer(DATASET_LIST[NAME], get_data_path())
+        cls.dc(shuffle=True, normalize=True)
+
+    def setUp(self):
+        master_seed(SEED)
+
+    def test_share_data(self):
+        shared = SharedDataContainer(self.dc)
+        self.assertEqual(shared.name, self.dc.name)
+        self.assertEqual(shared.num_classes, self.dc.num_classes)
+        self.assertEqual(len(shared), len(self.dc))
+
+        # no copy is made
+        self.assertTrue(np.shares_memory(shared.x_train, self.dc.x_train))
+        self.assertTrue(np.shares_memory(shared.y_train, self.dc.y_train))
+        self.assertTrue(np.shares_memory(shared.x_test, self.dc.x_test))
+        self.assertTrue(np.shares_memory(shared.y_test, self.dc.y_test))
+
+        # shared arrays are read-only
+        with self.assertRaises(ValueError):
+            shared.x_train[0] = 0.
+
+        # the statistics are computed by the parent
+        self.assertIs(shared.data_range[0], self.dc.data_range[0])
+
+        loader = shared.get_dataloader(batch_size=8, shuffle=False)
+        x, y = next(iter(loader))
+        np.testing.assert_equal(x.numpy(), self.dc.x_train[:8])
+        np.testing.assert_equal(y.numpy(), self.dc.y_train[:8])
+
+    def test_override(self):
+        x_train = np.copy(self.dc.x_train)
+        y_train = np.copy(self.dc.y_train)
+        shared = SharedDataContainer(self.dc)
+
+        shared.x_train = x_train * 0.5
+        shared.y_train = np.zeros_like(y_train)
+        self.assertFalse(np.shares_memory(shared.x_train, self.dc.x_train))
+        np.testing.assert_array_almost_equal(
+            shared.data_range[1], 0.5 * x_train.max(axis=0))
+        # test set is still shared
+        self.assertTrue(np.shares_memory(shared.x_test, self.dc.x_test))
+
+        # the parent is not altered
+        np.testing.assert_equal(self.dc.x_train, x_train)
+        np.testing.assert_equal(self.dc.y_train, y_train)
+        np.testing.assert_equal(self.dc.data_range[1], x_train.max(axis=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -115,6 +115,55 @@ class TestFeatureSqueezing(unittest.TestCase):
         logger.info('L2 norm of binary squeezer:%f', l2)
         self.assertLessEqual(l2, 0.2)
 
+    def test_lazy_squeezing(self):
+        x_range = get_range(self.mc.data_container.x_train)
+        squeezer = FeatureSqueezing(
+            self.mc,
+            clip_values=x_range,
+            smoothing_methods=['normal', 'binary'],
+            bit_depth=8,
+            sigma=0.1,
+            pretrained=False,
+            cache_size=4,
+        )
+        mc_normal = squeezer.get_def_model_container('normal')
+        mc_binary = squeezer.get_def_model_container('binary')
+
+        # without fresh noise, a sample always gets the same noise
+        x_normal = mc_normal.data_container.x_train
+        np.testing.assert_equal(x_normal, mc_normal.data_container.x_train)
+
+        # the DataLoader squeezes the data batch by batch
+        for mc in [mc_normal, mc_binary]:
+            dc = mc.data_container
+            loader = dc.get_dataloader(
+                batch_size=16, is_train=True, shuffle=False)
+            x, y = next(iter(loader))
+            np.testing.assert_equal(x.numpy(), dc.x_train[:16])
+            np.testing.assert_equal(y.numpy(), dc.y_train[:16])
+
+        # the noise of a sample does not depend on its batch
+        indices = np.random.permutation(len(x_normal))[:16]
+        noise = FeatureSqueezing._seeded_normal(42, indices, (4,))
+        all_noise = FeatureSqueezing._seeded_normal(
+            42, np.arange(len(x_normal)), (4,))
+        np.testing.assert_equal(noise, all_noise[indices])
+
+        # fresh noise is drawn in every epoch
+        squeezer = FeatureSqueezing(
+            self.mc,
+            clip_values=x_range,
+            smoothing_methods=['normal'],
+            sigma=0.1,
+            pretrained=False,
+            fresh_noise=True,
+        )
+        dc = squeezer.get_def_model_container('normal').data_container
+        loader = dc.get_dataloader(batch_size=16, is_train=True, shuffle=False)
+        x1, _ = next(iter(loader))
+        x2, _ = next(iter(loader))
+        self.assertFalse((x1 == x2).all())
+
     def test_fit_save(self):
         x_range = get_range(self.mc.data_container.x_train)
         squeezer = FeatureSqueezing(
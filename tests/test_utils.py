@@ -4,9 +4,9 @@ import unittest
 
 import numpy as np
 
-from aad.utils import (get_range, master_seed, name_handler, onehot_encoding,
-                       scale_normalize, scale_unnormalize, shuffle_data,
-                       swap_image_channel, get_random_targets)
+from aad.utils import (get_range, get_stats, master_seed, name_handler,
+                       onehot_encoding, scale_normalize, scale_unnormalize,
+                       shuffle_data, swap_image_channel, get_random_targets)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -54,6 +54,22 @@ class TestUtils(unittest.TestCase):
         out = np.array(list(get_range(x, is_image=True)))
         np.testing.assert_almost_equal(out, [0., 0.9998], decimal=4)
 
+    def test_get_stats(self):
+        x = np.random.rand(1000, 7).astype(np.float32)
+        # use a small chunk to test the update between chunks
+        x_min, x_max, mean, std = get_stats(x, chunk_bytes=256)
+        np.testing.assert_equal(x_min, x.min(axis=0))
+        np.testing.assert_equal(x_max, x.max(axis=0))
+        np.testing.assert_almost_equal(mean, x.mean(axis=0), decimal=5)
+        np.testing.assert_almost_equal(std, x.std(axis=0), decimal=5)
+        self.assertEqual(mean.dtype, np.float32)
+
+        x = np.random.rand(10, 1, 28, 28).astype(np.float32)
+        x_min, x_max, mean, std = get_stats(x)
+        self.assertTupleEqual(mean.shape, (1, 28, 28))
+        np.testing.assert_almost_equal(np.max(x_max), np.max(x))
+        np.testing.assert_almost_equal(std, x.std(axis=0), decimal=5)
+
     def test_normalize(self):
         x = np.random.rand(2, 3)
         xmin, xmax = get_range(x)